@@ -0,0 +1,308 @@
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import yaml
+
+import ids
+from ids.utils import metrics
+from benchmarks.traffic_generator import TrafficGenerator
+
+BENCHMARKS = [
+    'header_parsing', 'feature_extraction', 'session_handler', 'rule_engine',
+    'ml_predict', 'db_save_packet', 'db_concurrent_reads', 'correlator', 'end_to_end',
+]
+
+
+def measure(func: Callable[[], int], repeat: int) -> Dict:
+    """多次运行取最快一次，func返回处理的数据包数"""
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'packets': count,
+        'seconds': round(best, 6),
+        'pps': round(count / best, 1) if best else None,
+        'us_per_packet': round(best / count * 1e6, 3) if count else None,
+    }
+
+
+def bench_header_parsing(frames, packets, context):
+    from scapy.layers.l2 import Ether
+    from ids.capture.decoder import decode_packet
+
+    def run():
+        for _, frame in frames:
+            decode_packet(Ether(frame))
+        return len(frames)
+    return run
+
+
+def bench_feature_extraction(frames, packets, context):
+    from ids.features.packet_features import PacketFeatureExtractor
+    extractor = PacketFeatureExtractor()
+
+    def run():
+        for packet in packets:
+            extractor.extract_features(packet)
+        return len(packets)
+    return run
+
+
+def bench_session_handler(frames, packets, context):
+    from ids.capture.session_handler import SessionHandler
+    from ids.features.session_features import SessionFeatureExtractor
+    session_features = SessionFeatureExtractor()
+
+    def run():
+        handler = SessionHandler()
+        for packet in packets:
+            handler.add_packet(packet)
+            key = handler.get_session_key(packet)
+            if key:
+                session_features.extract_features(handler.sessions[key])
+        return len(packets)
+    return run
+
+
+def bench_rule_engine(frames, packets, context):
+    from ids.detectors.rule_engine import RuleEngine, Rule
+    engine = RuleEngine(context['tmp'] / 'rules')
+    for rule in benchmark_rules():
+        engine.add_rule(rule)
+    features = context['features']
+
+    def run():
+        for packet, packet_features in zip(packets, features):
+            engine.check_packet(packet, packet_features)
+        return len(packets)
+    return run
+
+
+def bench_ml_predict(frames, packets, context):
+    from ids.detectors.ml_engine import MLEngine
+    engine = MLEngine()
+    engine.train(context['training_features'])
+    # 单条预测开销较大，限制样本数
+    features = context['features'][:context['ml_limit']]
+
+    def run():
+        for packet_features in features:
+            engine.predict(packet_features)
+        return len(features)
+    return run
+
+
+def bench_db_save_packet(frames, packets, context):
+    from ids.models.db_manager import DatabaseManager
+    features = context['features']
+    runs = iter(range(1000))
+
+    def run():
+        db = DatabaseManager(f"sqlite:///{context['tmp'] / f'bench_{next(runs)}.db'}")
+        for packet, packet_features in zip(packets, features):
+            db.save_packet(packet, packet_features)
+        db.close()  # 计入后台批量写入的时间
+        return len(packets)
+    return run
+
+
+def bench_db_concurrent_reads(frames, packets, context):
+    """与db_save_packet相同，但同时有两个线程持续执行仪表盘查询"""
+    import threading
+    from ids.models.db_manager import DatabaseManager
+    features = context['features']
+    runs = iter(range(1000))
+
+    def dashboard(db, stop):
+        while not stop.is_set():
+            db.query_alerts(limit=50)
+            db.alert_counts('src_ip')
+            db.traffic_counts(('protocol', 'dst_port'))
+            db.top_ips(limit=10)
+
+    def run():
+        db = DatabaseManager(f"sqlite:///{context['tmp'] / f'bench_concurrent_{next(runs)}.db'}")
+        stop = threading.Event()
+        readers = [threading.Thread(target=dashboard, args=(db, stop)) for _ in range(2)]
+        for reader in readers:
+            reader.start()
+        for packet, packet_features in zip(packets, features):
+            db.save_packet(packet, packet_features)
+        db.flush()
+        stop.set()
+        for reader in readers:
+            reader.join()
+        db.close()
+        return len(packets)
+    return run
+
+
+def bench_correlator(frames, packets, context):
+    from ids.correlation.event_correlator import EventCorrelator
+    from scapy.layers.inet import IP, TCP
+
+    class NullDB:
+        def save_correlation_alert(self, alert_data):
+            pass
+
+    rule_names = ['Port Scan Detection', 'SYN Flood Detection', 'UDP Flood Detection']
+    events = []
+    for i, packet in enumerate(packets):
+        events.append({
+            'timestamp': datetime.utcnow(),
+            'src_ip': packet[IP].src,
+            'dst_ip': packet[IP].dst,
+            'dst_port': packet[TCP].dport if TCP in packet else None,
+            'protocol': 'TCP' if TCP in packet else 'UDP',
+            'alert_type': 'rule',
+            'severity': 'high',
+            'rule_name': rule_names[i % len(rule_names)],
+            'ml_confidence': None,
+        })
+
+    def run():
+        correlator = EventCorrelator(NullDB())
+        for event in events:
+            correlator.process_event(event)
+        return len(events)
+    return run
+
+
+def bench_end_to_end(frames, packets, context):
+    from ids.main import IDS
+
+    config_file = context['tmp'] / 'ids_config.yaml'
+    with open(config_file, 'w') as f:
+        yaml.safe_dump({
+            'network': {'interface': None},
+            'database': {'url': f"sqlite:///{context['tmp'] / 'e2e.db'}"},
+            'packet_store': {'directory': str(context['tmp'] / 'e2e_packets')},
+            'flow_archive': {'directory': str(context['tmp'] / 'e2e_flows')},
+            'checkpoint': {'directory': str(context['tmp'] / 'e2e_checkpoint')},
+            # 基准测试不能修改主机防火墙
+            'firewall': {'enabled': False},
+            'metrics': {'enabled': context['metrics']},
+            'pipeline': {'queue_size': len(packets) + 1},
+        }, f)
+    runs = iter(range(1000))
+
+    def run():
+        instance = IDS(rules_dir=str(context['tmp'] / f'e2e_rules_{next(runs)}'),
+                       config_file=str(config_file))
+        instance.pipeline.start()
+        for packet in packets:
+            instance.packet_handler(packet)
+        # 等待所有阶段处理完毕
+        while any(stage.queue.unfinished_tasks for stage in instance.pipeline.stages):
+            time.sleep(0.001)
+        instance.pipeline.stop()
+        instance.db_manager.close()
+        return len(packets)
+    return run
+
+
+def benchmark_rules():
+    """与IDS默认规则相同的规则集"""
+    from ids.detectors.rule_engine import Rule
+    return [
+        Rule('Port Scan Detection', [('tcp_dport', 'in', range(1, 1024)),
+                                     ('packet_count', '>', 100), ('duration', '<', 10)], 'high'),
+        Rule('SYN Flood Detection', [('tcp_flags', '==', 0x02),
+                                     ('packet_count', '>', 200), ('duration', '<', 5)], 'high'),
+        Rule('UDP Flood Detection', [('bytes_per_second', '>', 1000000),
+                                     ('packet_count', '>', 1000)], 'high'),
+        Rule('Large Packet Detection', [('ip_len', '>', 1500)], 'medium'),
+    ]
+
+
+def run_benchmarks(scenario: str = 'mixed', count: int = 5000, repeat: int = 3,
+                   only: List[str] = None, enable_metrics: bool = True,
+                   seed: int = 42, ml_limit: int = 200, pcap: str = None) -> Dict:
+    """运行基准测试并返回结果字典"""
+    metrics.configure(enable_metrics)
+    generator = TrafficGenerator(seed=seed)
+    frames = generator.frames(scenario, count)
+    packets = generator.packets(scenario, count)
+    if pcap:
+        generator.write_pcap(pcap, scenario, count)
+
+    from ids.features.packet_features import PacketFeatureExtractor
+    extractor = PacketFeatureExtractor()
+    training = generator.packets('benign', 2000)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        context = {
+            'tmp': Path(tmp),
+            'metrics': enable_metrics,
+            'ml_limit': ml_limit,
+            'features': [extractor.extract_features(p) for p in packets],
+            'training_features': [extractor.extract_features(p) for p in training],
+        }
+        for name in only or BENCHMARKS:
+            try:
+                func = globals()[f'bench_{name}'](frames, packets, context)
+                results[name] = measure(func, repeat)
+            except Exception as e:
+                results[name] = {'error': f"{type(e).__name__}: {e}"}
+            print(f"{name:20s} {results[name]}", file=sys.stderr)
+
+    return {
+        'ids_version': ids.__version__,
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'scenario': scenario, 'packets': count, 'repeat': repeat,
+            'seed': seed, 'metrics': enable_metrics,
+        },
+        'results': results,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='IDS吞吐量基准测试')
+    parser.add_argument('-s', '--scenario', default='mixed', choices=TrafficGenerator.SCENARIOS,
+                        help='合成流量场景')
+    parser.add_argument('-n', '--packets', type=int, default=5000, help='数据包数量')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='每项重复次数（取最快一次）')
+    parser.add_argument('-b', '--bench', action='append', choices=BENCHMARKS,
+                        help='只运行指定的基准测试（可重复）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--ml-limit', type=int, default=200, help='ML预测基准的最大样本数')
+    parser.add_argument('--no-metrics', action='store_true', help='关闭监控指标（用于测量指标开销）')
+    parser.add_argument('--pcap', help='同时将生成的流量写入pcap文件')
+    parser.add_argument('--log-level', default='ERROR', help='日志级别（默认只输出错误，避免日志影响测量）')
+    parser.add_argument('-o', '--output', help='结果JSON文件路径（默认输出到标准输出）')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=args.log_level)
+    results = run_benchmarks(
+        scenario=args.scenario, count=args.packets, repeat=args.repeat,
+        only=args.bench, enable_metrics=not args.no_metrics,
+        seed=args.seed, ml_limit=args.ml_limit, pcap=args.pcap,
+    )
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import random
+import socket
+import struct
+from typing import Iterator, List, Tuple
+
+from ids.utils.pcap import write_pcap
+
+ETH_HEADER = struct.Struct('!6s6sH')
+IP_HEADER = struct.Struct('!BBHHHBBH4s4s')
+TCP_HEADER = struct.Struct('!HHIIBBHHH')
+UDP_HEADER = struct.Struct('!HHHH')
+
+ETH_P_IP = 0x0800
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+TCP_PSH_ACK = 0x18
+
+SRC_MAC = bytes.fromhex('020000000001')
+DST_MAC = bytes.fromhex('020000000002')
+
+
+def _checksum(header: bytes) -> int:
+    """计算IP头部校验和"""
+    total = sum(struct.unpack(f'!{len(header) // 2}H', header))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+def build_frame(src_ip: str, dst_ip: str, proto: int, sport: int, dport: int,
+                payload_len: int = 0, flags: int = TCP_PSH_ACK, ttl: int = 64,
+                ident: int = 0, seq: int = 0) -> bytes:
+    """构造以太网/IPv4/TCP或UDP帧（L4校验和置0）"""
+    payload = b'\x00' * payload_len
+    if proto == IPPROTO_TCP:
+        l4 = TCP_HEADER.pack(sport, dport, seq, 0, 5 << 4, flags, 65535, 0, 0) + payload
+    else:
+        l4 = UDP_HEADER.pack(sport, dport, UDP_HEADER.size + payload_len, 0) + payload
+
+    src = socket.inet_aton(src_ip)
+    dst = socket.inet_aton(dst_ip)
+    total_len = IP_HEADER.size + len(l4)
+    header = IP_HEADER.pack(0x45, 0, total_len, ident & 0xffff, 0, ttl, proto, 0, src, dst)
+    header = header[:10] + struct.pack('!H', _checksum(header)) + header[12:]
+    return ETH_HEADER.pack(DST_MAC, SRC_MAC, ETH_P_IP) + header + l4
+
+
+class TrafficGenerator:
+    SCENARIOS = (
+        'benign', 'port_scan', 'syn_flood', 'udp_flood',
+        'many_small_flows', 'few_elephant_flows', 'mixed',
+    )
+
+    # mixed场景中各场景的比例
+    MIX = (
+        ('benign', 0.70), ('port_scan', 0.05), ('syn_flood', 0.08),
+        ('udp_flood', 0.05), ('many_small_flows', 0.07), ('few_elephant_flows', 0.05),
+    )
+
+    def __init__(self, seed: int = 42, start_time: float = 1_700_000_000.0, pps: float = 10_000.0):
+        """
+        初始化流量生成器
+        Args:
+            seed: 随机种子
+            start_time: 第一个数据包的时间戳
+            pps: 生成时间戳所用的速率（每秒数据包数）
+        """
+        self.seed = seed
+        self.start_time = start_time
+        self.pps = pps
+
+    def frames(self, scenario: str, count: int) -> List[Tuple[float, bytes]]:
+        """生成(时间戳, 原始帧)列表"""
+        if scenario not in self.SCENARIOS:
+            raise ValueError(f"未知的流量场景: {scenario}")
+        rng = random.Random(f"{self.seed}:{scenario}")
+        source = getattr(self, f'_gen_{scenario}')(rng)
+
+        interval = 1.0 / self.pps
+        return [
+            (self.start_time + i * interval, next(source))
+            for i in range(count)
+        ]
+
+    def packets(self, scenario: str, count: int) -> list:
+        """生成scapy数据包列表"""
+        from scapy.layers.l2 import Ether
+        import scapy.layers.inet  # noqa: F401  注册IP/TCP/UDP层绑定
+
+        packets = []
+        for timestamp, frame in self.frames(scenario, count):
+            packet = Ether(frame)
+            packet.time = timestamp
+            packets.append(packet)
+        return packets
+
+    def write_pcap(self, path, scenario: str, count: int) -> int:
+        """生成流量并写入pcap文件"""
+        return write_pcap(path, self.frames(scenario, count))
+
+    @staticmethod
+    def _ip(rng: random.Random, prefix: str = '10.0') -> str:
+        return f"{prefix}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+    def _gen_mixed(self, rng: random.Random) -> Iterator[bytes]:
+        """混合流量：按MIX比例交替输出各场景的数据包"""
+        names = [name for name, _ in self.MIX]
+        weights = [weight for _, weight in self.MIX]
+        sources = {
+            name: getattr(self, f'_gen_{name}')(random.Random(f"{self.seed}:mixed:{name}"))
+            for name in names
+        }
+        while True:
+            yield next(sources[rng.choices(names, weights)[0]])
+
+    def _gen_benign(self, rng: random.Random) -> Iterator[bytes]:
+        """正常流量：Web、SSH、DNS混合，少量并发流"""
+        services = [(IPPROTO_TCP, 443, 0.5), (IPPROTO_TCP, 80, 0.25),
+                    (IPPROTO_TCP, 22, 0.05), (IPPROTO_UDP, 53, 0.2)]
+        flows = []
+        for _ in range(64):
+            proto, port, _ = rng.choices(services, [w for _, _, w in services])[0]
+            flows.append((self._ip(rng), self._ip(rng, '172.16'), proto,
+                          rng.randint(32768, 60999), port))
+        ident = 0
+        while True:
+            src, dst, proto, sport, dport = rng.choice(flows)
+            ident += 1
+            if rng.random() < 0.5:
+                # 响应方向
+                src, dst, sport, dport = dst, src, dport, sport
+            size = rng.choice((0, 64, 512, 1200, 1448)) if proto == IPPROTO_TCP else rng.randint(30, 300)
+            yield build_frame(src, dst, proto, sport, dport, size,
+                              flags=TCP_PSH_ACK if size else TCP_ACK, ident=ident)
+
+    def _gen_port_scan(self, rng: random.Random) -> Iterator[bytes]:
+        """端口扫描：单一来源对目标主机的1-1024端口依次发送SYN"""
+        attacker = '203.0.113.7'
+        while True:
+            victim = self._ip(rng, '172.16')
+            for port in range(1, 1025):
+                yield build_frame(attacker, victim, IPPROTO_TCP, rng.randint(40000, 60000),
+                                  port, flags=TCP_SYN, ident=port)
+
+    def _gen_syn_flood(self, rng: random.Random) -> Iterator[bytes]:
+        """SYN泛洪：大量伪造源地址对同一服务发送SYN"""
+        victim = '172.16.0.10'
+        while True:
+            src = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            yield build_frame(src, victim, IPPROTO_TCP, rng.randint(1024, 65535), 80,
+                              flags=TCP_SYN, ident=rng.getrandbits(16), seq=rng.getrandbits(32))
+
+    def _gen_udp_flood(self, rng: random.Random) -> Iterator[bytes]:
+        """UDP泛洪：少量来源向目标随机端口发送大包"""
+        sources = [f"198.51.100.{i}" for i in range(1, 9)]
+        victim = '172.16.0.20'
+        while True:
+            yield build_frame(rng.choice(sources), victim, IPPROTO_UDP,
+                              rng.randint(1024, 65535), rng.randint(1, 65535), 1400)
+
+    def _gen_many_small_flows(self, rng: random.Random) -> Iterator[bytes]:
+        """大量短流：每个五元组只有1-3个数据包"""
+        while True:
+            src, dst = self._ip(rng), self._ip(rng, '172.16')
+            sport, dport = rng.randint(1024, 65535), rng.choice((80, 443, 8080, 53))
+            proto = IPPROTO_UDP if dport == 53 else IPPROTO_TCP
+            for _ in range(rng.randint(1, 3)):
+                yield build_frame(src, dst, proto, sport, dport, rng.randint(0, 200), flags=TCP_SYN)
+
+    def _gen_few_elephant_flows(self, rng: random.Random) -> Iterator[bytes]:
+        """少量大流：4条持续的满MTU传输"""
+        flows = [(self._ip(rng), self._ip(rng, '172.16'), rng.randint(32768, 60999), 873)
+                 for _ in range(4)]
+        seq = 0
+        while True:
+            src, dst, sport, dport = rng.choice(flows)
+            seq += 1448
+            yield build_frame(src, dst, IPPROTO_TCP, sport, dport, 1448, seq=seq & 0xffffffff)
@@ -0,0 +1,35 @@
+from typing import Dict, Optional
+
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.layers.inet6 import IPv6
+
+def ip_layer(packet):
+    """数据包的IPv4或IPv6层，非IP数据包返回None"""
+    layer = packet.getlayer(IP)
+    if layer is None:
+        layer = packet.getlayer(IPv6)
+    return layer
+
+def ip_length(layer) -> int:
+    """IP报文总长度（IPv6为固定头部加载荷长度）"""
+    return layer.len if layer.version == 4 else layer.plen + 40
+
+def decode_packet(packet) -> Optional[Dict]:
+    """解析数据包头部（IPv4或IPv6），非IP数据包返回None"""
+    ip = ip_layer(packet)
+    if ip is None:
+        return None
+        
+    header = {
+        'src_ip': ip.src,
+        'dst_ip': ip.dst,
+        'protocol': 'OTHER',
+        'src_port': None,
+        'dst_port': None,
+        'length': len(packet)
+    }
+    if TCP in packet:
+        header.update(protocol='TCP', src_port=packet[TCP].sport, dst_port=packet[TCP].dport)
+    elif UDP in packet:
+        header.update(protocol='UDP', src_port=packet[UDP].sport, dst_port=packet[UDP].dport)
+    return header
@@ -1,38 +1,56 @@
 import logging
 from queue import Queue, Empty, Full
 import threading
-from scapy.all import sniff
+from ids.capture.decoder import ip_layer
 from typing import Callable
 
 from ids.models.packet_features import PacketFeatures
+from ids.utils.metrics import registry
 
 class PacketCapture:
     def __init__(self, interface=None, queue_size=1000):
         self.interface = interface
         self.is_running = False
         self.packet_queue = Queue(maxsize=queue_size)
+        self.stop_capture = threading.Event()
         self.logger = logging.getLogger(__name__)
         
+        # 监控指标
+        self.metric_captured = registry.counter('capture_packets_total', '捕获的数据包总数')
+        self.metric_non_ip = registry.counter('capture_non_ip_packets_total', '忽略的非IP数据包数')
+        self.metric_dropped = registry.counter('capture_dropped_packets_total', '因流水线队列已满丢弃的数据包数')
+        
     def start_capture(self, packet_callback):
         """开始捕获数据包"""
         self.packet_callback = packet_callback
+        self.is_running = True
+        self.stop_capture.clear()
         self.capture_thread = threading.Thread(target=self._capture)
         self.capture_thread.start()
         
     def _capture(self):
         """实际的数据包捕获函数"""
+        # scapy.all加载全部协议层，较慢，开始抓包时才导入
+        from scapy.all import sniff
+        
         sniff(
             iface=self.interface,
             prn=self._packet_handler,
+            store=0,
             stop_filter=lambda _: self.stop_capture.is_set()
         )
         
     def _packet_handler(self, packet):
         """处理捕获的数据包"""
-        if IP in packet:
+        self.metric_captured.inc()
+        if ip_layer(packet) is not None:
             if self.packet_callback:
-                self.packet_callback(packet)
+                if self.packet_callback(packet) is False:
+                    self.metric_dropped.inc()
+        else:
+            self.metric_non_ip.inc()
                 
     def stop(self):
         """停止捕获"""
+        self.is_running = False
         self.stop_capture.set() 
\ No newline at end of file
@@ -1,14 +1,32 @@
 from collections import defaultdict
 import time
 
+from scapy.layers.inet import TCP, UDP
+
+from ids.capture.decoder import ip_layer
+
+from ids.utils.metrics import registry
+
 class SessionHandler:
-    def __init__(self, timeout=60):
+    def __init__(self, timeout=60, on_expire=None):
+        """
+        初始化会话处理器
+        Args:
+            timeout: 会话超时时间（秒）
+            on_expire: 会话结束时的回调 on_expire(session_key, session)，例如写入流记录归档
+        """
         self.sessions = defaultdict(list)
         self.timeout = timeout
+        self.on_expire = on_expire
+        
+        # 监控指标
+        self.metric_latency = registry.histogram('session_add_packet_seconds', '会话更新耗时')
+        self.metric_expired = registry.counter('sessions_expired_total', '超时清理的会话数')
+        registry.gauge('sessions_active', '活动会话数', function=lambda: len(self.sessions))
         
     def get_session_key(self, packet):
         """生成会话键值"""
-        ip = packet.getlayer('IP')
+        ip = ip_layer(packet)
         if TCP in packet:
             return (
                 f"{ip.src}:{packet[TCP].sport}",
@@ -25,6 +43,7 @@ class SessionHandler:
         
     def add_packet(self, packet):
         """将数据包添加到对应的会话中"""
+        start = time.perf_counter()
         session_key = self.get_session_key(packet)
         if session_key:
             self.sessions[session_key].append({
@@ -32,6 +51,7 @@ class SessionHandler:
                 'timestamp': time.time()
             })
             self._cleanup_old_sessions()
+        self.metric_latency.observe(time.perf_counter() - start)
             
     def _cleanup_old_sessions(self):
         """清理超时的会话"""
@@ -43,4 +63,26 @@ class SessionHandler:
                 expired_sessions.append(key)
                 
         for key in expired_sessions:
-            del self.sessions[key] 
\ No newline at end of file
+            self._expire(key)
+        if expired_sessions:
+            self.metric_expired.inc(len(expired_sessions))
+            
+    def flow_summaries(self):
+        """活动会话的流记录摘要（用于检查点，格式见flow_archive.session_to_flow）"""
+        from ids.models.flow_archive import session_to_flow
+        summaries = []
+        for key, session in list(self.sessions.items()):
+            record = session_to_flow(key, list(session))
+            if record is not None:
+                summaries.append(record)
+        return summaries
+        
+    def close(self):
+        """结束所有活动会话（停止时调用，保证会话回调不丢失）"""
+        for key in list(self.sessions):
+            self._expire(key)
+            
+    def _expire(self, key):
+        session = self.sessions.pop(key)
+        if self.on_expire is not None:
+            self.on_expire(key, session)
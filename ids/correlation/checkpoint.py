@@ -0,0 +1,276 @@
+import gc
+import logging
+import os
+import struct
+import time
+from pathlib import Path
+from threading import Event, Thread
+from typing import Dict, List, Optional, Tuple
+
+from ids.correlation.event_correlator import EventCorrelator, shard_of
+from ids.correlation.window import WindowCounter
+from ids.utils.metrics import registry
+
+MAGIC = b'IDSCKPT1'
+# 文件头：魔数, 类型, 快照时间（墙上时间）, 记录数
+HEADER = struct.Struct('<8sBdI')
+KIND_WINDOWS = 1
+KIND_FLOWS = 2
+# 计数器记录：规则序号, 分组键长度, 时间窗口, 桶数, 最新桶起点距快照的时长, 首个/最新事件距快照的时长, 非零桶数
+WINDOW = struct.Struct('<HHfHfffH')
+# 非零桶：距最新桶的桶数, 事件数
+BUCKET = struct.Struct('<HI')
+# 流记录摘要（顺序与flow_archive.COLUMNS一致）
+FLOW = struct.Struct('<dd16s16sHHBIQ')
+
+def _write_atomic(path: Path, chunks: List[bytes]):
+    """先写入临时文件再重命名，读取方不会看到不完整的文件"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+
+def _read(path: Path, kind: int) -> Tuple[Optional[float], int, memoryview]:
+    data = memoryview(path.read_bytes())
+    magic, file_kind, saved_at, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or file_kind != kind:
+        raise ValueError(f"无效的检查点文件: {path}")
+    return saved_at, count, data[HEADER.size:]
+
+def encode_windows(items: List[Tuple[str, str, WindowCounter]], saved_at: float) -> List[bytes]:
+    """将计数器编码为二进制（时间保存为距快照时间的时长，恢复时按快照时间还原）"""
+    rules: Dict[str, int] = {}
+    body = []
+    records = 0
+    for rule_name, key, window in items:
+        head = window.head
+        counts = window.counts
+        last_time = window.last_time
+        if head is None or last_time is None:
+            continue
+        size = window.size
+        # 按距最新桶的偏移排列：最新桶在前
+        split = head % size + 1
+        ordered = counts[split - 1::-1] + counts[:split - 1:-1]
+        buckets = [BUCKET.pack(offset, count) for offset, count in enumerate(ordered) if count]
+        if not buckets:
+            continue
+        index = rules.setdefault(rule_name, len(rules))
+        encoded = key.encode('utf-8', 'surrogatepass')
+        first_time = window.first_time if window.first_time is not None else last_time
+        body.append(WINDOW.pack(
+            index, len(encoded), window.width * size, size,
+            saved_at - head * window.width, saved_at - first_time, saved_at - last_time, len(buckets)
+        ))
+        body.append(encoded)
+        body.extend(buckets)
+        records += 1
+
+    names = [name.encode('utf-8') for name in rules]
+    table = [struct.pack('<H', len(names))]
+    for name in names:
+        table.append(struct.pack('<H', len(name)))
+        table.append(name)
+    return [HEADER.pack(MAGIC, KIND_WINDOWS, saved_at, records)] + table + body
+
+def decode_windows(path: Path):
+    """逐条解码计数器记录，返回 (规则名, 分组键, 时间窗口, 桶数, 时间信息, [(桶偏移, 事件数)])"""
+    saved_at, _, data = _read(path, KIND_WINDOWS)
+    position = 0
+    count, = struct.unpack_from('<H', data, position)
+    position += 2
+    names = []
+    for _ in range(count):
+        length, = struct.unpack_from('<H', data, position)
+        position += 2
+        names.append(bytes(data[position:position + length]).decode('utf-8'))
+        position += length
+
+    end = len(data)
+    unpack_window = WINDOW.unpack_from
+    unpack_bucket = BUCKET.unpack_from
+    while position < end:
+        index, key_length, window, size, head_age, first_age, last_age, nonzero = unpack_window(data, position)
+        position += WINDOW.size
+        key = bytes(data[position:position + key_length]).decode('utf-8', 'surrogatepass')
+        position += key_length
+        buckets = [unpack_bucket(data, position + i * BUCKET.size) for i in range(nonzero)]
+        position += nonzero * BUCKET.size
+        yield (names[index], key, window, size,
+               (saved_at - head_age, saved_at - first_age, saved_at - last_age), buckets)
+
+def rebuild_window(time_window: float, saved_window: float, saved_size: int,
+                   times: Tuple[float, float, float], buckets: List[Tuple[int, int]]) -> WindowCounter:
+    """按快照中的绝对时间重建计数器（规则的时间窗口改变时重新分桶）"""
+    head_time, first_time, last_time = times
+    saved_width = saved_window / saved_size
+    window = WindowCounter(time_window)
+    width = window.width
+    # 使用桶中点计算新桶序号，避免浮点误差落到相邻桶
+    window.head = int((head_time + saved_width / 2) // width)
+    oldest = window.head - window.size
+    for offset, count in buckets:
+        index = int((head_time - offset * saved_width + saved_width / 2) // width)
+        if oldest < index <= window.head:
+            window.counts[index % window.size] += count
+            window.total += count
+    if window.total:
+        window.first_time = first_time
+        window.last_time = last_time
+    return window
+
+class Checkpointer:
+    def __init__(self, directory: str, correlator: EventCorrelator, session_handler=None,
+                 interval: float = 60, flow_archive=None):
+        """
+        初始化关联状态检查点（每个分片一个二进制文件，只重写有变化的分片）
+        Args:
+            directory: 检查点目录
+            correlator: 事件关联器
+            session_handler: 会话处理器（保存活动会话的流记录摘要）
+            interval: 检查点间隔（秒）
+            flow_archive: 流记录归档，每次检查点时写入缓冲时间超过flush_interval的流记录
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.correlator = correlator
+        self.session_handler = session_handler
+        self.interval = interval
+        self.flow_archive = flow_archive
+        self.logger = logging.getLogger(__name__)
+        self.saved_versions: Dict[int, int] = {}  # 分片 -> 已写入检查点的版本
+
+        self.stop_event = Event()
+        self.thread = None
+
+        # 监控指标
+        self.metric_latency = registry.histogram('checkpoint_seconds', '写入检查点耗时',
+                                                 buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60))
+        self.metric_shards = registry.counter('checkpoint_shards_written_total', '写入检查点的分片数')
+
+    def shard_path(self, index: int) -> Path:
+        return self.directory / f"correlator-{index:04d}.bin"
+
+    @property
+    def flows_path(self) -> Path:
+        return self.directory / 'flows.bin'
+
+    def save(self, force: bool = False) -> int:
+        """写入检查点，返回写入的分片数
+
+        每个分片只在锁内复制计数器列表，编码在锁外进行；热路径上的修改可能与编码交错，
+        恢复时按各桶计数重新求和，不依赖快照中的总数。
+        """
+        start = time.perf_counter()
+        written = 0
+        owned = self.correlator.owned_shards
+        for index, shard in enumerate(self.correlator.shards):
+            if owned is not None and index not in owned:
+                # 其他进程负责的分片，不覆盖它们的文件
+                continue
+            with shard.lock:
+                version = shard.version
+                if not force and self.saved_versions.get(index) == version:
+                    continue
+                items = [
+                    (rule_name, key, window)
+                    for rule_name, windows in shard.windows.items()
+                    for key, window in windows.items()
+                ]
+            _write_atomic(self.shard_path(index), encode_windows(items, time.time()))
+            self.saved_versions[index] = version
+            written += 1
+
+        if self.session_handler is not None:
+            flows = self.session_handler.flow_summaries()
+            _write_atomic(self.flows_path, [HEADER.pack(MAGIC, KIND_FLOWS, time.time(), len(flows))]
+                          + [FLOW.pack(*flow) for flow in flows])
+
+        self.metric_shards.inc(written)
+        self.metric_latency.observe(time.perf_counter() - start)
+        return written
+
+    def restore(self, now: float = None) -> Tuple[int, List[tuple]]:
+        """从检查点恢复关联计数器，返回 (恢复的计数器数, 上次运行中未结束会话的流记录摘要)
+
+        快照中的时间按快照时间还原为绝对时间，已过期的计数器直接跳过；
+        分片数改变或只负责部分分片时按分组键重新分配。
+        """
+        now = time.time() if now is None else now
+        correlator = self.correlator
+        rules = {rule.name: rule for rule in correlator.correlation_rules}
+        shards = correlator.shards
+        owned = correlator.owned_shards
+        restored = 0
+        pending = [[] for _ in shards]  # 分片 -> 待放入的计数器
+        # 恢复时创建大量小对象，暂停循环垃圾回收避免反复扫描
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for path in sorted(self.directory.glob('correlator-*.bin')):
+                try:
+                    records = list(decode_windows(path))
+                except (OSError, ValueError, struct.error) as e:
+                    self.logger.error(f"读取检查点失败 {path.name}: {str(e)}")
+                    continue
+                for rule_name, key, saved_window, size, times, buckets in records:
+                    rule = rules.get(rule_name)
+                    # 最新事件已超出当前规则的窗口，无需重建
+                    if rule is None or now - times[2] >= rule.time_window * (1 + 1 / size):
+                        continue
+                    index = shard_of(key, len(shards))
+                    if owned is not None and index not in owned:
+                        continue
+                    window = rebuild_window(rule.time_window, saved_window, size, times, buckets)
+                    if not window.total or window.expired(now):
+                        continue
+                    pending[index].append((rule_name, key, window))
+                    restored += 1
+                if owned is None and int(path.stem.split('-')[1]) >= len(shards):
+                    # 分片数减少后多出的文件，其中的计数器已重新分配
+                    path.unlink()
+            for shard, items in zip(shards, pending):
+                if items:
+                    with shard.lock:
+                        shard.put_many(items)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        flows = []
+        if self.flows_path.exists():
+            try:
+                _, count, data = _read(self.flows_path, KIND_FLOWS)
+                flows = [FLOW.unpack_from(data, i * FLOW.size) for i in range(count)]
+            except (OSError, ValueError, struct.error) as e:
+                self.logger.error(f"读取流记录检查点失败: {str(e)}")
+        self.logger.info(f"从检查点恢复 {restored} 个关联计数器, {len(flows)} 条未结束的流")
+        return restored, flows
+
+    def clear_flows(self):
+        """删除流记录摘要（恢复的流写入归档后调用，再次异常退出时不会重复归档）"""
+        self.flows_path.unlink(missing_ok=True)
+
+    def start(self):
+        self.thread = Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止后台线程并写入最后一次检查点"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.save()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                self.logger.error(f"写入检查点失败: {str(e)}")
+            if self.flow_archive is not None:
+                try:
+                    self.flow_archive.flush_due()
+                except Exception as e:
+                    self.logger.error(f"写入流记录归档失败: {str(e)}")
@@ -1,9 +1,17 @@
 from collections import defaultdict
+import heapq
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
 import threading
 import time
+import zlib
+
+from ids.correlation.rule_index import RuleIndex
+from ids.correlation.sequence import SequenceMatcher, SequenceRule, SequenceStep
+from ids.correlation.window import WindowCounter
+from ids.utils.metrics import registry
+from ids.utils.suppression import AlertSuppressor
 
 class CorrelationRule:
     def __init__(self, name: str, conditions: Dict[str, Any], time_window: int, threshold: int, severity: str):
@@ -22,13 +30,95 @@ class CorrelationRule:
         self.threshold = threshold
         self.severity = severity
 
+# 每处理一个事件时顺带清理的过期计数器数上限
+EXPIRE_BATCH = 4
+
+def shard_of(key: str, shards: int) -> int:
+    """分组键所在的分片（使用稳定哈希，多进程部署时各进程结果一致）"""
+    return zlib.crc32(key.encode('utf-8', 'surrogatepass')) % shards
+
+class CorrelatorShard:
+    """按分组键哈希划分的关联状态分片，每个分片有独立的锁和过期堆"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = defaultdict(dict)  # 规则名 -> {分组键: 滑动窗口计数器}
+        self.expiry = []  # (过期时间, 规则名, 分组键) 最小堆，计数器更新后延迟重新入堆
+        self.keys = 0
+        self.version = 0  # 每次修改递增，用于增量检查点
+        
+    def window(self, rule: CorrelationRule, key: str) -> WindowCounter:
+        """获取(规则, 分组键)的计数器，不存在时创建（调用方持有锁）"""
+        windows = self.windows[rule.name]
+        window = windows.get(key)
+        if window is None:
+            window = windows[key] = WindowCounter(rule.time_window)
+            self.keys += 1
+            heapq.heappush(self.expiry, (window.expires_at(), rule.name, key))
+        return window
+        
+    def put_many(self, items: Iterable[Tuple[str, str, WindowCounter]]):
+        """批量放入恢复的计数器（调用方持有锁）"""
+        for rule_name, key, window in items:
+            windows = self.windows[rule_name]
+            if key not in windows:
+                self.keys += 1
+            windows[key] = window
+            self.expiry.append((window.expires_at(), rule_name, key))
+        heapq.heapify(self.expiry)
+        self.version += 1
+        
+    def expire(self, now: float, limit: Optional[int] = None) -> int:
+        """删除已过期的计数器，最多检查limit个堆顶条目（调用方持有锁）"""
+        removed = 0
+        checked = 0
+        expiry = self.expiry
+        while expiry and expiry[0][0] <= now and (limit is None or checked < limit):
+            _, rule_name, key = heapq.heappop(expiry)
+            checked += 1
+            windows = self.windows.get(rule_name)
+            window = windows.get(key) if windows else None
+            if window is None:
+                continue
+            if window.expired(now):
+                del windows[key]
+                if not windows:
+                    del self.windows[rule_name]
+                self.keys -= 1
+                self.version += 1
+                removed += 1
+            else:
+                # 期间有新事件，按最新事件时间重新入堆
+                heapq.heappush(expiry, (window.expires_at(), rule_name, key))
+        return removed
+        
 class EventCorrelator:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, suppressor: AlertSuppressor = None, shards: int = 16,
+                 owned_shards: Optional[Iterable[int]] = None):
+        """
+        初始化事件关联器
+        Args:
+            db_manager: 数据库管理器
+            suppressor: 关联告警抑制器（冷却期、聚合与限速），默认每个(规则, 分组键)60秒冷却
+            shards: 关联状态的分片数（按分组键哈希划分，各分片独立加锁）
+            owned_shards: 本实例负责的分片（多进程部署时每个进程负责一部分分片，
+                其他分片的分组键直接跳过；None表示全部）
+        """
         self.db_manager = db_manager
+        self.suppressor = suppressor or AlertSuppressor(name='correlation')
         self.logger = logging.getLogger('EventCorrelator')
-        self.event_buffer = defaultdict(list)  # 事件缓冲区
-        self.correlation_rules = []  # 关联规则列表
-        self.lock = threading.Lock()
+        self.shards = [CorrelatorShard() for _ in range(max(1, int(shards)))]
+        self.owned_shards: Optional[Set[int]] = set(owned_shards) if owned_shards is not None else None
+        self.rule_index = RuleIndex()  # 按区分字段索引的关联规则
+        self.sequences = SequenceMatcher(on_match=self._generate_sequence_alert)  # 多步骤序列规则
+        
+        # 监控指标
+        self.metric_latency = registry.histogram('correlation_process_seconds', '关联事件处理耗时')
+        self.metric_events = registry.counter('correlation_events_total', '处理的关联事件数')
+        self.metric_alerts = registry.counter('correlation_alerts_total', '产生的关联告警数')
+        self.metric_expired = registry.counter('correlation_expired_keys_total', '过期删除的关联计数器数')
+        registry.gauge('correlation_buffer_keys', '关联缓冲区中的分组键数',
+                       function=lambda: sum(shard.keys for shard in self.shards))
         
         # 启动清理线程
         self.cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
@@ -77,110 +167,162 @@ class EventCorrelator:
             severity='critical'
         )
         
+        # 攻击链序列规则：扫描 -> 对同一主机暴力破解 -> 该主机对外产生告警
+        kill_chain_rule = SequenceRule(
+            name="Kill Chain: Scan, Brute Force, Outbound",
+            steps=[
+                SequenceStep({'rule_name': 'Port Scan Detection'}, bind={'attacker': 'src_ip'}),
+                SequenceStep({'dst_port': [22, 23, 3389]}, bind={'attacker': 'src_ip', 'host': 'dst_ip'},
+                             within=600),
+                SequenceStep({'alert_type': ['rule', 'ml']}, bind={'host': 'src_ip'}),
+            ],
+            window=1800,      # 30分钟
+            severity='critical'
+        )
+        
         self.add_rule(port_scan_rule)
         self.add_rule(brute_force_rule)
         self.add_rule(ddos_rule)
+        self.add_sequence(kill_chain_rule)
+        
+    @property
+    def correlation_rules(self) -> List[CorrelationRule]:
+        """关联规则列表（按添加顺序）"""
+        return self.rule_index.rules
+        
+    @correlation_rules.setter
+    def correlation_rules(self, rules: List[CorrelationRule]):
+        self.rule_index = RuleIndex(rules)
         
     def add_rule(self, rule: CorrelationRule):
         """添加关联规则"""
-        self.correlation_rules.append(rule)
+        self.rule_index.add(rule)
+        
+    def add_sequence(self, rule: SequenceRule):
+        """添加序列关联规则"""
+        self.sequences.add_rule(rule)
         
     def process_event(self, event: Dict):
         """处理新事件"""
-        with self.lock:
-            current_time = datetime.utcnow()
-            
-            # 将事件添加到缓冲区
-            for rule in self.correlation_rules:
-                if self._event_matches_conditions(event, rule.conditions):
-                    key = self._generate_group_key(event, rule.conditions['group_by'])
-                    self.event_buffer[key].append({
-                        'timestamp': current_time,
-                        'event': event
-                    })
-                    
-                    # 检查是否触发规则
-                    if self._check_rule_trigger(key, rule):
-                        self._generate_correlation_alert(key, rule)
-                        
-    def _event_matches_conditions(self, event: Dict, conditions: Dict) -> bool:
-        """检查事件是否匹配条件"""
-        for key, value in conditions.items():
-            if key == 'group_by':
+        start = time.perf_counter()
+        self.metric_events.inc()
+        current_time = time.time()
+        
+        # 只检查索引给出的候选规则，按规则分别计数（同一分组键在不同规则下互不影响）
+        for compiled in self.rule_index.match(event):
+            rule = compiled.rule
+            key = compiled.group_key(event)
+            index = shard_of(key, len(self.shards))
+            if self.owned_shards is not None and index not in self.owned_shards:
                 continue
-                
-            if key not in event:
-                return False
-                
-            if isinstance(value, list):
-                if event[key] not in value:
-                    return False
-            elif event[key] != value:
-                return False
-                
-        return True
-        
-    def _generate_group_key(self, event: Dict, group_by: List[str]) -> str:
-        """生成分组键值"""
-        return "|".join(str(event.get(field, '')) for field in group_by)
-        
-    def _check_rule_trigger(self, key: str, rule: CorrelationRule) -> bool:
-        """检查是否触发规则"""
-        current_time = datetime.utcnow()
-        window_start = current_time - timedelta(seconds=rule.time_window)
-        
-        # 统计时间窗口内的事件数
-        events_in_window = [
-            e for e in self.event_buffer[key]
-            if e['timestamp'] >= window_start
-        ]
-        
-        return len(events_in_window) >= rule.threshold
-        
-    def _generate_correlation_alert(self, key: str, rule: CorrelationRule):
-        """生成关联告警"""
-        events = self.event_buffer[key]
+            shard = self.shards[index]
+            alert = None
+            with shard.lock:
+                window = shard.window(rule, key)
+                count = window.add(current_time, event)
+                shard.version += 1
+                # 检查是否触发规则
+                if count >= rule.threshold:
+                    alert = self._build_correlation_alert(rule, window)
+                # 顺带清理少量过期计数器，不需要全局清扫
+                expired = shard.expire(current_time, EXPIRE_BATCH)
+            if expired:
+                self.metric_expired.inc(expired)
+            # 在分片锁外写入告警，数据库背压不会阻塞其他分片
+            if alert is not None:
+                self._generate_correlation_alert(key, rule, alert)
+        # 序列规则跨多个关联键，由负责0号分片的实例处理
+        if self.sequences.sequences and (self.owned_shards is None or 0 in self.owned_shards):
+            self.sequences.process(event, current_time)
+        if self.suppressor.due():
+            self.flush_incidents()
+        self.metric_latency.observe(time.perf_counter() - start)
+                        
+    def shards_for(self, event: Dict) -> Set[int]:
+        """事件涉及的分片（多进程部署时用于把事件路由到负责这些分片的进程）"""
+        return {
+            shard_of(compiled.group_key(event), len(self.shards))
+            for compiled in self.rule_index.match(event)
+        }
+        
+    def get_window(self, rule_name: str, key: str) -> Optional[WindowCounter]:
+        """获取(规则, 分组键)的计数器"""
+        shard = self.shards[shard_of(key, len(self.shards))]
+        with shard.lock:
+            return shard.windows.get(rule_name, {}).get(key)
         
-        correlation_alert = {
+    def _build_correlation_alert(self, rule: CorrelationRule, window: WindowCounter) -> Dict:
+        """根据计数器当前状态构造关联告警（调用方持有分片锁）"""
+        return {
             'timestamp': datetime.utcnow(),
             'alert_type': 'correlation',
             'rule_name': rule.name,
             'severity': rule.severity,
             'description': f"检测到关联事件: {rule.name}",
-            'events_count': len(events),
-            'related_events': [e['event'] for e in events[-10:]],  # 最近10个相关事件
-            'first_event_time': events[0]['timestamp'],
-            'last_event_time': events[-1]['timestamp']
+            'events_count': window.total,
+            'related_events': window.recent_events(),  # 最近10个相关事件
+            'first_event_time': datetime.utcfromtimestamp(window.first_time),
+            'last_event_time': datetime.utcfromtimestamp(window.last_time)
         }
         
+    def _generate_correlation_alert(self, key: str, rule: CorrelationRule, correlation_alert: Dict):
+        """生成关联告警"""
+        # 冷却期内或超过限速的告警只累加到聚合事件中，由flush_incidents定期写入
+        if not self.suppressor.allow((rule.name, key), correlation_alert):
+            return
+            
         # 保存到数据库
+        self.metric_alerts.inc()
         self.db_manager.save_correlation_alert(correlation_alert)
         self.logger.warning(
             f"关联告警: {rule.name}, 严重程度: {rule.severity}, "
-            f"相关事件数: {len(events)}"
+            f"相关事件数: {correlation_alert['events_count']}"
         )
         
+    def _generate_sequence_alert(self, rule: SequenceRule, bindings: Dict[str, Any],
+                                 first_time: float, last_time: float):
+        """序列规则完成时生成关联告警"""
+        key = "|".join(f"{name}={value}" for name, value in bindings.items())
+        self._generate_correlation_alert(key, rule, {
+            'timestamp': datetime.utcnow(),
+            'alert_type': 'correlation',
+            'rule_name': rule.name,
+            'severity': rule.severity,
+            'description': f"检测到攻击序列: {rule.name} ({key})",
+            'events_count': len(rule.steps),
+            'related_events': [bindings],
+            'first_event_time': datetime.utcfromtimestamp(first_time),
+            'last_event_time': datetime.utcfromtimestamp(last_time)
+        })
+        
+    def flush_incidents(self, force: bool = False):
+        """将有被抑制告警的聚合事件写入数据库（每个事件一条汇总告警）"""
+        for incident in self.suppressor.flush(force=force):
+            alert = dict(incident.alert)
+            alert['timestamp'] = datetime.utcnow()
+            alert['description'] = (
+                f"检测到关联事件: {alert['rule_name']}（聚合 {incident.pending} 条被抑制的告警）"
+            )
+            self.metric_alerts.inc()
+            self.db_manager.save_correlation_alert(alert)
+            self.logger.warning(
+                f"关联告警聚合: {alert['rule_name']}, 分组键: {incident.key[1]}, "
+                f"抑制告警数: {incident.pending}, 相关事件数: {alert['events_count']}"
+            )
+            
+    def close(self):
+        """写入所有未上报的聚合事件"""
+        self.flush_incidents(force=True)
+        
     def _cleanup_loop(self):
-        """清理过期事件"""
+        """逐个分片删除过期计数器（处理没有新事件的分片），每次只锁一个分片"""
         while True:
-            with self.lock:
-                current_time = datetime.utcnow()
-                # 找出最长的时间窗口
-                max_window = max(
-                    (rule.time_window for rule in self.correlation_rules),
-                    default=3600
-                )
-                cutoff_time = current_time - timedelta(seconds=max_window)
-                
-                # 清理过期事件
-                for key in list(self.event_buffer.keys()):
-                    self.event_buffer[key] = [
-                        e for e in self.event_buffer[key]
-                        if e['timestamp'] >= cutoff_time
-                    ]
-                    
-                    # 如果没有事件了，删除这个key
-                    if not self.event_buffer[key]:
-                        del self.event_buffer[key]
+            for shard in self.shards:
+                with shard.lock:
+                    expired = shard.expire(time.time())
+                if expired:
+                    self.metric_expired.inc(expired)
+            self.sequences.expire(time.time())
+            self.flush_incidents()
                         
-            time.sleep(60)  # 每分钟清理一次 
\ No newline at end of file
+            time.sleep(60)  # 每分钟清理一次
@@ -0,0 +1,111 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# 用于建立分发索引的区分字段（按优先级）
+INDEX_FIELDS = ('alert_type', 'rule_name', 'severity', 'dst_port')
+
+_MISSING = object()
+
+def compile_conditions(conditions: Dict[str, Any]) -> Tuple[Tuple[str, Any, bool], ...]:
+    """将匹配条件编译为 (字段, 取值, 是否为列表) 元组，忽略group_by"""
+    return tuple(
+        (field, tuple(value) if isinstance(value, list) else value, isinstance(value, list))
+        for field, value in conditions.items()
+        if field != 'group_by'
+    )
+
+def matches(event: Dict, checks: Sequence[Tuple[str, Any, bool]]) -> bool:
+    """检查事件是否满足编译后的条件（与逐条比较的语义一致：字段必须存在，列表条件表示取值之一）"""
+    for field, value, is_list in checks:
+        actual = event.get(field, _MISSING)
+        if actual is _MISSING:
+            return False
+        if is_list:
+            if actual not in value:
+                return False
+        elif actual != value:
+            return False
+    return True
+
+def compile_group_key(group_by: Sequence[str]) -> Callable[[Dict], str]:
+    """生成分组键提取函数，结果与 "|".join(str(event.get(field, ''))) 一致"""
+    fields = tuple(group_by)
+    if len(fields) == 1:
+        field, = fields
+        return lambda event: str(event.get(field, ''))
+    if len(fields) == 2:
+        first, second = fields
+        return lambda event: str(event.get(first, '')) + '|' + str(event.get(second, ''))
+    return lambda event: "|".join([str(event.get(field, '')) for field in fields])
+
+class CompiledRule:
+    __slots__ = ('rule', 'order', 'checks', 'group_key')
+
+    def __init__(self, rule, order: int):
+        self.rule = rule
+        self.order = order
+        self.checks = compile_conditions(rule.conditions)
+        self.group_key = compile_group_key(rule.conditions.get('group_by', []))
+
+class RuleIndex:
+    """按区分字段索引的规则集合
+
+    每条规则挂在其条件中优先级最高的区分字段下（列表条件按每个取值各挂一次），
+    没有区分字段条件的规则对所有事件都要检查。事件只与候选规则比较，候选规则
+    仍按完整条件匹配，并保持规则添加顺序。
+    """
+
+    def __init__(self, rules: Iterable = ()):
+        self.rules: List = []
+        self.compiled: List[CompiledRule] = []
+        self.index: Dict[str, Dict[Any, List[CompiledRule]]] = {field: defaultdict(list) for field in INDEX_FIELDS}
+        self.unindexed: List[CompiledRule] = []
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def add(self, rule):
+        compiled = CompiledRule(rule, len(self.rules))
+        self.rules.append(rule)
+        self.compiled.append(compiled)
+        field = next((field for field in INDEX_FIELDS if field in rule.conditions), None)
+        if field is None:
+            self.unindexed.append(compiled)
+            return
+        value = rule.conditions[field]
+        values = value if isinstance(value, list) else [value]
+        try:
+            for item in values:
+                hash(item)
+        except TypeError:
+            # 取值不可哈希，无法建立索引
+            self.unindexed.append(compiled)
+            return
+        for item in dict.fromkeys(values):
+            self.index[field][item].append(compiled)
+
+    def candidates(self, event: Dict) -> List[CompiledRule]:
+        """获取可能匹配事件的规则（按添加顺序）"""
+        found = list(self.unindexed)
+        for field, buckets in self.index.items():
+            if not buckets:
+                continue
+            value = event.get(field, _MISSING)
+            if value is _MISSING:
+                continue
+            try:
+                rules = buckets.get(value)
+            except TypeError:
+                # 事件取值不可哈希时退回逐条比较该字段下的所有规则
+                rules = [rule for bucket in buckets.values() for rule in bucket]
+            if rules:
+                found.extend(rules)
+        if len(found) > 1:
+            found = sorted(set(found), key=lambda compiled: compiled.order)
+        return found
+
+    def match(self, event: Dict) -> List[CompiledRule]:
+        """获取匹配事件的规则（按添加顺序）"""
+        return [compiled for compiled in self.candidates(event) if matches(event, compiled.checks)]
@@ -0,0 +1,196 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ids.correlation.rule_index import RuleIndex
+from ids.utils.metrics import registry
+
+_MISSING = object()
+
+class SequenceStep:
+    def __init__(self, conditions: Dict[str, Any], bind: Dict[str, str] = None, within: float = None):
+        """
+        初始化序列中的一个步骤
+        Args:
+            conditions: 匹配条件（与CorrelationRule相同，列表表示取值之一）
+            bind: 变量 -> 事件字段，已在前面步骤绑定的变量要求取值相同，其余变量在本步骤绑定
+            within: 与上一步骤事件的最大间隔（秒），默认使用序列的总窗口
+        """
+        self.conditions = conditions
+        self.bind = bind or {}
+        self.within = within
+
+class SequenceRule:
+    def __init__(self, name: str, steps: List[SequenceStep], window: float, severity: str,
+                 max_partials: int = 8):
+        """
+        初始化序列关联规则（按顺序依次发生的多个步骤，例如 扫描 -> 暴力破解 -> 外联）
+        Args:
+            name: 规则名称
+            steps: 步骤列表（至少两步）
+            window: 从第一步到最后一步的最大时长（秒）
+            severity: 严重程度
+            max_partials: 每个关联键最多保留的部分匹配数，超出时丢弃最旧的
+        """
+        if len(steps) < 2:
+            raise ValueError(f"序列规则至少需要两个步骤: {name}")
+        self.name = name
+        self.steps = steps
+        self.window = window
+        self.severity = severity
+        self.max_partials = max_partials
+
+class _CompiledStep:
+    """编译后的步骤：作为RuleIndex中的规则使用"""
+    __slots__ = ('sequence', 'position', 'conditions', 'join', 'new', 'within')
+
+    def __init__(self, sequence: '_CompiledSequence', position: int, step: SequenceStep,
+                 bound: List[str], window: float):
+        self.sequence = sequence
+        self.position = position
+        self.conditions = step.conditions
+        # 与已绑定变量比较的事件字段（按变量绑定顺序），以及本步骤新绑定变量的字段
+        self.join = tuple((bound.index(var), field) for var, field in step.bind.items() if var in bound)
+        self.new = tuple(field for var, field in step.bind.items() if var not in bound)
+        self.within = step.within if step.within is not None else window
+
+class _CompiledSequence:
+    """编译后的序列：每个步骤完成后的部分匹配按下一步骤的关联键存放
+
+    stages[i] 为 OrderedDict(关联键 -> deque[(变量取值, 首个事件时间, 最近事件时间)])，
+    按最近更新时间排序，过期清理只需从头部检查。
+    """
+
+    def __init__(self, rule: SequenceRule):
+        self.rule = rule
+        self.steps: List[_CompiledStep] = []
+        bound: List[str] = []
+        for position, step in enumerate(rule.steps):
+            compiled = _CompiledStep(self, position, step, bound, rule.window)
+            if position > 0 and not compiled.join:
+                raise ValueError(f"序列规则 {rule.name} 的第{position + 1}步没有与前面步骤关联的变量")
+            self.steps.append(compiled)
+            bound.extend(var for var in step.bind if var not in bound)
+        self.variables = tuple(bound)
+        self.stages: List[OrderedDict] = [OrderedDict() for _ in rule.steps[:-1]]
+
+    def stage_key(self, position: int, values: Tuple) -> Tuple:
+        """部分匹配完成第position步后，在下一步骤中的关联键"""
+        return tuple(values[index] for index, _ in self.steps[position + 1].join)
+
+class SequenceMatcher:
+    def __init__(self, on_match: Callable[[SequenceRule, Dict[str, Any], float, float], None] = None):
+        """
+        初始化序列匹配器（每个事件只查找与其匹配的步骤，每个步骤一次字典查找）
+        Args:
+            on_match: 序列完成时的回调 on_match(规则, 变量绑定, 首个事件时间, 最后事件时间)
+        """
+        self.on_match = on_match
+        self.sequences: List[_CompiledSequence] = []
+        self.index = RuleIndex()
+        self.lock = threading.Lock()
+
+        # 监控指标
+        self.metric_matches = registry.counter('sequence_matches_total', '完成的序列匹配数')
+        self.metric_expired = registry.counter('sequence_partials_expired_total', '过期删除的部分匹配键数')
+        registry.gauge('sequence_partial_keys', '保存部分匹配的关联键数',
+                       function=lambda: sum(len(stage) for sequence in self.sequences for stage in sequence.stages))
+
+    def add_rule(self, rule: SequenceRule):
+        sequence = _CompiledSequence(rule)
+        with self.lock:
+            self.sequences.append(sequence)
+            for step in sequence.steps:
+                self.index.add(step)
+
+    def process(self, event: Dict, now: float) -> int:
+        """处理事件，返回完成的序列数"""
+        completed = []
+        with self.lock:
+            touched = {}
+            # 同一事件匹配多个步骤时从后往前推进，避免一个事件连续完成多步
+            for compiled in reversed(self.index.match(event)):
+                step = compiled.rule
+                touched[id(step.sequence)] = step.sequence
+                new_values = tuple(event.get(field, _MISSING) for field in step.new)
+                if _MISSING in new_values:
+                    continue
+                if step.position == 0:
+                    self._store(step.sequence, 0, new_values, now, now)
+                else:
+                    completed.extend(self._advance(step, event, new_values, now))
+            # 只在涉及的序列中顺带清理少量过期的部分匹配
+            for sequence in touched.values():
+                self._expire(sequence, now, limit=4)
+
+        for sequence, values, first_time in completed:
+            self.metric_matches.inc()
+            if self.on_match is not None:
+                self.on_match(sequence.rule, dict(zip(sequence.variables, values)), first_time, now)
+        return len(completed)
+
+    def expire(self, now: float) -> int:
+        """删除所有已过期的部分匹配"""
+        with self.lock:
+            return sum(self._expire(sequence, now) for sequence in self.sequences)
+
+    def partials(self, rule_name: str) -> List[int]:
+        """各阶段保存的部分匹配数（用于监控和测试）"""
+        with self.lock:
+            for sequence in self.sequences:
+                if sequence.rule.name == rule_name:
+                    return [sum(len(entries) for entries in stage.values()) for stage in sequence.stages]
+        return []
+
+    def _advance(self, step: _CompiledStep, event: Dict, new_values: Tuple, now: float):
+        """用事件推进上一阶段中关联键相同的部分匹配（调用方持有锁）"""
+        sequence = step.sequence
+        key = tuple(event.get(field, _MISSING) for _, field in step.join)
+        entries = sequence.stages[step.position - 1].get(key)
+        if not entries:
+            return []
+        window = sequence.rule.window
+        completed = []
+        for values, first_time, last_time in list(entries):
+            if now - last_time > step.within or now - first_time > window:
+                continue
+            values = values + new_values
+            if step.position == len(sequence.steps) - 1:
+                completed.append((sequence, values, first_time))
+            else:
+                self._store(sequence, step.position, values, first_time, now)
+        return completed
+
+    def _store(self, sequence: _CompiledSequence, position: int, values: Tuple, first_time: float, now: float):
+        """保存完成第position步的部分匹配（同一变量取值只保留一条，按最近事件时间更新）"""
+        stage = sequence.stages[position]
+        key = sequence.stage_key(position, values)
+        entries = stage.get(key)
+        if entries is None:
+            entries = stage[key] = deque(maxlen=sequence.rule.max_partials)
+        else:
+            stage.move_to_end(key)
+            for i, entry in enumerate(entries):
+                if entry[0] == values:
+                    # 同一变量取值重复出现时保留较晚的开始时间，总窗口从最近一次开始计算
+                    first_time = max(first_time, entry[1])
+                    del entries[i]
+                    break
+        entries.append((values, first_time, now))
+
+    def _expire(self, sequence: _CompiledSequence, now: float, limit: Optional[int] = None) -> int:
+        """从各阶段头部删除最近事件已超出下一步骤间隔的关联键（调用方持有锁）"""
+        removed = 0
+        for position, stage in enumerate(sequence.stages):
+            within = sequence.steps[position + 1].within
+            checked = 0
+            while stage and (limit is None or checked < limit):
+                key, entries = next(iter(stage.items()))
+                if now - entries[-1][2] <= within:
+                    break
+                del stage[key]
+                checked += 1
+                removed += 1
+        if removed:
+            self.metric_expired.inc(removed)
+        return removed
@@ -0,0 +1,76 @@
+from collections import deque
+from typing import Any, List, Optional
+
+class WindowCounter:
+    """滑动时间窗口计数器（环形时间桶）
+
+    窗口被划分为固定数量的时间桶，添加事件和查询窗口内事件数都是O(1)
+    （跨越多个桶时按经过的桶数摊还，最多清空一圈）。计数精度为一个桶的宽度。
+    只保留最近的少量事件样本用于告警详情。
+    """
+    __slots__ = ('width', 'size', 'counts', 'head', 'total',
+                 'first_time', 'last_time', 'samples')
+
+    def __init__(self, window: float, buckets: int = 60, samples: int = 10):
+        self.width = window / buckets
+        self.size = buckets
+        self.counts = [0] * buckets
+        self.head: Optional[int] = None  # 最新时间桶的序号
+        self.total = 0
+        self.first_time: Optional[float] = None  # 本轮连续事件（窗口未清空）中第一个事件的时间
+        self.last_time: Optional[float] = None
+        self.samples = deque(maxlen=samples)
+
+    def add(self, timestamp: float, event: Any = None) -> int:
+        """添加一个事件，返回窗口内的事件数"""
+        index = int(timestamp // self.width)
+        self._advance(index)
+        if index <= self.head - self.size:
+            # 早于窗口的迟到事件
+            return self.total
+        if self.total == 0:
+            self.first_time = timestamp
+        self.counts[index % self.size] += 1
+        self.total += 1
+        self.last_time = timestamp if self.last_time is None else max(self.last_time, timestamp)
+        if event is not None:
+            self.samples.append(event)
+        return self.total
+
+    def count(self, now: float) -> int:
+        """窗口内的事件数"""
+        self._advance(int(now // self.width))
+        return self.total
+
+    def expired(self, now: float) -> bool:
+        """窗口内已没有事件（可以删除该计数器）"""
+        return self.last_time is None or now >= self.expires_at()
+
+    def expires_at(self) -> float:
+        """没有新事件时计数器过期的时间"""
+        return (self.last_time or 0.0) + self.width * (self.size + 1)
+
+    def recent_events(self) -> List[Any]:
+        return list(self.samples)
+
+    def _advance(self, index: int):
+        """将窗口推进到index所在的桶，清空移出窗口的桶"""
+        if self.head is None:
+            self.head = index
+            return
+        steps = index - self.head
+        if steps <= 0:
+            return
+        if steps >= self.size:
+            self.counts = [0] * self.size
+            self.total = 0
+        else:
+            counts = self.counts
+            for i in range(self.head + 1, index + 1):
+                slot = i % self.size
+                self.total -= counts[slot]
+                counts[slot] = 0
+        self.head = index
+        if self.total == 0:
+            self.first_time = None
+            self.samples.clear()
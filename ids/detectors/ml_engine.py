@@ -1,20 +1,63 @@
 import logging
+import time
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from typing import Dict
+from typing import Dict, List
 
 from ids.models.packet_features import PacketFeatures
+from ids.utils.metrics import registry
+
+# 模型输入特征（顺序固定）
+FEATURE_NAMES = [
+    'ip_len', 'ip_ttl', 'ip_proto',
+    'tcp_sport', 'tcp_dport', 'tcp_flags', 'tcp_window',
+    'udp_sport', 'udp_dport', 'udp_len',
+]
 
 class MLEngine:
     def __init__(self, model_path: str = None):
-        self.model = IsolationForest(random_state=42)
+        self.model = None  # 训练时才导入scikit-learn
+        self.is_trained = False
         self.logger = logging.getLogger(__name__)
         
-    def predict(self, features: Dict) -> bool:
+        # 监控指标
+        self.metric_latency = registry.histogram('ml_predict_seconds', '机器学习预测耗时')
+        self.metric_errors = registry.counter('ml_predict_errors_total', '机器学习预测失败次数')
+        
+    def train(self, features_list: List[Dict]) -> None:
+        """使用正常流量的特征训练模型"""
+        from sklearn.ensemble import IsolationForest
+        
+        X = np.array([self._feature_vector(f) for f in features_list], dtype=float)
+        self.model = IsolationForest(random_state=42)
+        self.model.fit(X)
+        self.is_trained = True
+        self.logger.info(f"模型训练完成，样本数: {len(features_list)}")
+        
+    def predict(self, features: Dict) -> Dict:
+        """预测数据包是否为攻击，模型未训练时返回None"""
+        if not self.is_trained:
+            return None
+            
+        start = time.perf_counter()
         try:
             # 将特征转换为模型输入格式
             X = self._transform_features(features)
-            return self.model.predict(X)[0] == 1
+            # score_samples返回异常分数的相反数，低于offset_即判定为异常
+            score = self.model.score_samples(X)[0]
+            return {
+                'is_attack': bool(score < self.model.offset_),
+                'confidence': float(-score)
+            }
         except Exception as e:
+            self.metric_errors.inc()
             self.logger.error(f"预测失败: {str(e)}")
-            return False 
\ No newline at end of file
+            return None
+        finally:
+            self.metric_latency.observe(time.perf_counter() - start)
+            
+    def _transform_features(self, features: Dict) -> np.ndarray:
+        """将特征字典转换为模型输入"""
+        return np.array([self._feature_vector(features)], dtype=float)
+        
+    def _feature_vector(self, features: Dict) -> List[float]:
+        return [float(int(features.get(name) or 0)) for name in FEATURE_NAMES]
@@ -1,10 +1,43 @@
 import yaml
 import logging
+import time
 from pathlib import Path
 from threading import Lock
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 from ids.models.packet_features import PacketFeatures
+from ids.utils.metrics import registry
+
+OPERATORS = ('==', '!=', '>', '<', '>=', '<=', 'in')
+SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+class RuleValidationError(ValueError):
+    """规则格式错误"""
+
+def compile_condition(condition) -> Tuple[str, str, Any]:
+    """校验并编译单个条件，将 "1-1024" 转为range、"0x02" 转为整数"""
+    if not isinstance(condition, (list, tuple)) or len(condition) != 3:
+        raise RuleValidationError(f"条件必须是 [特征, 运算符, 值]: {condition!r}")
+    feature, operator, value = condition
+    if not isinstance(feature, str) or not feature:
+        raise RuleValidationError(f"无效的特征名: {feature!r}")
+    if operator not in OPERATORS:
+        raise RuleValidationError(f"不支持的运算符: {operator!r}")
+
+    if isinstance(value, str):
+        try:
+            if operator == 'in' and '-' in value:
+                start, end = map(int, value.split('-'))
+                if start > end:
+                    raise RuleValidationError(f"无效的范围: {value!r}")
+                value = range(start, end + 1)
+            elif value.startswith('0x'):
+                value = int(value, 16)
+        except ValueError as e:
+            raise RuleValidationError(f"无效的条件值 {value!r}: {str(e)}")
+    if operator == 'in' and not hasattr(value, '__contains__'):
+        raise RuleValidationError(f"in 运算符需要列表或范围: {value!r}")
+    return feature, operator, value
 
 class Rule:
     def __init__(self, name: str, conditions: List, severity: str = 'medium', enabled: bool = True):
@@ -13,6 +46,77 @@ class Rule:
         self.severity = severity
         self.enabled = enabled
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Rule':
+        """从字典创建规则（校验并编译条件）"""
+        if not isinstance(data, dict):
+            raise RuleValidationError(f"规则必须是字典: {data!r}")
+        name = data.get('name')
+        if not name:
+            raise RuleValidationError("规则缺少name")
+        conditions = data.get('conditions')
+        if not conditions or not isinstance(conditions, list):
+            raise RuleValidationError(f"规则 {name} 缺少conditions")
+        severity = data.get('severity', 'medium')
+        if severity not in SEVERITIES:
+            raise RuleValidationError(f"规则 {name} 的严重程度无效: {severity!r}")
+
+        try:
+            compiled = [compile_condition(c) for c in conditions]
+        except RuleValidationError as e:
+            raise RuleValidationError(f"规则 {name}: {str(e)}")
+        return cls(
+            name=name,
+            conditions=compiled,
+            severity=severity,
+            enabled=data.get('enabled', True)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        conditions = []
+        for feature, operator, value in self.conditions:
+            if isinstance(value, range):
+                value = f"{value.start}-{value.stop - 1}"
+            conditions.append([feature, operator, value])
+        return {
+            'name': self.name,
+            'conditions': conditions,
+            'severity': self.severity,
+            'enabled': self.enabled
+        }
+
+def load_rule_file(rule_file) -> Tuple[List[Rule], List[str]]:
+    """加载单个规则文件，返回(规则列表, 错误列表)"""
+    rules, errors = [], []
+    try:
+        with open(rule_file, 'r', encoding='utf-8') as f:
+            rules_data = yaml.safe_load(f) or {}
+    except Exception as e:
+        return rules, [f"{rule_file}: {str(e)}"]
+
+    if not isinstance(rules_data, dict) or not isinstance(rules_data.get('rules', []), list):
+        return rules, [f"{rule_file}: 顶层必须包含rules列表"]
+
+    for index, rule_data in enumerate(rules_data.get('rules') or []):
+        try:
+            rules.append(Rule.from_dict(rule_data))
+        except RuleValidationError as e:
+            errors.append(f"{rule_file} 第{index + 1}条: {str(e)}")
+    return rules, errors
+
+def validate_rule_files(paths: List[str]) -> Tuple[List[Rule], List[str]]:
+    """校验规则文件或目录（目录下所有 *.yaml），返回(规则列表, 错误列表)"""
+    rules, errors = [], []
+    for path in map(Path, paths):
+        files = sorted(path.glob('*.yaml')) if path.is_dir() else [path]
+        if not files:
+            errors.append(f"{path}: 没有找到规则文件")
+        for rule_file in files:
+            file_rules, file_errors = load_rule_file(rule_file)
+            rules.extend(file_rules)
+            errors.extend(file_errors)
+    return rules, errors
+
 class RuleEngine:
     def __init__(self, rules_dir: str = 'rules'):
         self.rules_dir = Path(rules_dir)
@@ -20,19 +124,63 @@ class RuleEngine:
         self.rules_lock = Lock()
         self.logger = logging.getLogger(__name__)
         
-    def add_rule(self, rule):
-        self.rules.append(rule)
+        # 监控指标
+        self.metric_latency = registry.histogram('rule_check_seconds', '规则检测耗时')
+        self.metric_matches = registry.counter('rule_matches_total', '规则命中次数')
         
+        if self.rules_dir.is_dir():
+            self.load_rules()
+    
+    def load_rules(self) -> None:
+        """从规则目录加载所有规则文件"""
+        rules, errors = validate_rule_files([self.rules_dir])
+        for error in errors:
+            self.logger.error(f"加载规则失败: {error}")
+        with self.rules_lock:
+            self.rules = {rule.name: rule for rule in rules}
+        self.logger.info(f"已加载 {len(rules)} 条规则")
+    
+    def reload_rules(self) -> None:
+        """重新加载所有规则"""
+        self.load_rules()
+    
+    def add_rule(self, rule):
+        with self.rules_lock:
+            self.rules[rule.name] = rule
+    
+    def remove_rule(self, rule_name: str) -> None:
+        """删除规则"""
+        with self.rules_lock:
+            self.rules.pop(rule_name, None)
+    
+    def enable_rule(self, rule_name: str) -> None:
+        """启用规则"""
+        with self.rules_lock:
+            if rule_name in self.rules:
+                self.rules[rule_name].enabled = True
+    
+    def disable_rule(self, rule_name: str) -> None:
+        """禁用规则"""
+        with self.rules_lock:
+            if rule_name in self.rules:
+                self.rules[rule_name].enabled = False
+    
     def check_packet(self, packet, features):
         """检查数据包是否触发规则"""
+        start = time.perf_counter()
         alerts = []
-        for rule in self.rules:
+        with self.rules_lock:
+            rules = [rule for rule in self.rules.values() if rule.enabled]
+        for rule in rules:
             if all(self._check_condition(features, cond) for cond in rule.conditions):
                 alerts.append({
                     'rule_name': rule.name,
                     'severity': rule.severity,
                     'timestamp': time.time()
                 })
+        if alerts:
+            self.metric_matches.inc(len(alerts))
+        self.metric_latency.observe(time.perf_counter() - start)
         return alerts
     
     def _check_condition(self, features, condition):
@@ -41,14 +189,20 @@ class RuleEngine:
         
         if feature not in features:
             return False
-            
+        
         if operator == '==':
             return features[feature] == value
+        elif operator == '!=':
+            return features[feature] != value
         elif operator == '>':
             return features[feature] > value
         elif operator == '<':
             return features[feature] < value
+        elif operator == '>=':
+            return features[feature] >= value
+        elif operator == '<=':
+            return features[feature] <= value
         elif operator == 'in':
             return features[feature] in value
         
-        return False 
\ No newline at end of file
+        return False
@@ -1,23 +1,37 @@
-from scapy.layers.inet import IP, TCP, UDP
+import time
+
+from scapy.layers.inet import TCP, UDP
 import numpy as np
 
+from ids.capture.decoder import ip_layer, ip_length
+
+from ids.utils.metrics import registry
+
 class PacketFeatureExtractor:
+    def __init__(self):
+        self.metric_latency = registry.histogram(
+            'feature_extraction_seconds', '数据包特征提取耗时'
+        )
+        
     def extract_features(self, packet):
         """提取数据包特征"""
+        start = time.perf_counter()
         features = {}
         
-        if IP in packet:
+        ip = ip_layer(packet)
+        if ip is not None:
+            # IPv6的跳数限制和下一个头部对应IPv4的TTL和协议号
             features.update({
-                'ip_len': packet[IP].len,
-                'ip_ttl': packet[IP].ttl,
-                'ip_proto': packet[IP].proto,
+                'ip_len': ip_length(ip),
+                'ip_ttl': ip.ttl if ip.version == 4 else ip.hlim,
+                'ip_proto': ip.proto if ip.version == 4 else ip.nh,
             })
             
         if TCP in packet:
             features.update({
                 'tcp_sport': packet[TCP].sport,
                 'tcp_dport': packet[TCP].dport,
-                'tcp_flags': packet[TCP].flags,
+                'tcp_flags': int(packet[TCP].flags),
                 'tcp_window': packet[TCP].window,
             })
             
@@ -28,4 +42,5 @@ class PacketFeatureExtractor:
                 'udp_len': packet[UDP].len,
             })
             
+        self.metric_latency.observe(time.perf_counter() - start)
         return features 
\ No newline at end of file
@@ -1,19 +1,21 @@
-from scapy.layers.inet import IP, TCP, UDP
 import numpy as np
 from collections import Counter
 
+from ids.capture.decoder import ip_layer, ip_length
+
 class SessionFeatureExtractor:
     def extract_features(self, session):
         """提取会话特征"""
         packets = [p['packet'] for p in session]
+        sizes = [ip_length(ip) for ip in map(ip_layer, packets) if ip is not None]
         
         features = {
             'duration': session[-1]['timestamp'] - session[0]['timestamp'],
             'packet_count': len(packets),
-            'bytes_total': sum(p[IP].len for p in packets if IP in p),
+            'bytes_total': sum(sizes),
             'bytes_per_second': 0,  # 将在下面计算
-            'packet_size_mean': np.mean([p[IP].len for p in packets if IP in p]),
-            'packet_size_std': np.std([p[IP].len for p in packets if IP in p]),
+            'packet_size_mean': np.mean(sizes),
+            'packet_size_std': np.std(sizes),
         }
         
         # 计算每秒字节数
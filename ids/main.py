@@ -1,41 +1,206 @@
 import argparse
 import logging.config
+import sys
+import threading
+import time
 import yaml
+from datetime import datetime
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
 
-from ids.capture.packet_capture import PacketCapture
-from ids.detectors.rule_engine import RuleEngine
-from ids.detectors.ml_engine import MLEngine
-from ids.models.packet_features import PacketFeatures
-from ids.utils.db_manager import DatabaseManager
-from ids.utils.firewall import IPTablesHandler
-from ids.web.api import IDSAPI
+# 这里只导入轻量模块；scapy、scikit-learn、SQLAlchemy、Flask和python-iptables
+# 在创建IDS实例时才导入，保证 --help、validate-rules 等命令快速启动
+from ids.detectors.rule_engine import RuleEngine, Rule, validate_rule_files
+from ids.utils.cidr_filter import CIDRFilter
+from ids.utils.heavy_hitters import DEFAULT_WINDOWS, HeavyHitters
+from ids.utils import metrics
+from ids.utils.pipeline import DetectionPipeline
+
+# 重量级子系统模块（按加载顺序），用于 --import-time 报告
+HEAVY_MODULES = [
+    'ids.capture.packet_capture',
+    'ids.capture.session_handler',
+    'ids.capture.decoder',
+    'ids.features.packet_features',
+    'ids.features.session_features',
+    'ids.detectors.ml_engine',
+    'ids.models.db_manager',
+    'ids.utils.alert',
+    'ids.utils.firewall',
+    'ids.utils.timeseries',
+    'ids.correlation.event_correlator',
+    'ids.web.api',
+]
 
 class IDS:
-    def __init__(self, interface=None, firewall_config=None, db_url=None, rules_dir='rules'):
+    def __init__(self, interface=None, firewall_config=None, db_url=None, rules_dir='rules',
+                 config_file='config/ids_config.yaml'):
         # 加载配置
-        self.config = self._load_config()
+        self.config = self._load_config(config_file)
+        metrics.configure(self.config.get('metrics', {}).get('enabled', True))
+        
+        # 延迟导入重量级子系统
+        from ids.capture.packet_capture import PacketCapture
+        from ids.capture.session_handler import SessionHandler
+        from ids.capture.decoder import decode_packet
+        from ids.correlation.event_correlator import EventCorrelator
+        from ids.detectors.ml_engine import MLEngine
+        from ids.features.packet_features import PacketFeatureExtractor
+        from ids.features.session_features import SessionFeatureExtractor
+        from ids.models.db_manager import DatabaseManager
+        from ids.models.flow_archive import FlowArchive
+        from ids.models.packet_store import PacketStore
+        from ids.utils.alert import AlertHandler
+        from ids.utils.alert_dispatch import AlertDispatcher
+        from ids.utils.suppression import AlertSuppressor
+        from ids.utils.timeseries import DEFAULT_RESOLUTIONS, TrafficSeries
         
         # 初始化组件
+        self.decode_packet = decode_packet
         self.packet_capture = PacketCapture(interface or self.config['network']['interface'])
+        self.packet_feature_extractor = PacketFeatureExtractor()
+        archive_config = self.config.get('flow_archive', {})
+        self.flow_archive = None
+        if archive_config.get('enabled', True):
+            self.flow_archive = FlowArchive(
+                archive_config.get('directory', 'data/flows'),
+                chunk_size=archive_config.get('chunk_size', 65536),
+                flush_interval=archive_config.get('flush_interval', 60),
+                retention_days=archive_config.get('retention_days')
+            )
+        # 会话结束时写入列式流记录归档
+        self.session_handler = SessionHandler(
+            on_expire=self.flow_archive.add_session if self.flow_archive else None
+        )
+        self.session_feature_extractor = SessionFeatureExtractor()
         self.rule_engine = RuleEngine(rules_dir)
         self.ml_engine = MLEngine()
-        self.db_manager = DatabaseManager(db_url or self.config['database']['url'])
-        self.firewall = IPTablesHandler(firewall_config)
-        self.api = IDSAPI(self)
+        db_config = self.config.get('database', {})
+        store_config = self.config.get('packet_store', {})
+        self.packet_store = None
+        if store_config.get('enabled', True):
+            self.packet_store = PacketStore(
+                store_config.get('directory', 'data/packets'),
+                segment_size=int(store_config.get('segment_size_mb', 64) * 1024 * 1024),
+                max_segments=store_config.get('max_segments')
+            )
+        self.db_manager = DatabaseManager(
+            db_url or db_config['url'],
+            batch_size=db_config.get('batch_size', 500),
+            flush_interval=db_config.get('flush_interval', 1.0),
+            max_buffer=db_config.get('max_buffer', 20000),
+            packet_store=self.packet_store,
+            partition_period=db_config.get('partition_period', 'day'),
+            retention=db_config.get('retention_days'),
+            rollup_retention=db_config.get('rollup_retention_days'),
+            read_url=db_config.get('read_url'),
+            pool_size=db_config.get('pool_size', 5),
+            sqlite_pragmas=db_config.get('sqlite_pragmas'),
+            max_retries=db_config.get('max_retries', 3),
+            retry_backoff=db_config.get('retry_backoff', 0.1)
+        )
+        self.cidr_filter = CIDRFilter(path=self.config.get('cidr_filter', {}).get('file'))
+        # 流量时间序列（秒/分钟/小时的环形数组），/api/stats/traffic?resolution= 直接从内存读取
+        timeseries_config = self.config.get('timeseries', {})
+        self.traffic_series = None
+        if timeseries_config.get('enabled', True):
+            resolutions = timeseries_config.get('resolutions')
+            self.traffic_series = TrafficSeries(
+                [(r['name'], r['step'], r['slots']) for r in resolutions] if resolutions else DEFAULT_RESOLUTIONS
+            )
+        # 流量热点（源/目的IP、目的端口、告警源的Top-K），在解码阶段写入，/api/stats/top-ips 直接从内存读取
+        heavy_hitters_config = self.config.get('heavy_hitters', {})
+        self.heavy_hitters = None
+        if heavy_hitters_config.get('enabled', True):
+            windows = heavy_hitters_config.get('windows')
+            self.heavy_hitters = HeavyHitters(
+                heavy_hitters_config.get('capacity', 256),
+                [(w['name'], w['pane'], w['panes']) for w in windows] if windows else DEFAULT_WINDOWS
+            )
+        self.firewall = None
+        if self.config.get('firewall', {}).get('enabled', True):
+            # 只有启用防火墙联动时才需要ipset/iptables
+            from ids.utils.firewall import IPTablesHandler
+            self.firewall = IPTablesHandler(firewall_config, config=self.config.get('firewall', {}))
+        # 告警抑制：冷却期内的重复告警聚合后定期输出，并对告警总数限速
+        suppression_config = self.config.get('alert_suppression', {})
+        # 告警由输出端线程异步写出（日志、JSON-lines文件、syslog、webhook）
+        self.alert_dispatcher = AlertDispatcher.from_config(self.config.get('alert_dispatch'))
+        self.alert_handler = AlertHandler(
+            self.firewall,
+            AlertSuppressor(name='log', **suppression_config.get('log', {})),
+            self.alert_dispatcher
+        )
+        correlation_config = self.config.get('correlation', {})
+        self.event_correlator = EventCorrelator(
+            self.db_manager,
+            AlertSuppressor(name='correlation', **suppression_config.get('correlation', {})),
+            shards=correlation_config.get('shards', 16),
+            owned_shards=correlation_config.get('owned_shards')
+        )
+        # 关联状态检查点：重启后恢复滑动窗口，慢速攻击的计数不会因重启清零
+        checkpoint_config = self.config.get('checkpoint', {})
+        self.checkpointer = None
+        if checkpoint_config.get('enabled', True):
+            from ids.correlation.checkpoint import Checkpointer
+            self.checkpointer = Checkpointer(
+                checkpoint_config.get('directory', 'data/checkpoint'),
+                self.event_correlator,
+                self.session_handler,
+                interval=checkpoint_config.get('interval', 60),
+                flow_archive=self.flow_archive
+            )
+            _, flows = self.checkpointer.restore()
+            # 上次异常退出时未结束的会话写入流记录归档，写入磁盘后删除摘要
+            if self.flow_archive and flows:
+                for flow in flows:
+                    self.flow_archive.add(flow)
+                self.flow_archive.flush()
+            self.checkpointer.clear_flows()
+        self.api = None  # Web API在启动时创建（Flask按需导入）
+        # 实时告警流：持久化阶段保存的告警直接放入内存环形缓冲区，由 /api/alerts/stream 推送
+        web_config = self.config.get('web_api', {})
+        self.alert_stream = None
+        if web_config.get('stream_enabled', True):
+            from ids.web.alert_stream import AlertStream
+            self.alert_stream = AlertStream(
+                web_config.get('stream_buffer', 1024),
+                keepalive=web_config.get('stream_keepalive', 15)
+            )
+        
+        # 流量统计（包含被允许列表跳过的流量）
+        self.traffic_stats = {'packets': 0, 'bytes': 0, 'allowlisted': 0, 'denylisted': 0}
+        self.traffic_stats_lock = threading.Lock()
+        
+        # 创建检测流水线
+        self.pipeline = self._build_pipeline(self.config.get('pipeline', {}))
         
-        # 创建线程池
-        self.detection_executor = ThreadPoolExecutor(max_workers=2)        
+        # 后台线程
+        self.api_thread = None
         # 添加一些基本规则
         self._setup_rules()
         
-    def _firewall_cleanup_loop(self):
-        """定期检查并解封超时的IP"""
-        while True:
-            self.firewall_handler.check_and_unban()
-            time.sleep(60)  # 每分钟检查一次
-            
+    def _load_config(self, config_file):
+        """加载IDS配置文件"""
+        return load_config(config_file) or {
+            'network': {'interface': None},
+            'database': {'url': 'sqlite:///ids.db'}
+        }
+        
+    def _build_pipeline(self, config):
+        """构建分阶段检测流水线
+        
+        decode -> features -> sessions -> detection -> alerting -> persistence -> correlation
+        """
+        pipeline = DetectionPipeline(config)
+        pipeline.add_stage('decode', self._decode_stage)
+        pipeline.add_stage('features', self._features_stage)
+        pipeline.add_stage('sessions', self._sessions_stage)
+        pipeline.add_stage('detection', self._detection_stage)
+        pipeline.add_stage('alerting', self._alerting_stage)
+        pipeline.add_stage('persistence', self._persistence_stage)
+        pipeline.add_stage('correlation', self._correlation_stage)
+        return pipeline
+        
     def _setup_rules(self):
         """设置基本检测规则"""
         # 端口扫描检测
@@ -84,94 +249,235 @@ class IDS:
             self.rule_engine.add_rule(rule)
         
     def packet_handler(self, packet):
-        """处理捕获的数据包"""
-        # 提取数据包特征
-        packet_features = self.packet_feature_extractor.extract_features(packet)
+        """处理捕获的数据包（提交到检测流水线，不阻塞抓包线程）"""
+        return self.pipeline.submit({'packet': packet})
         
-        # 保存数据包
-        packet_db = self.db_manager.save_packet(packet, packet_features)
+    def _decode_stage(self, ctx):
+        """解析数据包头部，并查询CIDR允许/拒绝列表"""
+        header = self.decode_packet(ctx['packet'])
+        if header is None:
+            return None
+            
+        ctx.update(header)
+        ctx['timestamp'] = datetime.utcnow()
         
-        # 并行执行规则检测和机器学习检测
-        rule_future = self.detection_executor.submit(
-            self.rule_engine.check_packet, packet, packet_features
-        )
-        ml_future = self.detection_executor.submit(
-            self.ml_engine.predict, packet_features
-        )
+        verdict = self.cidr_filter.classify(ctx['src_ip'], ctx['dst_ip'])
+        with self.traffic_stats_lock:
+            self.traffic_stats['packets'] += 1
+            self.traffic_stats['bytes'] += ctx['length']
+            if verdict == CIDRFilter.ALLOW:
+                self.traffic_stats['allowlisted'] += 1
+            elif verdict == CIDRFilter.DENY:
+                self.traffic_stats['denylisted'] += 1
+        if self.traffic_series is not None:
+            self.traffic_series.add_packet(ctx['protocol'], ctx['length'])
+        if self.heavy_hitters is not None:
+            self.heavy_hitters.add_packet(ctx['src_ip'], ctx['dst_ip'], ctx['dst_port'], ctx['length'])
+                
+        # 允许列表内的流量跳过后续所有检测和存储
+        if verdict == CIDRFilter.ALLOW:
+            return None
+            
+        # 拒绝列表内的流量直接告警，跳过特征提取和检测
+        if verdict == CIDRFilter.DENY:
+            ctx.update({
+                'denied': True,
+                'features': {},
+                'session_features': None,
+                'rule_alerts': [{
+                    'rule_name': 'CIDR Deny List',
+                    'severity': 'high',
+                    'timestamp': time.time()
+                }],
+                'ml_result': None,
+                'has_alert': True
+            })
+        return ctx
         
-        # 获取检测结果
-        rule_alerts = rule_future.result()
-        ml_result = ml_future.result()
+    def _features_stage(self, ctx):
+        """提取数据包特征"""
+        if ctx.get('denied'):
+            return ctx
+        ctx['features'] = self.packet_feature_extractor.extract_features(ctx['packet'])
+        return ctx
         
-        # 处理会话
+    def _sessions_stage(self, ctx):
+        """处理会话并提取会话特征"""
+        if ctx.get('denied'):
+            return ctx
+        packet = ctx['packet']
         self.session_handler.add_packet(packet)
         session_key = self.session_handler.get_session_key(packet)
+        ctx['session_features'] = None
         if session_key:
             session = self.session_handler.sessions[session_key]
-            session_features = self.session_feature_extractor.extract_features(session)
-            
-            # 基于会话的检测
-            session_rule_alerts = self.rule_engine.check_packet(packet, session_features)
+            ctx['session_features'] = self.session_feature_extractor.extract_features(session)
+        return ctx
+        
+    def _detection_stage(self, ctx):
+        """规则检测和机器学习检测"""
+        if ctx.get('denied'):
+            return ctx
+        packet = ctx['packet']
+        rule_alerts = self.rule_engine.check_packet(packet, ctx['features'])
+        
+        # 基于会话的检测
+        if ctx['session_features']:
+            session_rule_alerts = self.rule_engine.check_packet(packet, ctx['session_features'])
             rule_alerts.extend(session_rule_alerts)
+            
+        ctx['rule_alerts'] = rule_alerts
+        ctx['ml_result'] = self.ml_engine.predict(ctx['features'])
+        ctx['has_alert'] = bool(
+            rule_alerts or (ctx['ml_result'] and ctx['ml_result']['is_attack'])
+        )
+        return ctx
         
-        # 保存告警
-        if rule_alerts or (ml_result and ml_result['is_attack']):
-            self.db_manager.save_alert(packet_db, rule_alerts, ml_result)
-            self.alert_handler.handle_alert(packet, rule_alerts, ml_result)
+    def _alerting_stage(self, ctx):
+        """处理告警（日志、防火墙联动）"""
+        if ctx['has_alert']:
+            self.alert_handler.handle_alert(ctx['packet'], ctx['rule_alerts'], ctx['ml_result'])
+            ml_alert = bool(ctx['ml_result'] and ctx['ml_result']['is_attack'])
+            if self.heavy_hitters is not None:
+                self.heavy_hitters.add_alert(ctx['src_ip'], len(ctx['rule_alerts']) + ml_alert)
+            if self.traffic_series is not None:
+                if ctx['rule_alerts']:
+                    self.traffic_series.add_alerts('rule', len(ctx['rule_alerts']))
+                if ml_alert:
+                    self.traffic_series.add_alerts('ml')
+        return ctx
+        
+    def _persistence_stage(self, ctx):
+        """保存数据包和告警"""
+        packet_db = self.db_manager.save_packet(ctx['packet'], ctx['features'])
+        if not ctx['has_alert']:
+            return None
             
-            # 如果产生告警，发送到事件关联器
-            event_data = {
-                'timestamp': datetime.utcnow(),
-                'src_ip': packet[IP].src,
-                'dst_ip': packet[IP].dst,
-                'protocol': 'TCP' if TCP in packet else 'UDP' if UDP in packet else 'OTHER',
-                'alert_type': 'rule' if rule_alerts else 'ml',
-                'severity': rule_alerts[0]['severity'] if rule_alerts else 'high',
-                'rule_name': rule_alerts[0]['rule_name'] if rule_alerts else None,
-                'ml_confidence': ml_result['confidence'] if ml_result else None
-            }
-            self.event_correlator.process_event(event_data)
+        alerts = self.db_manager.save_alert(packet_db, ctx['rule_alerts'], ctx['ml_result'])
+        if self.alert_stream is not None:
+            self.alert_stream.publish(alerts)
+        return ctx
+        
+    def _correlation_stage(self, ctx):
+        """将告警发送到事件关联器"""
+        rule_alerts = ctx['rule_alerts']
+        ml_result = ctx['ml_result']
+        event_data = {
+            'timestamp': ctx['timestamp'],
+            'src_ip': ctx['src_ip'],
+            'dst_ip': ctx['dst_ip'],
+            'dst_port': ctx['dst_port'],
+            'protocol': ctx['protocol'],
+            'alert_type': 'rule' if rule_alerts else 'ml',
+            'severity': rule_alerts[0]['severity'] if rule_alerts else 'high',
+            'rule_name': rule_alerts[0]['rule_name'] if rule_alerts else None,
+            'ml_confidence': ml_result['confidence'] if ml_result else None
+        }
+        self.event_correlator.process_event(event_data)
+        return None
+        
+    def get_pipeline_stats(self):
+        """获取流水线各阶段的吞吐量与积压"""
+        return self.pipeline.get_stats()
+        
+    def get_alert_sink_stats(self):
+        """获取各告警输出端的吞吐量、积压和丢弃数"""
+        return self.alert_dispatcher.get_stats()
+        
+    def get_traffic_stats(self):
+        """获取流量统计"""
+        with self.traffic_stats_lock:
+            return dict(self.traffic_stats)
         
     def start(self):
         """启动IDS"""
         print("启动入侵检测系统...")
         # 启动Web API
+        from ids.web.api import IDSAPI
+        self.api = IDSAPI(self)
+        web_config = self.config.get('web_api', {})
+        self.api_thread = threading.Thread(
+            target=self.api.run,
+            kwargs={'host': web_config.get('host', '0.0.0.0'), 'port': web_config.get('port', 5000)},
+            daemon=True
+        )
         self.api_thread.start()
         # 启动其他组件
-        self.firewall_cleanup_thread.start()
+        if self.firewall:
+            self.firewall.start()  # 批量提交封禁，按到期时间解封
+        if self.checkpointer:
+            self.checkpointer.start()
+        self.alert_dispatcher.start()
+        self.alert_handler.start()
+        self.pipeline.start()
         self.packet_capture.start_capture(self.packet_handler)
         
     def stop(self):
         """停止IDS"""
         print("停止入侵检测系统...")
-        self.detection_executor.shutdown()  # 关闭线程池
-        self.packet_capture.stop() 
+        self.packet_capture.stop()
+        self.pipeline.stop()  # 处理完队列中剩余的数据包
+        self.alert_handler.stop()  # 输出所有剩余的告警汇总
+        self.alert_dispatcher.stop()  # 写出输出端队列中剩余的告警
+        if self.alert_stream is not None:
+            self.alert_stream.close()  # 结束SSE订阅
+        if self.firewall:
+            self.firewall.stop()
+        self.event_correlator.close()  # 写入未上报的聚合关联告警
+        self.session_handler.close()  # 将活动会话写入流记录归档
+        if self.checkpointer:
+            self.checkpointer.stop()  # 保存关联状态（会话已归档，不再保存流摘要）
+        if self.flow_archive:
+            self.flow_archive.close()
+        self.db_manager.close()  # 写入缓冲区中剩余的数据
         
+    def _invalidate_rules_cache(self):
+        """规则变化后使Web API缓存的规则列表失效"""
+        if self.api is not None:
+            self.api.invalidate_cache('rules')
+            
     def reload_rules(self):
         """重新加载规则"""
         self.rule_engine.reload_rules()
+        self._invalidate_rules_cache()
+        
+    def reload_cidr_filter(self):
+        """重新加载CIDR允许/拒绝列表（无需重启）"""
+        self.cidr_filter.reload()
     
     def add_rule(self, rule_data: dict):
         """动态添加规则"""
         rule = Rule.from_dict(rule_data)
         self.rule_engine.add_rule(rule)
+        self._invalidate_rules_cache()
     
     def remove_rule(self, rule_name: str):
         """删除规则"""
         self.rule_engine.remove_rule(rule_name)
+        self._invalidate_rules_cache()
     
     def enable_rule(self, rule_name: str):
         """启用规则"""
         self.rule_engine.enable_rule(rule_name)
+        self._invalidate_rules_cache()
     
     def disable_rule(self, rule_name: str):
         """禁用规则"""
         self.rule_engine.disable_rule(rule_name)
+        self._invalidate_rules_cache()
 
-def parse_args():
+def parse_args(argv=None):
     """解析命令行参数"""
-    import argparse
     parser = argparse.ArgumentParser(description='入侵检测系统')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.add_parser('run', help='启动入侵检测系统（默认）')
+    validate_parser = subparsers.add_parser(
+        'validate-rules', help='校验并编译规则文件（不加载抓包、ML和防火墙模块）'
+    )
+    validate_parser.add_argument('paths', nargs='*',
+                                 help='规则文件或目录（默认使用 --rules-dir）')
+    subparsers.add_parser('import-time', help='报告各子系统和第三方包的导入耗时')
+    
     parser.add_argument('-i', '--interface', 
                       help='要监听的网络接口名称（例如：eth0）',
                       default=None)
@@ -184,7 +490,7 @@ def parse_args():
     parser.add_argument('-f', '--firewall-config',
                       help='防火墙配置文件路径',
                       default=None)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 def load_config(config_file='config/ids_config.yaml'):
     """加载配置文件"""
@@ -195,14 +501,69 @@ def load_config(config_file='config/ids_config.yaml'):
         logging.warning(f"无法加载配置文件: {str(e)}")
         return {}
 
+def validate_rules(paths):
+    """校验规则文件，返回退出码"""
+    start = time.perf_counter()
+    rules, errors = validate_rule_files(paths)
+    for error in errors:
+        print(f"错误: {error}")
+    print(f"已编译 {len(rules)} 条规则，{len(errors)} 个错误 "
+          f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+    return 1 if errors else 0
+
+def report_import_time(modules=None, top=15):
+    """在子进程中以 -X importtime 导入各子系统，汇总导入耗时"""
+    import subprocess
+    
+    modules = modules or HEAVY_MODULES
+    # 使用import语句（importlib.import_module的最外层模块不会出现在报告中）
+    script = (
+        f"for name in {modules!r}:\n"
+        "    try:\n"
+        "        exec('import ' + name)\n"
+        "    except Exception as e:\n"
+        "        print(f'{name}: {e}')\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        capture_output=True, text=True
+    )
+    
+    cumulative = {}
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        cumulative[name] = int(cumulative_us)
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        
+    print("子系统导入耗时（累计，按加载顺序，已加载的依赖不重复计算）:")
+    for name in modules:
+        print(f"  {name:40s} {cumulative.get(name, 0) / 1000:9.1f} ms")
+    print("\n耗时最多的顶层包（自身）:")
+    for package, self_us in sorted(packages.items(), key=lambda x: -x[1])[:top]:
+        print(f"  {package:40s} {self_us / 1000:9.1f} ms")
+    print(f"\n总计: {sum(packages.values()) / 1000:.1f} ms")
+    if result.stdout:
+        print(f"\n导入失败:\n{result.stdout}")
+    return result.returncode
+
 def main():
     """主函数"""
-    # 加载配置文件
-    config = load_config()
-    
     # 解析命令行参数
     args = parse_args()
     
+    if args.command == 'validate-rules':
+        sys.exit(validate_rules(args.paths or [args.rules_dir]))
+    if args.command == 'import-time':
+        sys.exit(report_import_time())
+        
+    # 加载配置文件
+    config = load_config()
+    
     # 合并配置（命令行参数优先）
     final_config = {
         'interface': args.interface or config.get('interface'),
@@ -224,6 +585,8 @@ def main():
             
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
+        # SIGHUP重新加载CIDR允许/拒绝列表
+        signal.signal(signal.SIGHUP, lambda signum, frame: ids.reload_cidr_filter())
         
         # 启动IDS
         print(f"""
@@ -238,7 +601,6 @@ def main():
         
         # 保持主线程运行
         while True:
-            import time
             time.sleep(1)
             
     except Exception as e:
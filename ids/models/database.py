@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, JSON, ForeignKey, Enum
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, Boolean, DateTime, JSON, ForeignKey, Enum, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
+from sqlalchemy.pool import StaticPool
 import enum
 from datetime import datetime
 
@@ -10,9 +12,14 @@ class AlertSeverity(enum.Enum):
     LOW = "low"
     MEDIUM = "medium"
     HIGH = "high"
+    CRITICAL = "critical"
 
 class Packet(Base):
     __tablename__ = 'packets'
+    __table_args__ = (
+        Index('ix_packets_timestamp_id', 'timestamp', 'id'),
+        Index('ix_packets_src_ip_timestamp', 'src_ip', 'timestamp'),
+    )
     
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -22,17 +29,29 @@ class Packet(Base):
     src_port = Column(Integer, nullable=True)
     dst_port = Column(Integer, nullable=True)
     length = Column(Integer)
-    raw_data = Column(JSON)  # 存储原始数据包信息
+    flow_key = Column(String(120), index=True)  # 与方向无关的流标识
+    segment = Column(Integer, nullable=True)  # 原始数据包所在的pcap分段文件
+    offset = Column(Integer, nullable=True)  # 分段文件中的记录偏移
     features = Column(JSON)  # 存储提取的特征
     
     alerts = relationship("Alert", back_populates="packet")
 
 class Alert(Base):
     __tablename__ = 'alerts'
+    # 游标分页按 (timestamp, id) 倒序；过滤列在前、timestamp在后，过滤后无需再排序
+    __table_args__ = (
+        Index('ix_alerts_timestamp_id', 'timestamp', 'id'),
+        Index('ix_alerts_severity_timestamp', 'severity', 'timestamp', 'id'),
+        Index('ix_alerts_rule_name_timestamp', 'rule_name', 'timestamp', 'id'),
+        Index('ix_alerts_src_ip_timestamp', 'src_ip', 'timestamp', 'id'),
+        Index('ix_alerts_dst_ip_timestamp', 'dst_ip', 'timestamp', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     packet_id = Column(Integer, ForeignKey('packets.id'))
+    src_ip = Column(String(50), nullable=True)
+    dst_ip = Column(String(50), nullable=True)
     alert_type = Column(String(50))  # 'rule' 或 'ml'
     rule_name = Column(String(100), nullable=True)
     severity = Column(Enum(AlertSeverity))
@@ -72,8 +91,107 @@ class CorrelationAlert(Base):
     first_event_time = Column(DateTime)
     last_event_time = Column(DateTime)
 
-def init_db(db_url):
-    engine = create_engine(db_url)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session() 
\ No newline at end of file
+class AlertRollup(Base):
+    """告警数按分钟/小时汇总（严重程度、规则、源IP）"""
+    __tablename__ = 'alert_rollups'
+    __table_args__ = (
+        UniqueConstraint('resolution', 'bucket', 'severity', 'rule_name', 'src_ip',
+                         name='uq_alert_rollups_key'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    resolution = Column(String(10), nullable=False)  # 'minute' 或 'hour'
+    bucket = Column(DateTime, nullable=False)  # 时间桶起点
+    severity = Column(String(20), nullable=False)
+    rule_name = Column(String(100), nullable=False, default='')  # ML告警为空字符串
+    src_ip = Column(String(50), nullable=False, default='')
+    count = Column(Integer, nullable=False, default=0)
+
+class TrafficRollup(Base):
+    """数据包数和字节数按分钟/小时汇总（协议、目的端口）"""
+    __tablename__ = 'traffic_rollups'
+    __table_args__ = (
+        UniqueConstraint('resolution', 'bucket', 'protocol', 'dst_port',
+                         name='uq_traffic_rollups_key'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    resolution = Column(String(10), nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    protocol = Column(String(10), nullable=False)
+    dst_port = Column(Integer, nullable=False, default=0)  # 无端口的协议为0
+    packets = Column(Integer, nullable=False, default=0)
+    bytes = Column(Integer, nullable=False, default=0)
+
+class IPTrafficRollup(Base):
+    """数据包数和字节数按分钟/小时汇总（源IP）"""
+    __tablename__ = 'ip_traffic_rollups'
+    __table_args__ = (
+        UniqueConstraint('resolution', 'bucket', 'ip', name='uq_ip_traffic_rollups_key'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    resolution = Column(String(10), nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    ip = Column(String(50), nullable=False)
+    packets = Column(Integer, nullable=False, default=0)
+    bytes = Column(Integer, nullable=False, default=0)
+
+# 按时间分区的表：模型只作为分区表的结构模板，数据写入 packets_YYYYMMDD 等分区表
+PARTITIONED_MODELS = (Packet, Alert)
+
+# SQLite连接参数：WAL模式下读不阻塞写、写不阻塞读
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # WAL模式下只在检查点时fsync
+    'busy_timeout': 30000,  # 毫秒
+    'cache_size': -65536,  # 64MB
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,  # 256MB
+}
+
+def is_memory_url(db_url) -> bool:
+    url = make_url(db_url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def create_db_engine(db_url, read_only=False, pool_size=5, max_overflow=10, pragmas=None):
+    """创建带连接池的数据库引擎；SQLite启用WAL等参数，read_only时以只读方式打开"""
+    url = make_url(db_url)
+    if url.get_backend_name() != 'sqlite':
+        return create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+        
+    if is_memory_url(url):
+        # 内存数据库每个连接都是独立的库，写线程和查询必须共用同一个连接
+        return create_engine(url, poolclass=StaticPool, connect_args={'check_same_thread': False})
+        
+    if read_only:
+        url = url.set(database=f"file:{url.database}", query={**url.query, 'mode': 'ro', 'uri': 'true'})
+    engine = create_engine(url, pool_size=pool_size, max_overflow=max_overflow,
+                           connect_args={'check_same_thread': False})
+    pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+    if read_only:
+        # journal_mode由写连接设置，只读连接不能修改
+        pragmas.pop('journal_mode', None)
+        pragmas['query_only'] = 1
+        
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+        
+    return engine
+
+def init_db(db_url, **options):
+    """创建数据库引擎和非分区表，返回引擎"""
+    engine = create_db_engine(db_url, **options)
+    partitioned = {model.__table__ for model in PARTITIONED_MODELS}
+    Base.metadata.create_all(
+        engine, tables=[table for table in Base.metadata.sorted_tables if table not in partitioned]
+    )
+    return engine
+
+def create_session_factory(engine):
+    """每个线程独立的会话（API线程、关联线程互不影响）"""
+    return scoped_session(sessionmaker(bind=engine))
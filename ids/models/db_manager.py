@@ -1,21 +1,130 @@
-from scapy.layers.inet import IP, TCP, UDP
-from .database import init_db, Packet, Alert, Rule, Config, CorrelationAlert
-from datetime import datetime
+from scapy.layers.inet import TCP, UDP
+from sqlalchemy import func, select, tuple_
+from .database import init_db, create_db_engine, create_session_factory, is_memory_url, Packet, Alert, Rule, Config, CorrelationAlert, AlertSeverity, PARTITIONED_MODELS
+from .database import AlertRollup, TrafficRollup, IPTrafficRollup
+from .packet_store import flow_key
+from .partitions import PartitionManager
+from .rollups import RollupWriter, query_rollup
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import count
+from threading import Condition, Thread
 import json
+import logging
+import time
+
+from ids.capture.decoder import ip_layer
+from ids.utils.metrics import registry
+
+# 批量写入顺序（告警通过packet_id引用数据包，数据包必须先写入）
+WRITE_ORDER = (Packet, Alert, CorrelationAlert)
+# 清理过期汇总数据的最短间隔（秒）
+ROLLUP_PRUNE_INTERVAL = 600
+# 告警过滤条件中属于汇总表维度的字段（可从汇总表估算总数）
+ROLLUP_ALERT_FILTERS = {'severity', 'rule_name', 'src_ip'}
+# 精确告警总数的缓存时间（秒）和最大条目数
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_SIZE = 256
 
 class DatabaseManager:
-    def __init__(self, db_url):
-        self.session = init_db(db_url)
+    def __init__(self, db_url, batch_size=500, flush_interval=1.0, max_buffer=20000,
+                 packet_store=None, partition_period='day', retention=None,
+                 rollup_retention=None, read_url=None, pool_size=5, sqlite_pragmas=None,
+                 max_retries=3, retry_backoff=0.1):
+        """
+        初始化数据库管理器（后台线程批量写入）
+        Args:
+            db_url: 数据库URL
+            batch_size: 缓冲行数达到该值时立即写入
+            flush_interval: 最长写入间隔（秒）
+            max_buffer: 缓冲区最大行数，写满后保存操作阻塞直到写线程腾出空间
+            packet_store: 原始数据包存储（PacketStore），为None时不保存原始字节
+            partition_period: packets和alerts表的分区周期（hour或day）
+            retention: 各分区表的保留天数，例如 {'packets': 7, 'alerts': 90}
+            rollup_retention: 各粒度汇总数据的保留天数，例如 {'minute': 2, 'hour': 90}
+            read_url: API查询使用的只读数据库URL（SQLite文件数据库默认以只读方式打开同一文件）
+            pool_size: 连接池大小
+            sqlite_pragmas: 覆盖默认的SQLite PRAGMA设置
+            max_retries: 批量写入失败后的重试次数（例如SQLite的database is locked），仍失败则丢弃该批
+            retry_backoff: 第一次重试前的等待时间（秒），之后每次加倍
+        """
+        self.engine = init_db(db_url, pool_size=pool_size, pragmas=sqlite_pragmas)
+        if read_url is None and self.engine.dialect.name == 'sqlite' and not is_memory_url(db_url):
+            read_url = db_url
+        # 统计和查询使用独立的只读引擎，WAL模式下不会阻塞写线程
+        self.read_engine = self.engine
+        if read_url is not None:
+            self.read_engine = create_db_engine(
+                read_url, read_only=True, pool_size=pool_size, pragmas=sqlite_pragmas
+            )
+        # 每个线程独立的会话（规则、配置等ORM操作）
+        self.session = create_session_factory(self.engine)
+        self.packet_store = packet_store
+        
+        # 按时间分区，过期数据整表删除；维护线程提前创建下一个分区，切换时不阻塞写入
+        self.partitions = PartitionManager(
+            self.engine, PARTITIONED_MODELS, period=partition_period, retention=retention
+        )
+        self.partitions.start()
         
+        # 分钟/小时汇总表，与原始数据在同一事务中更新
+        self.rollups = RollupWriter()
+        self.rollup_retention = rollup_retention or {}
+        self.last_rollup_prune = 0
+        self.count_cache = {}
+        self.logger = logging.getLogger(__name__)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        
+        # 写缓冲区（按表名）
+        self.buffer_cond = Condition()
+        self.buffers = self._new_buffers()
+        self.buffered = 0
+        self.flush_requested = False
+        self.closing = False
+        self.batches_taken = 0
+        self.batches_written = 0
+        
+        # 在客户端分配主键，告警无需等待数据包写入即可引用其ID
+        self.id_counters = {
+            model.__tablename__: count(
+                (self.partitions.max_id(model) if model in PARTITIONED_MODELS else self._max_id(model)) + 1
+            )
+            for model in WRITE_ORDER
+        }
+        
+        # 监控指标
+        self.metric_flush_latency = registry.histogram('db_flush_seconds', '数据库批量写入耗时')
+        self.metric_flush_errors = registry.counter('db_flush_errors_total', '数据库批量写入失败次数')
+        self.metric_flush_retries = registry.counter('db_flush_retries_total', '数据库批量写入重试次数')
+        self.metric_rows = {
+            model.__tablename__: registry.counter(
+                'db_rows_written_total', '写入数据库的行数', labels={'table': model.__tablename__}
+            )
+            for model in WRITE_ORDER
+        }
+        registry.gauge('db_buffered_rows', '等待写入数据库的行数', function=lambda: self.buffered)
+        
+        self.writer_thread = Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+    
     def save_packet(self, packet, features):
-        """保存数据包信息"""
+        """保存数据包信息（写入缓冲区），返回包含id的行"""
+        ip = ip_layer(packet)
         packet_data = {
+            'id': self._next_id(Packet),
             'timestamp': datetime.utcnow(),
-            'src_ip': packet[IP].src,
-            'dst_ip': packet[IP].dst,
+            'src_ip': ip.src,
+            'dst_ip': ip.dst,
             'protocol': 'TCP' if TCP in packet else 'UDP' if UDP in packet else 'OTHER',
+            'src_port': None,
+            'dst_port': None,
             'length': len(packet),
-            'raw_data': self._packet_to_dict(packet),
+            'segment': None,
+            'offset': None,
             'features': features
         }
         
@@ -29,47 +138,303 @@ class DatabaseManager:
                 'src_port': packet[UDP].sport,
                 'dst_port': packet[UDP].dport
             })
-            
-        db_packet = Packet(**packet_data)
-        self.session.add(db_packet)
-        self.session.commit()
-        return db_packet
+        packet_data['flow_key'] = flow_key(
+            packet_data['src_ip'], packet_data['src_port'],
+            packet_data['dst_ip'], packet_data['dst_port'], packet_data['protocol']
+        )
+        
+        # 原始字节追加到pcap分段文件，数据库中只保存位置
+        if self.packet_store is not None:
+            raw = getattr(packet, 'original', None) or bytes(packet)
+            packet_data['segment'], packet_data['offset'] = self.packet_store.append(
+                float(packet.time), raw
+            )
         
+        self._enqueue(Packet, [packet_data])
+        return packet_data
+    
     def save_alert(self, packet_db, rule_alerts, ml_result):
-        """保存告警信息"""
+        """保存告警信息（写入缓冲区）"""
+        timestamp = datetime.utcnow()
+        alerts = []
         # 保存规则告警
         for alert in rule_alerts:
-            alert_data = {
-                'packet_id': packet_db.id,
+            alerts.append({
+                'id': self._next_id(Alert),
+                'timestamp': timestamp,
+                'packet_id': packet_db['id'],
+                'src_ip': packet_db['src_ip'],
+                'dst_ip': packet_db['dst_ip'],
                 'alert_type': 'rule',
                 'rule_name': alert['rule_name'],
-                'severity': alert['severity'],
+                'severity': AlertSeverity(alert['severity']),
+                'confidence': None,
                 'description': f"触发规则: {alert['rule_name']}"
-            }
-            db_alert = Alert(**alert_data)
-            self.session.add(db_alert)
-            
+            })
+        
         # 保存ML告警
         if ml_result and ml_result['is_attack']:
-            alert_data = {
-                'packet_id': packet_db.id,
+            alerts.append({
+                'id': self._next_id(Alert),
+                'timestamp': timestamp,
+                'packet_id': packet_db['id'],
+                'src_ip': packet_db['src_ip'],
+                'dst_ip': packet_db['dst_ip'],
                 'alert_type': 'ml',
-                'severity': 'high' if ml_result['confidence'] > 0.9 else 'medium',
+                'rule_name': None,
+                'severity': AlertSeverity.HIGH if ml_result['confidence'] > 0.9 else AlertSeverity.MEDIUM,
                 'confidence': ml_result['confidence'],
                 'description': f"ML检测到攻击 (置信度: {ml_result['confidence']:.2f})"
-            }
-            db_alert = Alert(**alert_data)
-            self.session.add(db_alert)
-            
-        self.session.commit()
+            })
         
+        if alerts:
+            self._enqueue(Alert, alerts)
+        return alerts
+    
     def save_correlation_alert(self, alert_data):
-        """保存关联告警"""
-        correlation_alert = CorrelationAlert(**alert_data)
-        self.session.add(correlation_alert)
-        self.session.commit()
+        """保存关联告警（写入缓冲区）"""
+        correlation_alert = {
+            'id': self._next_id(CorrelationAlert),
+            'timestamp': alert_data.get('timestamp') or datetime.utcnow(),
+            'rule_name': alert_data['rule_name'],
+            'severity': AlertSeverity(alert_data['severity']),
+            'description': alert_data.get('description'),
+            'events_count': alert_data.get('events_count'),
+            # 相关事件中包含datetime，转换为可JSON序列化的形式
+            'related_events': json.loads(json.dumps(alert_data.get('related_events'), default=str)),
+            'first_event_time': alert_data.get('first_event_time'),
+            'last_event_time': alert_data.get('last_event_time')
+        }
+        self._enqueue(CorrelationAlert, [correlation_alert])
         return correlation_alert
+    
+    def flush(self, timeout=None):
+        """立即写入缓冲区中的所有数据，等待写入完成"""
+        with self.buffer_cond:
+            target = self.batches_taken + (1 if self.buffered else 0)
+            self.flush_requested = True
+            self.buffer_cond.notify_all()
+            return self.buffer_cond.wait_for(
+                lambda: self.batches_written >= target or not self.writer_thread.is_alive(),
+                timeout
+            )
+    
+    def close(self, timeout=None):
+        """写入剩余数据并停止写线程"""
+        with self.buffer_cond:
+            self.closing = True
+            self.buffer_cond.notify_all()
+        self.writer_thread.join(timeout)
+        self.partitions.stop()
+        self.session.remove()
+        if self.read_engine is not self.engine:
+            self.read_engine.dispose()
+        self.engine.dispose()
+        if self.packet_store is not None:
+            self.packet_store.close()
+    
+    def get_flow_packets(self, key):
+        """获取流的所有数据包位置（按时间排序）"""
+        locations = []
+        with self.read_engine.connect() as conn:
+            for table in self.partitions.tables_for_range(Packet):
+                query = select(table.c.segment, table.c.offset).where(
+                    table.c.flow_key == key, table.c.segment.isnot(None)
+                ).order_by(table.c.timestamp, table.c.id)
+                locations.extend(tuple(row) for row in conn.execute(query))
+        return locations
+    
+    def query_alerts(self, start=None, end=None, limit=20, cursor=None, filters=None):
+        """按 (timestamp, id) 倒序查询告警（游标分页），只访问与时间范围重叠的分区
+        
+        cursor为上一页最后一条告警的 (timestamp, id)，查询代价与翻页深度无关。
+        """
+        if cursor is not None and (end is None or cursor[0] < end):
+            end = cursor[0]
+        rows = []
+        with self.read_engine.connect() as conn:
+            for table in self.partitions.tables_for_range(Alert, start, end, newest_first=True):
+                query = self._alert_filter(select(table), table, start, end, filters)
+                if cursor is not None:
+                    query = query.where(tuple_(table.c.timestamp, table.c.id) < tuple_(*cursor))
+                query = query.order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(limit - len(rows))
+                rows.extend(dict(row) for row in conn.execute(query).mappings())
+                if len(rows) >= limit:
+                    break
+        return rows
+    
+    def count_alerts(self, start=None, end=None, filters=None):
+        """统计告警总数，返回 (总数, 是否为估算值)
+        
+        过滤条件都是汇总表的维度时从汇总表估算（时间范围按分钟对齐），
+        否则在分区上精确统计，结果缓存COUNT_CACHE_TTL秒。
+        """
+        filters = filters or {}
+        if set(filters) <= ROLLUP_ALERT_FILTERS:
+            return sum(self.alert_counts('severity', start, end, filters).values()), True
+            
+        key = (start, end, tuple(sorted(filters.items())))
+        cached = self.count_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < COUNT_CACHE_TTL:
+            return cached[1], False
+        with self.read_engine.connect() as conn:
+            total = sum(
+                conn.execute(self._alert_filter(
+                    select(func.count()).select_from(table), table, start, end, filters
+                )).scalar()
+                for table in self.partitions.tables_for_range(Alert, start, end)
+            )
+        if len(self.count_cache) >= COUNT_CACHE_SIZE:
+            self.count_cache.clear()
+        self.count_cache[key] = (time.monotonic(), total)
+        return total, False
+    
+    def alert_counts(self, group_by='severity', start=None, end=None, filters=None):
+        """从汇总表统计告警数（按severity、rule_name或src_ip分组）"""
+        with self.read_engine.connect() as conn:
+            totals = self._query_rollup(conn, AlertRollup, (group_by,), start, end, filters)
+        return {key[0]: values[0] for key, values in totals.items()}
+    
+    def traffic_counts(self, group_by=('protocol',), start=None, end=None):
+        """从汇总表统计数据包数和字节数（按protocol、dst_port分组）"""
+        with self.read_engine.connect() as conn:
+            totals = self._query_rollup(conn, TrafficRollup, tuple(group_by), start, end)
+        return {key: {'packets': packets, 'bytes': size} for key, (packets, size) in totals.items()}
+    
+    def top_ips(self, start=None, end=None, limit=10, order_by='bytes'):
+        """从汇总表获取流量最多的源IP"""
+        with self.read_engine.connect() as conn:
+            totals = self._query_rollup(conn, IPTrafficRollup, ('ip',), start, end)
+        index = 0 if order_by == 'packets' else 1
+        ranked = sorted(totals.items(), key=lambda item: (-item[1][index], item[0]))[:limit]
+        return [{'ip': key[0], 'packets': packets, 'bytes': size} for key, (packets, size) in ranked]
+    
+    def _query_rollup(self, conn, model, group_by, start, end, filters=None):
+        """查询汇总表；分钟汇总已过保留期的部分从原始分区表统计"""
+        minute_cutoff = None
+        if 'minute' in self.rollup_retention:
+            minute_cutoff = datetime.utcnow() - timedelta(days=self.rollup_retention['minute'])
+        return query_rollup(conn, model, group_by, start, end, filters,
+                            minute_cutoff=minute_cutoff, raw_tables=self.partitions.tables_for_range)
+    
+    def _alert_filter(self, query, table, start, end, filters):
+        query = self._time_filter(query, table, start, end)
+        for name, value in (filters or {}).items():
+            if name == 'severity':
+                value = AlertSeverity(value)
+            query = query.where(table.c[name] == value)
+        return query
+    
+    @staticmethod
+    def _time_filter(query, table, start, end):
+        if start is not None:
+            query = query.where(table.c.timestamp >= start)
+        if end is not None:
+            query = query.where(table.c.timestamp <= end)
+        return query
+    
+    def export_flow_pcap(self, key):
+        """将流的数据包导出为pcap文件内容，没有数据包时返回None"""
+        if self.packet_store is None:
+            return None
+        locations = self.get_flow_packets(key)
+        if not locations:
+            return None
+        return self.packet_store.export_pcap(locations)
+    
+    def _next_id(self, model):
+        return next(self.id_counters[model.__tablename__])
+    
+    def _max_id(self, model):
+        """查询表中当前最大的主键"""
+        with self.engine.connect() as conn:
+            return conn.execute(func.max(model.__table__.c.id)).scalar() or 0
+    
+    def _new_buffers(self):
+        return {model.__tablename__: [] for model in WRITE_ORDER}
+    
+    def _enqueue(self, model, rows):
+        """将行加入写缓冲区，缓冲区满时阻塞"""
+        with self.buffer_cond:
+            self.buffer_cond.wait_for(
+                lambda: self.buffered < self.max_buffer or self.closing
+            )
+            self.buffers[model.__tablename__].extend(rows)
+            self.buffered += len(rows)
+            if self.buffered >= self.batch_size:
+                self.buffer_cond.notify_all()
+    
+    def _writer_loop(self):
+        """写线程：缓冲区达到批量大小、到达写入间隔或收到flush请求时批量写入"""
+        while True:
+            with self.buffer_cond:
+                self.buffer_cond.wait_for(
+                    lambda: (self.buffered >= self.batch_size or self.flush_requested
+                             or self.closing),
+                    self.flush_interval
+                )
+                batch, self.buffers = self.buffers, self._new_buffers()
+                has_rows = self.buffered > 0
+                self.buffered = 0
+                self.flush_requested = False
+                closing = self.closing
+                if has_rows:
+                    self.batches_taken += 1
+                # 唤醒等待缓冲区空间的生产者
+                self.buffer_cond.notify_all()
+            
+            if has_rows:
+                self._write_with_retry(batch)
+                with self.buffer_cond:
+                    self.batches_written += 1
+                    self.buffer_cond.notify_all()
+            if closing:
+                return
+    
+    def _write_with_retry(self, batch):
+        """批量写入，失败时按指数退避重试（事务已回滚，重试不会重复写入）"""
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self.metric_flush_errors.inc()
+                if attempt == self.max_retries:
+                    self.logger.error(f"批量写入数据库失败，丢弃 {sum(map(len, batch.values()))} 行: {str(e)}")
+                    return
+                self.logger.warning(f"批量写入数据库失败，{delay:.2f}秒后重试: {str(e)}")
+                self.metric_flush_retries.inc()
+                time.sleep(delay)
+                delay *= 2
+                continue
+            for model in WRITE_ORDER:
+                self.metric_rows[model.__tablename__].inc(len(batch[model.__tablename__]))
+            self.metric_flush_latency.observe(time.perf_counter() - start)
+            return
+    
+    def _write_batch(self, batch):
+        """在单个事务中批量插入各表的数据"""
+        # 先确定各行所属的分区表（可能需要建表），再开启写事务
+        inserts = []
+        for model in WRITE_ORDER:
+            rows = batch[model.__tablename__]
+            if not rows:
+                continue
+            if model not in PARTITIONED_MODELS:
+                inserts.append((model.__table__, rows))
+                continue
+            groups = defaultdict(list)
+            for row in rows:
+                groups[self.partitions.table_for(model, row['timestamp'])].append(row)
+            inserts.extend(groups.items())
+            
+        totals = self.rollups.aggregate(batch[Packet.__tablename__], batch[Alert.__tablename__])
         
-    def _packet_to_dict(self, packet):
-        """将数据包转换为可JSON序列化的字典"""
-        return json.loads(packet.show(dump=True)) 
\ No newline at end of file
+        with self.engine.begin() as conn:
+            for table, rows in inserts:
+                conn.execute(table.insert(), rows)
+            self.rollups.write(conn, totals)
+            if self.rollup_retention and time.monotonic() - self.last_rollup_prune > ROLLUP_PRUNE_INTERVAL:
+                self.rollups.prune(conn, self.rollup_retention)
+                self.last_rollup_prune = time.monotonic()
@@ -0,0 +1,233 @@
+import calendar
+import logging
+import os
+import shutil
+import socket
+import time
+from collections import defaultdict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from ids.utils.metrics import registry
+
+# 流记录的列及类型（每列一个.npy文件）
+COLUMNS = {
+    'start_time': np.float64,
+    'end_time': np.float64,
+    'src_ip': np.dtype('S16'),  # 16字节地址，IPv4存为IPv4映射地址 ::ffff:a.b.c.d
+    'dst_ip': np.dtype('S16'),
+    'src_port': np.uint16,
+    'dst_port': np.uint16,
+    'protocol': np.uint8,
+    'packets': np.uint32,
+    'bytes': np.uint64,
+}
+PROTOCOLS = {'TCP': 6, 'UDP': 17}
+IP_COLUMNS = ('src_ip', 'dst_ip')
+PARTITION_FORMAT = '%Y%m%d%H'
+PARTITION_SECONDS = 3600
+
+IPV4_MAPPED = b'\0' * 10 + b'\xff\xff'
+
+def ip_to_bytes(address: str) -> bytes:
+    if ':' in address:
+        return socket.inet_pton(socket.AF_INET6, address)
+    return IPV4_MAPPED + socket.inet_aton(address)
+
+def bytes_to_ip(value: bytes) -> str:
+    value = bytes(value).ljust(16, b'\0')  # NumPy的S类型会去掉末尾的0字节
+    if value[:12] == IPV4_MAPPED:
+        return socket.inet_ntoa(value[12:])
+    return socket.inet_ntop(socket.AF_INET6, value)
+
+def partition_name(timestamp: float) -> str:
+    return time.strftime(PARTITION_FORMAT, time.gmtime(timestamp))
+
+def partition_start(name: str) -> float:
+    return float(calendar.timegm(time.strptime(name, PARTITION_FORMAT)))
+
+def session_to_flow(session_key, session) -> Optional[tuple]:
+    """将SessionHandler的会话转换为流记录（按COLUMNS顺序）"""
+    src, dst, protocol = session_key
+    src_ip, src_port = src.rsplit(':', 1)
+    dst_ip, dst_port = dst.rsplit(':', 1)
+    if not session:
+        return None
+    size = 0
+    for entry in session:
+        packet = entry['packet']
+        size += len(packet.original) if packet.original else len(packet)
+    return (
+        session[0]['timestamp'], session[-1]['timestamp'],
+        ip_to_bytes(src_ip), ip_to_bytes(dst_ip), int(src_port), int(dst_port),
+        PROTOCOLS.get(protocol, 0), len(session), size,
+    )
+
+class FlowArchive:
+    def __init__(self, directory: str = 'data/flows', chunk_size: int = 65536,
+                 flush_interval: float = 60, retention_days: Optional[float] = None):
+        """
+        初始化列式流记录归档（按小时分区，每个分块每列一个.npy文件）
+        Args:
+            directory: 归档目录
+            chunk_size: 每个分块的最大记录数
+            flush_interval: 缓冲记录的最长保留时间（秒），超过后写入磁盘
+            retention_days: 保留天数，过期的小时分区整目录删除（None表示不删除）
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.logger = logging.getLogger(__name__)
+
+        self.lock = Lock()
+        self.buffers: Dict[str, List[tuple]] = defaultdict(list)  # 小时分区 -> 待写入的记录
+        self.next_chunk: Dict[str, int] = {}
+        self.last_flush = time.monotonic()
+
+        # 监控指标
+        self.metric_records = registry.counter('flow_archive_records_total', '写入归档的流记录数')
+        self.metric_chunks = registry.counter('flow_archive_chunks_total', '写入归档的分块数')
+
+    def add(self, record: tuple):
+        """添加一条流记录（按COLUMNS顺序的元组）"""
+        with self.lock:
+            name = partition_name(record[0])
+            buffer = self.buffers[name]
+            buffer.append(record)
+            if len(buffer) >= self.chunk_size:
+                self._write_chunk(name, self.buffers.pop(name))
+            if time.monotonic() - self.last_flush > self.flush_interval:
+                self._flush()
+
+    def flush_due(self) -> bool:
+        """缓冲时间超过flush_interval时写入磁盘（由检查点线程定期调用，没有新流记录时也会写入）"""
+        with self.lock:
+            if time.monotonic() - self.last_flush <= self.flush_interval:
+                return False
+            self._flush()
+            return True
+
+    def add_session(self, session_key, session):
+        """会话过期回调：将会话写入归档"""
+        record = session_to_flow(session_key, session)
+        if record is not None:
+            self.add(record)
+
+    def flush(self):
+        """将所有缓冲的记录写入磁盘"""
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+    def partitions(self, start: float = None, end: float = None) -> List[str]:
+        """与时间范围[start, end)重叠的小时分区（按时间排序）"""
+        names = []
+        for path in sorted(self.directory.iterdir()):
+            if not path.is_dir() or len(path.name) != 10 or not path.name.isdigit():
+                continue
+            begin = partition_start(path.name)
+            if (start is None or begin + PARTITION_SECONDS > start) and (end is None or begin < end):
+                names.append(path.name)
+        return names
+
+    def scan(self, columns: Sequence[str], start: float = None, end: float = None,
+             filters: Dict = None) -> Iterator[Dict[str, np.ndarray]]:
+        """按分块扫描指定列，返回过滤后的列数组
+
+        只读取所需列（以及过滤列）的内存映射，内存占用与分块大小和列数相关，与数据总量无关。
+        start/end按start_time过滤（end不含）；filters为 {列名: 值}，IP可使用字符串。
+        """
+        filters = {
+            name: ip_to_bytes(value) if name in IP_COLUMNS and isinstance(value, str)
+            else PROTOCOLS.get(value, value) if name == 'protocol' else value
+            for name, value in (filters or {}).items()
+        }
+        unknown = (set(columns) | set(filters)) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"未知的列: {sorted(unknown)}")
+
+        for name in self.partitions(start, end):
+            for chunk in sorted((self.directory / name).glob('chunk-*[0-9]')):
+                arrays = {}
+
+                def column(key):
+                    if key not in arrays:
+                        arrays[key] = np.load(chunk / f"{key}.npy", mmap_mode='r')
+                    return arrays[key]
+
+                mask = None
+                if start is not None:
+                    mask = column('start_time') >= start
+                if end is not None:
+                    mask = self._and(mask, column('start_time') < end)
+                for key, value in filters.items():
+                    mask = self._and(mask, column(key) == value)
+                if mask is None:
+                    yield {key: np.asarray(column(key)) for key in columns}
+                elif mask.any():
+                    yield {key: column(key)[mask] for key in columns}
+
+    def count(self, start: float = None, end: float = None, filters: Dict = None) -> int:
+        return sum(len(chunk['start_time']) for chunk in self.scan(['start_time'], start, end, filters))
+
+    def aggregate(self, group_by: str, measures: Sequence[str] = ('packets', 'bytes'),
+                  start: float = None, end: float = None, filters: Dict = None) -> Dict:
+        """按列分组求和，返回 {分组值: {'flows': 流数, 度量: 总和}}"""
+        totals = defaultdict(lambda: defaultdict(int))
+        for chunk in self.scan([group_by, *measures], start, end, filters):
+            keys, inverse = np.unique(chunk[group_by], return_inverse=True)
+            flows = np.bincount(inverse, minlength=len(keys))
+            sums = {name: np.bincount(inverse, weights=chunk[name], minlength=len(keys))
+                    for name in measures}
+            for i, key in enumerate(keys.tolist()):
+                entry = totals[bytes_to_ip(key) if group_by in IP_COLUMNS else key]
+                entry['flows'] += int(flows[i])
+                for name in measures:
+                    entry[name] += int(sums[name][i])
+        return {key: dict(value) for key, value in totals.items()}
+
+    @staticmethod
+    def _and(mask, condition):
+        return condition if mask is None else mask & condition
+
+    def _flush(self):
+        """写入所有缓冲区并清理过期分区（调用方持有锁）"""
+        buffers, self.buffers = self.buffers, defaultdict(list)
+        for name, records in buffers.items():
+            if records:
+                self._write_chunk(name, records)
+        self.last_flush = time.monotonic()
+        if self.retention_days is not None:
+            self._prune(time.time() - self.retention_days * 86400)
+
+    def _write_chunk(self, name: str, records: List[tuple]):
+        """将记录写为一个分块：先写入临时目录，完成后重命名，读取方不会看到不完整的分块"""
+        partition = self.directory / name
+        partition.mkdir(exist_ok=True)
+        if name not in self.next_chunk:
+            existing = [int(p.name.split('-')[1]) for p in partition.glob('chunk-*[0-9]')]
+            self.next_chunk[name] = max(existing, default=0) + 1
+        chunk = partition / f"chunk-{self.next_chunk[name]:06d}"
+        self.next_chunk[name] += 1
+
+        tmp = partition / f"{chunk.name}.tmp"
+        tmp.mkdir(exist_ok=True)
+        for values, (key, dtype) in zip(zip(*records), COLUMNS.items()):
+            np.save(tmp / f"{key}.npy", np.array(values, dtype=dtype))
+        os.rename(tmp, chunk)
+        self.metric_records.inc(len(records))
+        self.metric_chunks.inc()
+
+    def _prune(self, cutoff: float):
+        for name in self.partitions(end=cutoff):
+            if partition_start(name) + PARTITION_SECONDS <= cutoff:
+                shutil.rmtree(self.directory / name, ignore_errors=True)
+                self.next_chunk.pop(name, None)
+                self.logger.info(f"删除过期流记录分区 {name}")
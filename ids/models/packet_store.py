@@ -0,0 +1,142 @@
+import logging
+import mmap
+import os
+import re
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Iterator, Optional, Tuple
+
+from ids.utils.metrics import registry
+from ids.utils.pcap import GLOBAL_HEADER, global_header, read_record, record
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d+)\.pcap$')
+
+def flow_key(src_ip, src_port, dst_ip, dst_port, protocol) -> str:
+    """生成与方向无关的流标识，例如 "TCP 10.0.0.1:443-10.0.0.2:51000" """
+    a = f"{src_ip}:{src_port if src_port is not None else ''}"
+    b = f"{dst_ip}:{dst_port if dst_port is not None else ''}"
+    if b < a:
+        a, b = b, a
+    return f"{protocol} {a}-{b}"
+
+class PacketStore:
+    def __init__(self, directory: str = 'data/packets', segment_size: int = 64 * 1024 * 1024,
+                 max_segments: Optional[int] = None):
+        """
+        初始化原始数据包存储（pcap格式的只追加分段文件）
+        Args:
+            directory: 分段文件目录
+            segment_size: 单个分段文件的最大字节数，超过后切换到新分段
+            max_segments: 最多保留的分段数，超出时删除最旧的分段（None表示不删除）
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.logger = logging.getLogger(__name__)
+
+        self.lock = Lock()
+        self.maps = {}  # 分段号 -> mmap（只读）
+        self.segments = sorted(self._existing_segments())
+        # 每次启动都写入新分段，不修改已有文件
+        self.segment = (self.segments[-1] + 1) if self.segments else 1
+        self.file = None
+        self.position = 0
+        self._open_segment()
+
+        # 监控指标
+        self.metric_bytes = registry.counter('packet_store_bytes_total', '写入分段文件的字节数')
+        self.metric_rotations = registry.counter('packet_store_rotations_total', '分段文件切换次数')
+        registry.gauge('packet_store_segments', '保留的分段文件数', function=lambda: len(self.segments))
+
+    def segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment-{segment:08d}.pcap"
+
+    def append(self, timestamp: float, data: bytes) -> Tuple[int, int]:
+        """追加一个数据包，返回(分段号, 偏移)"""
+        entry = record(timestamp, data)
+        with self.lock:
+            if self.position + len(entry) > self.segment_size and self.position > GLOBAL_HEADER.size:
+                self._rotate()
+            location = (self.segment, self.position)
+            self.file.write(entry)
+            self.position += len(entry)
+        self.metric_bytes.inc(len(entry))
+        return location
+
+    def read(self, segment: int, offset: int) -> Optional[Tuple[float, bytes]]:
+        """按分段号和偏移读取数据包，分段已被删除时返回None"""
+        buffer = self._map(segment, offset)
+        if buffer is None:
+            return None
+        timestamp, data, _ = read_record(buffer, offset)
+        return timestamp, data
+
+    def read_many(self, locations: Iterable[Tuple[int, int]]) -> Iterator[Tuple[float, bytes]]:
+        """依次读取多个数据包（跳过已删除的分段）"""
+        for segment, offset in locations:
+            entry = self.read(segment, offset)
+            if entry is not None:
+                yield entry
+
+    def export_pcap(self, locations: Iterable[Tuple[int, int]]) -> bytes:
+        """将指定位置的数据包导出为pcap文件内容"""
+        return global_header() + b''.join(
+            record(timestamp, data) for timestamp, data in self.read_many(locations)
+        )
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        """关闭当前分段和所有映射"""
+        with self.lock:
+            self.file.close()
+            for buffer in self.maps.values():
+                buffer.close()
+            self.maps.clear()
+
+    def _existing_segments(self):
+        for path in self.directory.iterdir():
+            match = SEGMENT_PATTERN.match(path.name)
+            if match:
+                yield int(match.group(1))
+
+    def _open_segment(self):
+        self.file = open(self.segment_path(self.segment), 'wb')
+        self.file.write(global_header())
+        self.position = GLOBAL_HEADER.size
+        self.segments.append(self.segment)
+
+    def _rotate(self):
+        """切换到新分段，并按保留数删除旧分段（调用方持有锁）"""
+        self.file.close()
+        self.segment += 1
+        self._open_segment()
+        self.metric_rotations.inc()
+
+        while self.max_segments and len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            # 映射可能正被其他线程在锁外读取，只删除引用，交给垃圾回收关闭（文件删除后映射仍可读）
+            self.maps.pop(oldest, None)
+            try:
+                os.remove(self.segment_path(oldest))
+            except OSError as e:
+                self.logger.error(f"删除分段文件失败 {oldest}: {str(e)}")
+
+    def _map(self, segment: int, offset: int):
+        """获取分段的内存映射；当前分段在读取位置超出映射范围时刷新并重新映射"""
+        with self.lock:
+            if segment not in self.segments:
+                return None
+            buffer = self.maps.get(segment)
+            if buffer is not None and offset < len(buffer):
+                return buffer
+            if segment == self.segment:
+                self.file.flush()
+            with open(self.segment_path(segment), 'rb') as f:
+                # 旧映射可能仍被其他线程读取，交给垃圾回收关闭
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = buffer
+            return buffer
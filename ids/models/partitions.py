@@ -0,0 +1,228 @@
+import logging
+import re
+import time
+from bisect import insort
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, func, inspect, select, text
+
+from ids.utils.metrics import registry
+
+# 分区周期 -> (表名后缀格式, 时长)
+PERIODS = {
+    'hour': ('%Y%m%d%H', timedelta(hours=1)),
+    'day': ('%Y%m%d', timedelta(days=1)),
+}
+# 后缀长度 -> 周期（兼容修改周期配置前创建的分区）
+SUFFIX_PERIODS = {len(datetime(2000, 1, 1).strftime(fmt)): name for name, (fmt, _) in PERIODS.items()}
+
+class Partition:
+    def __init__(self, table: Table, start: datetime, period: str):
+        self.table = table
+        self.start = start
+        self.end = start + PERIODS[period][1]
+
+    def overlaps(self, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        return (start is None or self.end > start) and (end is None or self.start <= end)
+
+    def __lt__(self, other):
+        return self.start < other.start
+
+class PartitionManager:
+    def __init__(self, engine, models, period: str = 'day', retention: Dict[str, float] = None,
+                 maintenance_interval: float = 60, drop_grace: float = 300):
+        """
+        初始化按时间分区的表管理器（每个周期一张表，过期后整表删除）
+        Args:
+            engine: 数据库引擎
+            models: 需要分区的ORM模型（只作为表结构模板）
+            period: 分区周期（hour或day）
+            retention: 各表的保留天数，例如 {'packets': 7, 'alerts': 90}，未配置的表不删除
+            maintenance_interval: 维护线程的运行间隔（秒）
+            drop_grace: 过期分区先从查询范围中移除，经过该时长（秒）后才删除表，
+                已经取得该表的查询可以正常完成
+        """
+        if period not in PERIODS:
+            raise ValueError(f"不支持的分区周期: {period}")
+        self.engine = engine
+        self.models = {model.__tablename__: model for model in models}
+        self.period = period
+        self.retention = retention or {}
+        self.maintenance_interval = maintenance_interval
+        self.drop_grace = drop_grace
+        self.logger = logging.getLogger(__name__)
+
+        self.lock = Lock()
+        self.metadata = MetaData()
+        self.partitions: Dict[str, List[Partition]] = {name: [] for name in self.models}
+        self.by_name: Dict[str, Partition] = {}
+        self.retired: List[Tuple[float, Partition]] = []  # (删除时间（monotonic）, 已移出查询范围的分区)
+        self._discover()
+
+        self.stop_event = Event()
+        self.maintenance_thread = None
+
+        # 监控指标
+        self.metric_created = registry.counter('partitions_created_total', '创建的分区表数')
+        self.metric_dropped = registry.counter('partitions_dropped_total', '过期删除的分区表数')
+        for name in self.models:
+            registry.gauge('partitions', '分区表数', labels={'table': name},
+                           function=lambda name=name: len(self.partitions[name]))
+
+    def partition_name(self, model, timestamp: datetime) -> str:
+        fmt, _ = PERIODS[self.period]
+        return f"{model.__tablename__}_{timestamp.strftime(fmt)}"
+
+    def table_for(self, model, timestamp: datetime) -> Table:
+        """获取时间戳所在分区的表（不存在时创建）"""
+        name = self.partition_name(model, timestamp)
+        partition = self.by_name.get(name)
+        if partition is None:
+            partition = self._create(model, name, timestamp)
+        return partition.table
+
+    def tables_for_range(self, model, start: datetime = None, end: datetime = None,
+                         newest_first: bool = False) -> List[Table]:
+        """获取与时间范围[start, end]重叠的分区表（按时间排序）"""
+        with self.lock:
+            partitions = [p for p in self.partitions[model.__tablename__] if p.overlaps(start, end)]
+        if newest_first:
+            partitions.reverse()
+        return [p.table for p in partitions]
+
+    def max_id(self, model) -> int:
+        """所有分区中最大的主键"""
+        with self.engine.connect() as conn:
+            return max(
+                (conn.execute(select(func.max(table.c.id))).scalar() or 0
+                 for table in self.tables_for_range(model)),
+                default=0
+            )
+
+    def maintain(self, now: datetime = None):
+        """预先创建当前和下一个分区，将超过保留期的分区移出查询范围，并删除宽限期已过的分区"""
+        now = now or datetime.utcnow()
+        self._drop_retired()
+        _, length = PERIODS[self.period]
+        for name, model in self.models.items():
+            for timestamp in (now, now + length):
+                self.table_for(model, timestamp)
+
+            days = self.retention.get(name)
+            if days is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            with self.lock:
+                expired = [p for p in self.partitions[name] if p.end <= cutoff]
+            for partition in expired:
+                self._retire(name, partition)
+
+    def start(self):
+        """启动后台维护线程"""
+        self.maintain()
+        self.maintenance_thread = Thread(target=self._maintenance_loop, daemon=True)
+        self.maintenance_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.maintenance_thread:
+            self.maintenance_thread.join()
+
+    def _maintenance_loop(self):
+        while not self.stop_event.wait(self.maintenance_interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                self.logger.error(f"分区维护失败: {str(e)}")
+
+    def _template_table(self, model, name: str) -> Table:
+        """按模型的列定义创建分区表（不带外键，索引名带分区后缀）"""
+        template = model.__table__
+        columns = [
+            Column(column.name, column.type, primary_key=column.primary_key,
+                   nullable=column.nullable, index=column.index)
+            for column in template.columns
+        ]
+        # 单列index=True的索引随列一起创建，这里只复制显式声明的（复合）索引
+        indexes = [
+            Index(index.name.replace(template.name, name, 1), *[column.name for column in index.columns])
+            for index in template.indexes
+            if not (len(index.columns) == 1 and list(index.columns)[0].index)
+        ]
+        return Table(name, self.metadata, *columns, *indexes)
+
+    def _create(self, model, name: str, timestamp: datetime) -> Partition:
+        with self.lock:
+            partition = self.by_name.get(name)
+            if partition is not None:
+                return partition
+            table = self._template_table(model, name)
+            table.create(self.engine, checkfirst=True)
+            partition = self._register(model.__tablename__, table, timestamp, self.period)
+        self.metric_created.inc()
+        self.logger.info(f"创建分区表 {name}")
+        return partition
+
+    def _register(self, base: str, table: Table, timestamp: datetime, period: str) -> Partition:
+        fmt, _ = PERIODS[period]
+        start = datetime.strptime(timestamp.strftime(fmt), fmt)
+        partition = Partition(table, start, period)
+        insort(self.partitions[base], partition)
+        self.by_name[table.name] = partition
+        return partition
+
+    def _retire(self, base: str, partition: Partition):
+        """将过期分区移出查询范围，宽限期后再删除表（此前取得该表的查询不会因表不存在而失败）"""
+        with self.lock:
+            if self.by_name.get(partition.table.name) is not partition:
+                return
+            self.partitions[base].remove(partition)
+            del self.by_name[partition.table.name]
+            self.metadata.remove(partition.table)
+            self.retired.append((time.monotonic() + self.drop_grace, partition))
+        self.logger.info(f"过期分区表 {partition.table.name} 已移出查询范围，{self.drop_grace:.0f}秒后删除")
+
+    def _drop_retired(self):
+        now = time.monotonic()
+        with self.lock:
+            due = [partition for deadline, partition in self.retired if deadline <= now]
+            self.retired = [(deadline, partition) for deadline, partition in self.retired if deadline > now]
+        for partition in due:
+            with self.lock:
+                if partition.table.name in self.by_name:
+                    # 宽限期内又写入了过期时间段的数据，分区已重新注册
+                    continue
+                partition.table.drop(self.engine, checkfirst=True)
+            self.metric_dropped.inc()
+            self.logger.info(f"删除过期分区表 {partition.table.name}")
+
+    def _discover(self):
+        """加载数据库中已有的分区表"""
+        inspector = inspect(self.engine)
+        existing = inspector.get_table_names()
+        for base, model in self.models.items():
+            pattern = re.compile(rf"^{re.escape(base)}_(\d+)$")
+            for name in existing:
+                match = pattern.match(name)
+                if not match or len(match.group(1)) not in SUFFIX_PERIODS:
+                    continue
+                period = SUFFIX_PERIODS[len(match.group(1))]
+                timestamp = datetime.strptime(match.group(1), PERIODS[period][0])
+                table = self._template_table(model, name)
+                self._upgrade(inspector, table)
+                with self.lock:
+                    self._register(base, table, timestamp, period)
+
+    def _upgrade(self, inspector, table: Table):
+        """为旧版本创建的分区补充新增的列和索引"""
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        with self.engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in columns:
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                    self.logger.info(f"分区表 {table.name} 新增列 {column.name}")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -0,0 +1,227 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .database import Alert, AlertRollup, AlertSeverity, Packet, TrafficRollup, IPTrafficRollup
+
+# 聚合粒度 -> 时间桶长度
+RESOLUTIONS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+}
+
+# 汇总表 -> (维度列, 计数列)
+ROLLUPS = {
+    AlertRollup: (('severity', 'rule_name', 'src_ip'), ('count',)),
+    TrafficRollup: (('protocol', 'dst_port'), ('packets', 'bytes')),
+    IPTrafficRollup: (('ip',), ('packets', 'bytes')),
+}
+
+# 汇总表 -> 原始分区表（分钟汇总已过保留期时，首尾不足一小时的部分从原始表统计）
+RAW_SOURCES = {
+    AlertRollup: Alert,
+    TrafficRollup: Packet,
+    IPTrafficRollup: Packet,
+}
+
+# 支持 INSERT ... ON CONFLICT DO UPDATE 的方言
+UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    """时间戳所在时间桶的起点"""
+    if resolution == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+def split_range(start: Optional[datetime], end: Optional[datetime],
+                minute_cutoff: Optional[datetime] = None) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """将时间范围拆分为(粒度, 起点, 终点)：整小时部分使用小时桶，首尾不足一小时的部分使用分钟桶
+
+    起点向下取整到分钟，终点（不含）向上取整到分钟；None表示不限。
+    指定minute_cutoff（分钟汇总的保留期起点）时，其之前的分钟部分改为 ('raw', 起点, 终点)，从原始表统计。
+    """
+    if start is not None:
+        start = bucket_start(start, 'minute')
+    if end is not None and end != bucket_start(end, 'minute'):
+        end = bucket_start(end, 'minute') + RESOLUTIONS['minute']
+
+    hours_start = None
+    if start is not None:
+        hours_start = bucket_start(start, 'hour')
+        if hours_start < start:
+            hours_start += RESOLUTIONS['hour']
+    hours_end = bucket_start(end, 'hour') if end is not None else None
+
+    if hours_start is not None and hours_end is not None and hours_start >= hours_end:
+        ranges = [('minute', start, end)]
+    else:
+        ranges = []
+        if start is not None and start < hours_start:
+            ranges.append(('minute', start, hours_start))
+        ranges.append(('hour', hours_start, hours_end))
+        if end is not None and hours_end < end:
+            ranges.append(('minute', hours_end, end))
+    if minute_cutoff is None:
+        return ranges
+
+    # 保留期起点向上取整到分钟：该分钟之前的分钟桶可能已被删除
+    cutoff = bucket_start(minute_cutoff, 'minute')
+    if cutoff < minute_cutoff:
+        cutoff += RESOLUTIONS['minute']
+    split = []
+    for resolution, range_start, range_end in ranges:
+        if resolution == 'minute' and range_start < cutoff:
+            split.append(('raw', range_start, min(range_end, cutoff)))
+            if cutoff < range_end:
+                split.append(('minute', cutoff, range_end))
+        else:
+            split.append((resolution, range_start, range_end))
+    return split
+
+class RollupWriter:
+    """在写线程中将一批原始行聚合为分钟/小时汇总，并在同一事务中累加到汇总表"""
+
+    def aggregate(self, packets: List[Dict], alerts: List[Dict]) -> Dict:
+        """聚合一批数据包和告警，返回 {汇总表: {(粒度, 时间桶, 维度...): [计数...]}}"""
+        totals = {model: defaultdict(lambda model=model: [0] * len(ROLLUPS[model][1]))
+                  for model in ROLLUPS}
+        for resolution in RESOLUTIONS:
+            for row in packets:
+                bucket = bucket_start(row['timestamp'], resolution)
+                length = row['length'] or 0
+                traffic = totals[TrafficRollup][(resolution, bucket, row['protocol'], row['dst_port'] or 0)]
+                traffic[0] += 1
+                traffic[1] += length
+                host = totals[IPTrafficRollup][(resolution, bucket, row['src_ip'])]
+                host[0] += 1
+                host[1] += length
+            for row in alerts:
+                bucket = bucket_start(row['timestamp'], resolution)
+                severity = getattr(row['severity'], 'value', row['severity'])
+                key = (resolution, bucket, severity, row['rule_name'] or '', row.get('src_ip') or '')
+                totals[AlertRollup][key][0] += 1
+        return totals
+
+    def write(self, conn, totals: Dict):
+        """将聚合结果累加到汇总表"""
+        insert = UPSERT_DIALECTS.get(conn.dialect.name)
+        for model, groups in totals.items():
+            if not groups:
+                continue
+            dimensions, measures = ROLLUPS[model]
+            keys = ('resolution', 'bucket') + dimensions
+            rows = [
+                {**dict(zip(keys, key)), **dict(zip(measures, values))}
+                for key, values in groups.items()
+            ]
+            table = model.__table__
+            if insert is not None:
+                statement = insert(table)
+                statement = statement.on_conflict_do_update(
+                    index_elements=list(keys),
+                    set_={name: table.c[name] + statement.excluded[name] for name in measures}
+                )
+                conn.execute(statement, rows)
+            else:
+                self._write_fallback(conn, table, keys, measures, rows)
+
+    @staticmethod
+    def _write_fallback(conn, table, keys, measures, rows):
+        """不支持upsert的数据库：先更新，不存在时插入（只有写线程写汇总表，无并发冲突）"""
+        for row in rows:
+            condition = and_(*[table.c[key] == row[key] for key in keys])
+            result = conn.execute(
+                update(table).where(condition).values(
+                    {name: table.c[name] + row[name] for name in measures}
+                )
+            )
+            if result.rowcount == 0:
+                conn.execute(table.insert(), [row])
+
+    def prune(self, conn, retention: Dict[str, float], now: datetime = None):
+        """删除超过保留期的汇总行"""
+        now = now or datetime.utcnow()
+        for resolution, days in retention.items():
+            cutoff = now - timedelta(days=days)
+            for model in ROLLUPS:
+                table = model.__table__
+                conn.execute(delete(table).where(
+                    table.c.resolution == resolution, table.c.bucket < cutoff
+                ))
+
+def raw_columns(model, table) -> Tuple[Dict, List]:
+    """原始分区表上与汇总表维度、计数列对应的表达式"""
+    if model is AlertRollup:
+        return {
+            'severity': table.c.severity,
+            'rule_name': func.coalesce(table.c.rule_name, ''),
+            'src_ip': func.coalesce(table.c.src_ip, ''),
+        }, [func.count()]
+    measures = [func.count(), func.coalesce(func.sum(table.c.length), 0)]
+    if model is TrafficRollup:
+        return {'protocol': table.c.protocol, 'dst_port': func.coalesce(table.c.dst_port, 0)}, measures
+    return {'ip': table.c.src_ip}, measures
+
+def query_rollup(conn, model, group_by, start=None, end=None, filters=None,
+                 minute_cutoff=None, raw_tables=None) -> Dict[tuple, List[int]]:
+    """按维度汇总时间范围内的计数，返回 {维度值: [计数...]}
+
+    minute_cutoff为分钟汇总的保留期起点，之前不足一小时的部分通过raw_tables(原始表模型, 起点, 终点)
+    返回的分区表统计，与全表扫描的结果一致。
+    """
+    table = model.__table__
+    _, measures = ROLLUPS[model]
+    group_columns = [table.c[name] for name in group_by]
+    results = defaultdict(lambda: [0] * len(measures))
+    if raw_tables is None:
+        minute_cutoff = None
+    for resolution, range_start, range_end in split_range(start, end, minute_cutoff):
+        if resolution == 'raw':
+            queries = [
+                _raw_query(model, source, group_by, range_start, range_end, filters)
+                for source in raw_tables(RAW_SOURCES[model], range_start, range_end)
+            ]
+        else:
+            query = select(*group_columns, *[func.sum(table.c[name]) for name in measures]).where(
+                table.c.resolution == resolution
+            )
+            if range_start is not None:
+                query = query.where(table.c.bucket >= range_start)
+            if range_end is not None:
+                query = query.where(table.c.bucket < range_end)
+            for name, value in (filters or {}).items():
+                query = query.where(table.c[name] == value)
+            if group_columns:
+                query = query.group_by(*group_columns)
+            queries = [query]
+        for query in queries:
+            for row in conn.execute(query):
+                key = tuple(getattr(value, 'value', value) for value in row[:len(group_columns)])
+                values = row[len(group_columns):]
+                if all(value is None for value in values):
+                    continue
+                totals = results[key]
+                for i, value in enumerate(values):
+                    totals[i] += value or 0
+    return dict(results)
+
+def _raw_query(model, table, group_by, start, end, filters):
+    """在一个原始分区表上按汇总表的维度统计 [start, end)"""
+    dimensions, measures = raw_columns(model, table)
+    group_columns = [dimensions[name] for name in group_by]
+    query = select(*group_columns, *measures).where(
+        table.c.timestamp >= start, table.c.timestamp < end
+    )
+    for name, value in (filters or {}).items():
+        if name == 'severity':
+            value = AlertSeverity(value)
+        query = query.where(dimensions[name] == value)
+    if group_columns:
+        query = query.group_by(*group_columns)
+    return query
@@ -1,24 +1,66 @@
-from scapy.layers.inet import IP, TCP, UDP
 import logging
+import threading
 from datetime import datetime
 
+from ids.capture.decoder import ip_layer
+from ids.utils.alert_dispatch import AlertDispatcher, format_alert
+from ids.utils.suppression import AlertSuppressor
+
 class AlertHandler:
-    def __init__(self, firewall_handler=None):
+    def __init__(self, firewall_handler=None, suppressor: AlertSuppressor = None,
+                 dispatcher: AlertDispatcher = None):
+        """
+        初始化告警处理器
+        Args:
+            firewall_handler: 防火墙联动（高危告警自动封禁）
+            suppressor: 告警抑制器，按(规则, 源IP)抑制重复输出（不影响防火墙联动）
+            dispatcher: 告警分发器，告警异步写出到各输出端；None时直接写日志
+        """
         self.logger = logging.getLogger('AlertHandler')
         self.firewall_handler = firewall_handler
+        self.suppressor = suppressor or AlertSuppressor(name='log')
+        self.dispatcher = dispatcher
+        self.stop_event = threading.Event()
+        self.flush_thread = None
+        
+    def start(self):
+        """启动定时刷新线程：攻击停止后没有新告警时，聚合汇总也按flush_interval输出"""
+        self.stop_event.clear()
+        self.flush_thread = threading.Thread(target=self._flush_loop, name='AlertFlush', daemon=True)
+        self.flush_thread.start()
+        
+    def stop(self):
+        """停止定时刷新线程并输出所有剩余的汇总"""
+        self.stop_event.set()
+        if self.flush_thread:
+            self.flush_thread.join()
+        self.flush(force=True)
         
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.suppressor.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"输出告警汇总失败: {str(e)}")
+                
     def handle_alert(self, packet, rule_alerts, ml_result):
         """处理告警"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        src_ip = packet[IP].src
+        ip = ip_layer(packet)
+        src_ip = ip.src
+        dst_ip = ip.dst
         
         # 处理规则引擎告警
         for alert in rule_alerts:
-            alert_msg = (
-                f"[{timestamp}] 规则告警: {alert['rule_name']}\n"
-                f"源IP: {src_ip}, 严重程度: {alert['severity']}"
-            )
-            self.logger.warning(alert_msg)
+            if self.suppressor.allow((alert['rule_name'], src_ip), alert['severity']):
+                self._publish({
+                    'timestamp': timestamp,
+                    'type': 'rule',
+                    'rule_name': alert['rule_name'],
+                    'severity': alert['severity'],
+                    'src_ip': src_ip,
+                    'dst_ip': dst_ip,
+                })
             
             # 对高危告警进行自动封禁
             if alert['severity'] == 'high' and self.firewall_handler:
@@ -29,15 +71,44 @@ class AlertHandler:
                 
         # 处理机器学习告警
         if ml_result and ml_result['is_attack']:
-            alert_msg = (
-                f"[{timestamp}] ML检测告警\n"
-                f"源IP: {src_ip}, 置信度: {ml_result['confidence']:.2f}"
-            )
-            self.logger.warning(alert_msg)
+            if self.suppressor.allow(('ML', src_ip), ml_result['confidence']):
+                self._publish({
+                    'timestamp': timestamp,
+                    'type': 'ml',
+                    'rule_name': 'ML',
+                    'severity': 'high' if ml_result['confidence'] > 0.9 else 'medium',
+                    'confidence': float(ml_result['confidence']),
+                    'src_ip': src_ip,
+                    'dst_ip': dst_ip,
+                })
             
             # 对高置信度的攻击进行自动封禁
             if ml_result['confidence'] > 0.9 and self.firewall_handler:
                 self.firewall_handler.ban_ip(
                     src_ip,
                     f"ML检测高置信度攻击 (置信度: {ml_result['confidence']:.2f})"
-                ) 
\ No newline at end of file
+                )
+                
+        if self.suppressor.due():
+            self.flush()
+            
+    def flush(self, force: bool = False):
+        """输出被抑制告警的汇总"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for incident in self.suppressor.flush(force=force):
+            rule_name, src_ip = incident.key
+            self._publish({
+                'timestamp': timestamp,
+                'type': 'aggregate',
+                'rule_name': rule_name,
+                'src_ip': src_ip,
+                'suppressed': incident.pending,
+                'count': incident.count,
+            })
+            
+    def _publish(self, alert):
+        """发布到分发器（不阻塞检测），未配置分发器时直接写日志"""
+        if self.dispatcher is not None:
+            self.dispatcher.publish(alert)
+        else:
+            self.logger.warning(format_alert(alert))
@@ -0,0 +1,306 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import socket
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ids.utils.metrics import registry
+
+DROP_POLICIES = ('drop_oldest', 'drop_newest')
+
+
+class AlertSink(ABC):
+    """告警输出端：独立的有界队列和工作线程，按批写出，失败时重试"""
+
+    def __init__(self, name: str, batch_size: int = 100, flush_interval: float = 1.0,
+                 queue_size: int = 10000, drop_policy: str = 'drop_oldest',
+                 max_retries: int = 3, retry_backoff: float = 0.5):
+        """
+        Args:
+            name: 输出端名称（指标标签）
+            batch_size: 每批最多写出的告警数
+            flush_interval: 不足一批时的最长等待时间（秒）
+            queue_size: 队列容量
+            drop_policy: 队列满时丢弃最旧（drop_oldest）或最新（drop_newest）的告警，不阻塞调用方
+            max_retries: 写出失败后的重试次数，仍失败则丢弃该批
+            retry_backoff: 第一次重试前的等待时间（秒），之后每次加倍
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"不支持的丢弃策略: {drop_policy}")
+        self.name = name
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.queue_size = max(1, int(queue_size))
+        self.drop_policy = drop_policy
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.logger = logging.getLogger(__name__)
+
+        self.cond = threading.Condition()
+        self.queue = deque()
+        self.running = False
+        self.worker = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._last_sample = (time.monotonic(), 0)
+        self._throughput = 0.0
+
+        # 监控指标
+        labels = {'sink': name}
+        self.metric_sent = registry.counter('alert_sink_sent_total', '输出端写出的告警数', labels)
+        self.metric_dropped = registry.counter('alert_sink_dropped_total', '输出端队列满时丢弃的告警数', labels)
+        self.metric_failed = registry.counter('alert_sink_failed_total', '输出端重试后仍写出失败的告警数', labels)
+        self.metric_retries = registry.counter('alert_sink_retries_total', '输出端重试次数', labels)
+        self.metric_latency = registry.histogram('alert_sink_batch_seconds', '输出端每批写出耗时', labels)
+        registry.gauge('alert_sink_backlog', '输出端队列积压', labels, function=lambda: len(self.queue))
+
+    @abstractmethod
+    def write_batch(self, alerts: List[Dict]):
+        """写出一批告警（失败时抛出异常）"""
+
+    def close(self):
+        """释放资源（子类按需实现）"""
+
+    def offer(self, alert: Dict) -> bool:
+        """放入队列（不阻塞），返回告警是否入队"""
+        with self.cond:
+            if len(self.queue) >= self.queue_size:
+                self.dropped += 1
+                self.metric_dropped.inc()
+                if self.drop_policy == 'drop_newest':
+                    return False
+                self.queue.popleft()
+            self.queue.append(alert)
+            if len(self.queue) >= self.batch_size or len(self.queue) == 1:
+                self.cond.notify()
+        return True
+
+    def start(self):
+        self.running = True
+        self.worker = threading.Thread(target=self._worker_loop, name=f"AlertSink-{self.name}", daemon=True)
+        self.worker.start()
+
+    def stop(self, timeout: float = 5.0):
+        """写出队列中剩余的告警后停止"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.worker:
+            self.worker.join(timeout)
+            if self.worker.is_alive():
+                # 工作线程仍在写出，不能关闭它正在使用的文件或连接
+                self.logger.warning(f"告警输出端 {self.name} 未在 {timeout} 秒内写完，"
+                                    f"队列中还有 {len(self.queue)} 条告警")
+                return
+        self.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.cond:
+            last_time, last_sent = self._last_sample
+            if now - last_time >= 1.0:
+                self._throughput = (self.sent - last_sent) / (now - last_time)
+                self._last_sample = (now, self.sent)
+            return {
+                'name': self.name,
+                'backlog': len(self.queue),
+                'capacity': self.queue_size,
+                'sent': self.sent,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'throughput': round(self._throughput, 2),
+            }
+
+    def _worker_loop(self):
+        while True:
+            with self.cond:
+                deadline = None
+                while self.running and len(self.queue) < self.batch_size:
+                    if self.queue:
+                        # 第一条告警入队后最多等待flush_interval凑满一批
+                        deadline = deadline or time.monotonic() + self.flush_interval
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.cond.wait(remaining)
+                    else:
+                        self.cond.wait()
+                if not self.queue and not self.running:
+                    return
+                batch = [self.queue.popleft() for _ in range(min(len(self.queue), self.batch_size))]
+            self._write_with_retry(batch)
+
+    def _write_with_retry(self, batch: List[Dict]):
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    with self.cond:
+                        self.failed += len(batch)
+                    self.metric_failed.inc(len(batch))
+                    self.logger.error(f"告警输出端 {self.name} 写出失败，丢弃 {len(batch)} 条告警: {str(e)}")
+                    return
+                self.metric_retries.inc()
+                time.sleep(delay)
+                delay *= 2
+                continue
+            self.metric_latency.observe(time.perf_counter() - start)
+            with self.cond:
+                self.sent += len(batch)
+            self.metric_sent.inc(len(batch))
+            return
+
+
+def format_alert(alert: Dict) -> str:
+    """告警的单行文本形式"""
+    if alert.get('type') == 'ml':
+        return (f"[{alert['timestamp']}] ML检测告警 源IP: {alert['src_ip']}, "
+                f"置信度: {alert['confidence']:.2f}")
+    if alert.get('type') == 'aggregate':
+        return (f"[{alert['timestamp']}] 告警聚合: {alert['rule_name']}, 源IP: {alert['src_ip']}, "
+                f"抑制 {alert['suppressed']} 条重复告警（共 {alert['count']} 条）")
+    return (f"[{alert['timestamp']}] 规则告警: {alert['rule_name']} 源IP: {alert['src_ip']}, "
+            f"严重程度: {alert['severity']}")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class LogSink(AlertSink):
+    def __init__(self, name: str = 'log', logger_name: str = 'AlertHandler', **options):
+        super().__init__(name, **options)
+        self.alert_logger = logging.getLogger(logger_name)
+
+    def write_batch(self, alerts):
+        for alert in alerts:
+            self.alert_logger.warning(format_alert(alert))
+
+
+class JSONLinesSink(AlertSink):
+    def __init__(self, path: str = 'logs/alerts.jsonl', name: str = 'jsonl', **options):
+        super().__init__(name, **options)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = None
+
+    def write_batch(self, alerts):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(''.join(
+            json.dumps(alert, ensure_ascii=False, default=_json_default) + '\n' for alert in alerts
+        ))
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SyslogSink(AlertSink):
+    """以RFC 5424格式通过UDP发送，每条告警一个数据报"""
+
+    SEVERITIES = {'critical': 2, 'high': 3, 'medium': 4, 'low': 5}
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 514, facility: int = 4,
+                 app_name: str = 'ids', name: str = 'syslog', **options):
+        super().__init__(name, **options)
+        self.address = (host, int(port))
+        self.facility = facility
+        self.app_name = app_name
+        self.hostname = socket.gethostname()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write_batch(self, alerts):
+        for alert in alerts:
+            priority = self.facility * 8 + self.SEVERITIES.get(alert.get('severity'), 4)
+            message = (f"<{priority}>1 {datetime.utcnow().isoformat()}Z {self.hostname} "
+                       f"{self.app_name} - - - {format_alert(alert)}")
+            self.socket.sendto(message.encode('utf-8'), self.address)
+
+    def close(self):
+        self.socket.close()
+
+
+class WebhookSink(AlertSink):
+    """每批告警以JSON数组POST到HTTP接收端"""
+
+    def __init__(self, url: str, timeout: float = 5.0, headers: Dict[str, str] = None,
+                 name: str = 'webhook', **options):
+        super().__init__(name, **options)
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    def write_batch(self, alerts):
+        body = json.dumps(alerts, ensure_ascii=False, default=_json_default).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+SINKS = {
+    'log': LogSink,
+    'jsonl': JSONLinesSink,
+    'syslog': SyslogSink,
+    'webhook': WebhookSink,
+}
+
+
+def create_sink(config: Dict) -> AlertSink:
+    """按配置创建输出端，例如 {'type': 'jsonl', 'path': 'logs/alerts.jsonl', 'batch_size': 200}"""
+    options = dict(config)
+    kind = options.pop('type', None)
+    if kind not in SINKS:
+        raise ValueError(f"不支持的告警输出端: {kind}")
+    return SINKS[kind](**options)
+
+
+class AlertDispatcher:
+    def __init__(self, sinks: List[AlertSink] = None):
+        """
+        初始化告警分发器：发布告警只放入各输出端的有界队列，由输出端线程异步写出
+        Args:
+            sinks: 输出端列表
+        """
+        self.sinks: List[AlertSink] = list(sinks or [])
+        self.logger = logging.getLogger(__name__)
+        self.metric_published = registry.counter('alerts_published_total', '发布到分发器的告警数')
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> 'AlertDispatcher':
+        """按配置创建，config['sinks']为输出端配置列表，其他键作为各输出端的默认配置"""
+        config = dict(config or {})
+        sinks = config.pop('sinks', [{'type': 'log'}])
+        return cls([create_sink({**config, **sink}) for sink in sinks])
+
+    def publish(self, alert: Dict):
+        """发布告警（不阻塞，队列满时按各输出端的丢弃策略处理）"""
+        self.metric_published.inc()
+        for sink in self.sinks:
+            sink.offer(alert)
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def stop(self, timeout: float = 5.0):
+        for sink in self.sinks:
+            sink.stop(timeout)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """各输出端的吞吐量、积压和丢弃数"""
+        return [sink.get_stats() for sink in self.sinks]
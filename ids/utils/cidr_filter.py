@@ -0,0 +1,186 @@
+import logging
+import socket
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+import yaml
+
+
+class _TrieNode:
+    __slots__ = ('prefix', 'length', 'value', 'children')
+
+    def __init__(self, prefix: int, length: int, value=None):
+        self.prefix = prefix      # 地址的高length位
+        self.length = length      # 前缀长度
+        self.value = value
+        self.children = [None, None]
+
+
+class CIDRTrie:
+    def __init__(self, width: int):
+        """
+        二进制基数树（Patricia树），按整数地址做最长前缀匹配
+        Args:
+            width: 地址位数（IPv4为32，IPv6为128）
+        """
+        self.width = width
+        self.root = _TrieNode(0, 0)
+        self.size = 0
+
+    def insert(self, network: int, length: int, value: Any) -> None:
+        """插入前缀，network为网络地址的整数形式"""
+        if not 0 <= length <= self.width:
+            raise ValueError(f"无效的前缀长度: {length}")
+        prefix = network >> (self.width - length)
+        node = self.root
+
+        while True:
+            if length == node.length:
+                if node.value is None:
+                    self.size += 1
+                node.value = value
+                return
+
+            bit = (prefix >> (length - node.length - 1)) & 1
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _TrieNode(prefix, length, value)
+                self.size += 1
+                return
+
+            # 计算新前缀与子节点的公共前缀长度
+            shortest = min(child.length, length)
+            diff = (child.prefix >> (child.length - shortest)) ^ (prefix >> (length - shortest))
+            common = shortest - diff.bit_length()
+            if common == child.length:
+                node = child
+                continue
+
+            child_bit = (child.prefix >> (child.length - common - 1)) & 1
+            if common == length:
+                # 新前缀是子节点的祖先
+                new_node = _TrieNode(prefix, length, value)
+                new_node.children[child_bit] = child
+            else:
+                # 在分叉处插入中间节点
+                new_node = _TrieNode(child.prefix >> (child.length - common), common)
+                new_node.children[child_bit] = child
+                new_node.children[child_bit ^ 1] = _TrieNode(prefix, length, value)
+            node.children[bit] = new_node
+            self.size += 1
+            return
+
+    def lookup(self, address: int) -> Optional[Any]:
+        """最长前缀匹配，复杂度为O(前缀长度)"""
+        width = self.width
+        node = self.root
+        best = None
+        while node is not None:
+            if address >> (width - node.length) != node.prefix:
+                break
+            if node.value is not None:
+                best = node.value
+            if node.length == width:
+                break
+            node = node.children[(address >> (width - node.length - 1)) & 1]
+        return best
+
+    def __len__(self):
+        return self.size
+
+
+def parse_address(address: str):
+    """将IP地址字符串转换为(整数地址, 位数)"""
+    if ':' in address:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big'), 128
+    return int.from_bytes(socket.inet_aton(address), 'big'), 32
+
+
+def parse_cidr(cidr: str):
+    """解析CIDR前缀，返回(网络地址整数, 前缀长度, 位数)"""
+    address, _, length = cidr.strip().partition('/')
+    network, width = parse_address(address)
+    length = int(length) if length else width
+    if not 0 <= length <= width:
+        raise ValueError(f"无效的CIDR前缀: {cidr}")
+    # 清除主机位
+    network &= ((1 << length) - 1) << (width - length)
+    return network, length, width
+
+
+class CIDRFilter:
+    ALLOW = 'allow'
+    DENY = 'deny'
+
+    def __init__(self, allow: List[str] = None, deny: List[str] = None, path: str = None):
+        """
+        初始化CIDR允许/拒绝列表
+        Args:
+            allow: 允许列表（源和目的都命中时跳过检测）
+            deny: 拒绝列表（源或目的命中时直接告警）
+            path: 列表文件路径（YAML，包含allow和deny两个键），支持热重载
+        """
+        self.path = Path(path) if path else None
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._tries = {32: CIDRTrie(32), 128: CIDRTrie(128)}
+        if self.path:
+            self.reload()
+        else:
+            self.load(allow or [], deny or [])
+
+    def load(self, allow: List[str], deny: List[str]) -> None:
+        """构建新的前缀树并原子替换，查找不需要加锁"""
+        tries = {32: CIDRTrie(32), 128: CIDRTrie(128)}
+        # 拒绝列表后插入，相同前缀时拒绝优先
+        for action, prefixes in ((self.ALLOW, allow), (self.DENY, deny)):
+            for cidr in prefixes:
+                try:
+                    network, length, width = parse_cidr(cidr)
+                    tries[width].insert(network, length, action)
+                except (ValueError, OSError) as e:
+                    self.logger.error(f"忽略无效的CIDR前缀 {cidr}: {str(e)}")
+        with self._lock:
+            self._tries = tries
+        self.logger.info(
+            f"已加载CIDR列表: IPv4前缀 {len(tries[32])} 个, IPv6前缀 {len(tries[128])} 个"
+        )
+
+    def reload(self) -> None:
+        """从文件重新加载列表"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = yaml.safe_load(f) or {}
+        except Exception as e:
+            self.logger.error(f"加载CIDR列表文件 {self.path} 失败: {str(e)}")
+            return
+        self.load(data.get('allow') or [], data.get('deny') or [])
+
+    def lookup(self, address: str) -> Optional[str]:
+        """查找地址所属列表，返回allow、deny或None（最长前缀优先）"""
+        try:
+            value, width = parse_address(address)
+        except (OSError, ValueError):
+            return None
+        return self._tries[width].lookup(value)
+
+    def classify(self, src_ip: str, dst_ip: str) -> Optional[str]:
+        """判断数据包的处理方式
+
+        任一端命中拒绝列表返回deny；两端都命中允许列表返回allow；否则返回None
+        """
+        src = self.lookup(src_ip)
+        dst = self.lookup(dst_ip)
+        if src == self.DENY or dst == self.DENY:
+            return self.DENY
+        if src == self.ALLOW and dst == self.ALLOW:
+            return self.ALLOW
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取前缀数量"""
+        tries = self._tries
+        return {'ipv4_prefixes': len(tries[32]), 'ipv6_prefixes': len(tries[128])}
@@ -1,11 +1,309 @@
+import heapq
+import ipaddress
 import logging
-import iptc
-from typing import Dict
-import yaml
+import subprocess
+import threading
+import time
+from collections import deque
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import yaml
+
+from ids.utils.metrics import registry
+
+class DryRunBackend:
+    """内存中的防火墙后端（不修改主机防火墙，用于测试和无root权限的环境）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: Dict[str, int] = {}  # IP -> 超时（秒）
+        self.batches: List[Tuple[str, List[str]]] = []  # (操作, IP列表)，按调用顺序记录
+
+    def setup(self):
+        pass
+
+    def add(self, entries: Sequence[Tuple[str, int]]):
+        for ip, _ in entries:
+            ipaddress.ip_address(ip)  # 与ipset一样拒绝无效地址
+        with self.lock:
+            for ip, timeout in entries:
+                self.entries[ip] = timeout
+            self.batches.append(('add', [ip for ip, _ in entries]))
+
+    def remove(self, ips: Sequence[str]):
+        with self.lock:
+            for ip in ips:
+                self.entries.pop(ip, None)
+            self.batches.append(('del', list(ips)))
+
+class IPSetBackend:
+    """每个地址族使用一个ipset（hash:ip，每个条目带超时）和一条iptables/ip6tables规则封禁IP
+
+    IPv4地址放在set_name中，IPv6地址放在 set_name + '6'（family inet6）中。
+    封禁/解封通过 `ipset restore` 批量提交，一批只启动一个进程。
+    """
+
+    def __init__(self, set_name: str = 'ids_banned', chain_name: str = 'IDS_CHAIN',
+                 default_timeout: int = 3600):
+        self.set_name = set_name
+        self.set_name6 = f"{set_name}6"
+        self.chain_name = chain_name
+        self.default_timeout = default_timeout
+        self.ipv6 = True  # ip6tables不可用时只封禁IPv4
+        self.logger = logging.getLogger(__name__)
+
+    def setup(self):
+        """创建ipset、自定义链以及引用它们的iptables/ip6tables规则（已存在时跳过）"""
+        self._setup_family('iptables', self.set_name, 'inet')
+        try:
+            self._setup_family('ip6tables', self.set_name6, 'inet6')
+        except (OSError, subprocess.CalledProcessError) as e:
+            self.ipv6 = False
+            self.logger.warning(f"无法创建IPv6封禁规则，IPv6地址将不会被封禁: {str(e)}")
+
+    def _setup_family(self, iptables: str, set_name: str, family: str):
+        self._run(['ipset', 'create', set_name, 'hash:ip', 'family', family,
+                   'timeout', str(self.default_timeout), '-exist'])
+        self._run([iptables, '-N', self.chain_name], check=False)
+        self._ensure_rule(iptables, [self.chain_name, '-m', 'set', '--match-set', set_name, 'src', '-j', 'DROP'])
+        self._ensure_rule(iptables, ['INPUT', '-j', self.chain_name])
+
+    def _set_for(self, ip: str) -> str:
+        """IP所属地址族的集合名，无效地址或不支持的地址族抛出ValueError"""
+        if ipaddress.ip_address(ip).version == 4:
+            return self.set_name
+        if not self.ipv6:
+            raise ValueError(f"IPv6封禁不可用: {ip}")
+        return self.set_name6
+
+    def add(self, entries: Sequence[Tuple[str, int]]):
+        self._restore([f"add {self._set_for(ip)} {ip} timeout {timeout}" for ip, timeout in entries])
+
+    def remove(self, ips: Sequence[str]):
+        # 条目可能已被内核按超时删除，-exist忽略不存在的条目
+        self._restore([f"del {self._set_for(ip)} {ip}" for ip in ips])
+
+    def _restore(self, lines: List[str]):
+        if lines:
+            self._run(['ipset', 'restore', '-exist'], input='\n'.join(lines) + '\n')
+
+    def _ensure_rule(self, iptables: str, rule: List[str]):
+        if self._run([iptables, '-C', *rule], check=False).returncode != 0:
+            self._run([iptables, '-A' if rule[0] == self.chain_name else '-I', *rule])
+
+    @staticmethod
+    def _run(command: List[str], input: str = None, check: bool = True):
+        return subprocess.run(command, input=input, capture_output=True, text=True, check=check)
+
+BACKENDS = {
+    'ipset': IPSetBackend,
+    'dry_run': DryRunBackend,
+}
 
 class IPTablesHandler:
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, config: Dict = None, backend=None):
+        """
+        初始化防火墙联动（去重的异步批量封禁，按到期时间最小堆解封）
+        Args:
+            config_path: 防火墙配置文件（YAML），覆盖config中的同名配置
+            config: 配置，例如 ids_config.yaml 的 firewall 部分
+                backend: ipset 或 dry_run
+                chain_name / set_name: iptables链名 / ipset集合名
+                block_duration: 默认封禁时长（秒）
+                batch_size / batch_interval: 每批最多提交的封禁数 / 最长等待时间（秒）
+            backend: 直接指定后端实例（测试时使用DryRunBackend）
+        """
         self.logger = logging.getLogger(__name__)
-        self.config = self._load_config(config_path)
-        self.chain_name = self.config.get('chain_name', 'IDS_CHAIN')
\ No newline at end of file
+        self.config = {**(config or {}), **self._load_config(config_path)}
+        self.chain_name = self.config.get('chain_name', 'IDS_CHAIN')
+        self.block_duration = int(self.config.get('block_duration', 3600))
+        self.batch_size = int(self.config.get('batch_size', 256))
+        self.batch_interval = float(self.config.get('batch_interval', 0.5))
+        if backend is None:
+            name = self.config.get('backend', 'ipset')
+            if name not in BACKENDS:
+                raise ValueError(f"不支持的防火墙后端: {name}")
+            backend = DryRunBackend() if name == 'dry_run' else IPSetBackend(
+                self.config.get('set_name', 'ids_banned'), self.chain_name, self.block_duration
+            )
+        self.backend = backend
+
+        self.cond = threading.Condition()
+        self.apply_lock = threading.Lock()  # 串行提交封禁/解封，保证解封总在对应的封禁之后提交
+        self.banned: Dict[str, float] = {}  # 已封禁（或等待提交）的IP -> 到期时间（monotonic）
+        self.pending = deque()  # (IP, 超时秒数, 入队时间)
+        self.expiry: List[Tuple[float, str]] = []  # (到期时间, IP) 最小堆
+        self.running = False
+        self.worker = None
+
+        # 监控指标
+        self.metric_latency = registry.histogram('firewall_ban_latency_seconds', '从请求封禁到提交防火墙的耗时')
+        self.metric_bans = registry.counter('firewall_bans_total', '提交的封禁数')
+        self.metric_duplicates = registry.counter('firewall_ban_duplicates_total', '已封禁IP的重复封禁请求数')
+        self.metric_unbans = registry.counter('firewall_unbans_total', '到期或手动解封数')
+        self.metric_errors = registry.counter('firewall_errors_total', '提交防火墙失败的批次数')
+        registry.gauge('firewall_pending_bans', '等待提交的封禁数', function=lambda: len(self.pending))
+        registry.gauge('firewall_banned_ips', '当前封禁的IP数', function=lambda: len(self.banned))
+
+    def _load_config(self, config_path: Optional[str]) -> Dict:
+        """加载防火墙配置文件"""
+        if not config_path:
+            return {}
+        path = Path(config_path)
+        if not path.exists():
+            self.logger.warning(f"防火墙配置文件不存在: {config_path}")
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+
+    def start(self):
+        """初始化后端并启动后台提交线程"""
+        self.backend.setup()
+        self.running = True
+        self.worker = threading.Thread(target=self._worker_loop, name='FirewallWorker', daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """停止后台线程并提交剩余的封禁（已生效的封禁由ipset超时自动解除）"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.worker:
+            self.worker.join()
+        self.flush()
+
+    def ban_ip(self, ip: str, reason: str = '', duration: int = None) -> bool:
+        """请求封禁IP（只入队，不阻塞调用方），已封禁的IP直接忽略，返回是否为新封禁"""
+        duration = int(duration or self.block_duration)
+        now = time.monotonic()
+        with self.cond:
+            if ip in self.banned:
+                self.metric_duplicates.inc()
+                return False
+            deadline = now + duration
+            self.banned[ip] = deadline
+            heapq.heappush(self.expiry, (deadline, ip))
+            self.pending.append((ip, duration, now))
+            if len(self.pending) >= self.batch_size or len(self.pending) == 1:
+                self.cond.notify()
+        self.logger.warning(f"封禁IP {ip}（{duration}秒）: {reason}")
+        return True
+
+    def unban_ip(self, ip: str) -> bool:
+        """手动解封IP"""
+        with self.cond:
+            if self.banned.pop(ip, None) is None:
+                return False
+            # 尚未提交的封禁直接取消，堆中的条目在到期时跳过
+            self.pending = deque(entry for entry in self.pending if entry[0] != ip)
+        # 后台线程可能已取出包含该IP的批次：提交时会跳过已不在banned中的IP，
+        # 已经提交的封禁在这里之前完成（apply_lock），随后被删除
+        self._apply_unbans([ip])
+        return True
+
+    def is_banned(self, ip: str) -> bool:
+        with self.cond:
+            return ip in self.banned
+
+    def flush(self):
+        """立即提交所有等待中的封禁"""
+        with self.cond:
+            batch = list(self.pending)
+            self.pending.clear()
+        self._apply_bans(batch)
+
+    def check_and_unban(self, now: float = None) -> List[str]:
+        """解封所有已到期的IP，返回解封的IP列表"""
+        now = time.monotonic() if now is None else now
+        with self.cond:
+            due = self._pop_due(now)
+        self._apply_unbans(due)
+        return due
+
+    def _pop_due(self, now: float) -> List[str]:
+        """弹出堆顶已到期的IP（调用方持有锁）"""
+        due = []
+        while self.expiry and self.expiry[0][0] <= now:
+            deadline, ip = heapq.heappop(self.expiry)
+            # 已手动解封或重新封禁的IP，堆中的旧条目直接跳过
+            if self.banned.get(ip) == deadline:
+                del self.banned[ip]
+                due.append(ip)
+        return due
+
+    def _worker_loop(self):
+        """按批提交封禁，并在最早的到期时间醒来解封，不轮询"""
+        while True:
+            with self.cond:
+                while self.running:
+                    now = time.monotonic()
+                    if len(self.pending) >= self.batch_size:
+                        break
+                    if self.pending and now - self.pending[0][2] >= self.batch_interval:
+                        break
+                    if self.expiry and self.expiry[0][0] <= now:
+                        break
+                    timeout = None
+                    if self.pending:
+                        timeout = self.pending[0][2] + self.batch_interval - now
+                    if self.expiry:
+                        wait = self.expiry[0][0] - now
+                        timeout = wait if timeout is None else min(timeout, wait)
+                    self.cond.wait(timeout)
+                if not self.running:
+                    return
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.batch_size))]
+                due = self._pop_due(time.monotonic())
+            self._apply_bans(batch)
+            self._apply_unbans(due)
+
+    def _apply_bans(self, batch: List[Tuple[str, int, float]]):
+        if not batch:
+            return
+        with self.apply_lock:
+            with self.cond:
+                # 取出批次后被手动解封的IP不再提交
+                batch = [entry for entry in batch if entry[0] in self.banned]
+            if not batch:
+                return
+            try:
+                self.backend.add([(ip, duration) for ip, duration, _ in batch])
+                applied = batch
+            except Exception as e:
+                self.metric_errors.inc()
+                self.logger.error(f"提交封禁失败（{len(batch)}个IP），逐个重试: {str(e)}")
+                applied = self._retry_bans(batch)
+        now = time.monotonic()
+        for _, _, queued in applied:
+            self.metric_latency.observe(now - queued)
+        self.metric_bans.inc(len(applied))
+
+    def _retry_bans(self, batch: List[Tuple[str, int, float]]) -> List[Tuple[str, int, float]]:
+        """批量提交失败后逐个提交（一个无效条目会使整批失败），返回成功的条目"""
+        applied = []
+        for entry in batch:
+            ip, duration, _ = entry
+            try:
+                self.backend.add([(ip, duration)])
+            except Exception as e:
+                self.logger.error(f"封禁IP {ip} 失败: {str(e)}")
+                # 未生效的封禁移出已封禁集合，之后的告警可以重新触发封禁
+                with self.cond:
+                    self.banned.pop(ip, None)
+                continue
+            applied.append(entry)
+        return applied
+
+    def _apply_unbans(self, ips: List[str]):
+        if not ips:
+            return
+        try:
+            with self.apply_lock:
+                self.backend.remove(ips)
+        except Exception as e:
+            self.metric_errors.inc()
+            self.logger.error(f"解封失败（{len(ips)}个IP）: {str(e)}")
+            return
+        self.metric_unbans.inc(len(ips))
+        self.logger.info(f"解封IP: {', '.join(ips)}")
@@ -0,0 +1,236 @@
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from ids.utils.metrics import registry
+
+# 统计的维度和度量：(维度, 度量)
+SUMMARIES = (
+    ('src_ip', 'packets'), ('src_ip', 'bytes'),
+    ('dst_ip', 'packets'), ('dst_ip', 'bytes'),
+    ('dst_port', 'packets'), ('dst_port', 'bytes'),
+    ('alert_src', 'alerts'),
+)
+# 滑动窗口：(名称, 窗格宽度（秒）, 窗格数)，每一级的窗格由上一级的窗格合并而成
+DEFAULT_WINDOWS = (('1m', 10, 6), ('5m', 60, 5), ('1h', 300, 12))
+
+
+class SpaceSaving:
+    """Space-Saving摘要：最多保留capacity个元素，计数为上界，error为高估量的上界"""
+    __slots__ = ('capacity', 'counts', 'errors', 'heap', 'floor')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        self.heap: List[Tuple[int, Hashable]] = []  # (计数, 元素)，计数可能落后于counts，淘汰时再修正
+        self.floor = 0  # 未保留元素计数的上界（合并摘要时的截断部分）
+
+    def add(self, item: Hashable, weight: int = 1):
+        counts = self.counts
+        count = counts.get(item)
+        if count is not None:
+            counts[item] = count + weight
+            return
+        heap = self.heap
+        if len(counts) < self.capacity:
+            counts[item] = weight
+            heapq.heappush(heap, (weight, item))
+            return
+        # 淘汰计数最小的元素，新元素继承它的计数作为误差
+        while True:
+            low, victim = heap[0]
+            current = counts[victim]
+            if current == low:
+                break
+            heapq.heapreplace(heap, (current, victim))
+        del counts[victim]
+        self.errors.pop(victim, None)
+        counts[item] = low + weight
+        self.errors[item] = low
+        heapq.heapreplace(heap, (low + weight, item))
+
+    def bound(self) -> int:
+        """未保留元素的计数上界"""
+        if len(self.counts) < self.capacity:
+            return self.floor
+        return max(self.floor, min(self.counts.values()))
+
+    def top(self, limit: int) -> List[Tuple[Hashable, int, int]]:
+        """计数最大的limit个元素 [(元素, 计数上界, 误差上界)]"""
+        errors = self.errors
+        ranked = heapq.nsmallest(limit, self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(item, count, errors.get(item, 0)) for item, count in ranked]
+
+    @classmethod
+    def merge(cls, parts: Sequence['SpaceSaving'], capacity: int) -> 'SpaceSaving':
+        """合并多个摘要（未出现在某个摘要中的元素按该摘要的上界计入计数和误差），保留计数最大的capacity个"""
+        bounds = [part.bound() for part in parts]
+        base = sum(bounds)
+        counts: Dict[Hashable, int] = {}
+        errors: Dict[Hashable, int] = {}
+        for part, bound in zip(parts, bounds):
+            part_errors = part.errors
+            for item, count in part.counts.items():
+                if item in counts:
+                    counts[item] += count - bound
+                    errors[item] += part_errors.get(item, 0) - bound
+                else:
+                    counts[item] = base + count - bound
+                    errors[item] = base + part_errors.get(item, 0) - bound
+
+        merged = cls(capacity)
+        merged.floor = base
+        if len(counts) > capacity:
+            ranked = sorted(counts.items(), key=lambda item: -item[1])
+            merged.floor = max(base, ranked[capacity][1])
+            counts = dict(ranked[:capacity])
+        merged.counts = counts
+        merged.errors = {item: errors[item] for item in counts if errors[item]}
+        merged.heap = [(count, item) for item, count in counts.items()]
+        heapq.heapify(merged.heap)
+        return merged
+
+
+class _Level:
+    """一级窗格：已结束的窗格 (起点, {(维度, 度量): 摘要}) 和已合并到本级的时间"""
+    __slots__ = ('name', 'width', 'count', 'panes', 'built_until')
+
+    def __init__(self, name: str, width: float, count: int, keep: int):
+        self.name = name
+        self.width = width
+        self.count = count
+        self.panes = deque(maxlen=keep)
+        self.built_until: Optional[float] = None
+
+
+class HeavyHitters:
+    def __init__(self, capacity: int = 256, windows: Sequence[Tuple[str, float, int]] = DEFAULT_WINDOWS):
+        """
+        初始化流量热点统计（按维度和度量的Space-Saving摘要，分级窗格实现多个滑动窗口，内存固定）
+
+        数据只写入最细一级的当前窗格；窗格结束后逐级合并为更粗的窗格，
+        查询时合并窗口内的已结束窗格（结果缓存到窗格变化为止）和未结束的部分，
+        因此窗口按窗格对齐，实际覆盖的时长在 窗格数*窗格宽度 到 (窗格数+1)*窗格宽度 之间。
+        Args:
+            capacity: 每个摘要保留的元素数
+            windows: [(窗口名称, 窗格宽度（秒）, 窗格数)]，从细到粗，每级窗格宽度是上一级的整数倍
+        """
+        self.capacity = capacity
+        self.levels: List[_Level] = []
+        for i, (name, width, count) in enumerate(windows):
+            width = float(width)
+            if i and (width % self.levels[-1].width or width < self.levels[-1].width):
+                raise ValueError(f"窗口 {name} 的窗格宽度必须是上一级窗格宽度的整数倍")
+            # 保留的已结束窗格：查询本级窗口需要count个，合并为下一级窗格需要一个下一级窗格宽度内的全部
+            keep = count
+            if i + 1 < len(windows):
+                keep = max(count, int(float(windows[i + 1][1]) // width))
+            self.levels.append(_Level(name, width, count, keep))
+        if not self.levels:
+            raise ValueError("至少需要一个窗口")
+        self.windows = {level.name: i for i, level in enumerate(self.levels)}
+        self.lock = threading.Lock()
+        self.current = None  # 最细一级的当前窗格 (起点, 摘要)
+        self.merged: Dict[Tuple[str, str, str], SpaceSaving] = {}  # 已结束窗格的合并结果缓存
+
+        # 监控指标
+        self.metric_updates = registry.counter('heavy_hitter_updates_total', '写入流量热点摘要的数据包/告警数')
+        self.metric_query = registry.histogram('heavy_hitter_query_seconds', '流量热点查询耗时',
+                                               buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01))
+
+    def _new_pane(self, start: float):
+        return start, {key: SpaceSaving(self.capacity) for key in SUMMARIES}
+
+    def add_packet(self, src_ip: str, dst_ip: str, dst_port: Optional[int], length: int, now: float = None):
+        now = time.time() if now is None else now
+        with self.lock:
+            summaries = self._advance(now)
+            summaries[('src_ip', 'packets')].add(src_ip)
+            summaries[('src_ip', 'bytes')].add(src_ip, length)
+            summaries[('dst_ip', 'packets')].add(dst_ip)
+            summaries[('dst_ip', 'bytes')].add(dst_ip, length)
+            if dst_port is not None:
+                summaries[('dst_port', 'packets')].add(dst_port)
+                summaries[('dst_port', 'bytes')].add(dst_port, length)
+        self.metric_updates.inc()
+
+    def add_alert(self, src_ip: str, count: int = 1, now: float = None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self._advance(now)[('alert_src', 'alerts')].add(src_ip, count)
+        self.metric_updates.inc()
+
+    def top(self, window: str, dimension: str, metric: str, limit: int = 10,
+            now: float = None) -> Dict[str, Any]:
+        """查询窗口内的热点，返回 {'top': [(元素, 计数上界, 误差上界)], 'bound': 未列出元素的计数上界}"""
+        if window not in self.windows:
+            raise ValueError(f"不支持的窗口: {window}")
+        if (dimension, metric) not in SUMMARIES:
+            raise ValueError(f"不支持的统计: {dimension}/{metric}")
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        key = (dimension, metric)
+        with self.lock:
+            self._advance(now)
+            closed = self.merged.get((window, dimension, metric))
+            if closed is None:
+                closed = self.merged[(window, dimension, metric)] = SpaceSaving.merge(
+                    [summaries[key] for _, summaries in self._closed_panes(self.windows[window])], self.capacity
+                )
+            summary = SpaceSaving.merge([closed, self.current[1][key]], self.capacity)
+        result = {'top': summary.top(min(limit, self.capacity)), 'bound': summary.bound()}
+        self.metric_query.observe(time.perf_counter() - start)
+        return result
+
+    def _advance(self, now: float):
+        """推进到now所在的最细一级窗格，结束的窗格逐级合并（调用方持有锁），返回当前窗格的摘要"""
+        first = self.levels[0]
+        start = now // first.width * first.width
+        if self.current is None:
+            self.current = self._new_pane(start)
+            for level in self.levels[1:]:
+                level.built_until = start // level.width * level.width
+        elif start > self.current[0]:
+            first.panes.append(self.current)
+            self.current = self._new_pane(start)
+            self.merged.clear()
+            self._cascade(start)
+        return self.current[1]
+
+    def _cascade(self, open_start: float):
+        """将上一级已结束的窗格合并为本级窗格（调用方持有锁）"""
+        for lower, level in zip(self.levels, self.levels[1:]):
+            width = level.width
+            while level.built_until + width <= open_start:
+                end = level.built_until + width
+                panes = [pane for pane in lower.panes if level.built_until <= pane[0] < end]
+                if panes:
+                    level.panes.append((level.built_until, {
+                        key: SpaceSaving.merge([summaries[key] for _, summaries in panes], self.capacity)
+                        for key in SUMMARIES
+                    }))
+                    level.built_until = end
+                else:
+                    # 没有流量的时间段直接跳到下一个有数据的窗格
+                    later = [pane[0] for pane in lower.panes if pane[0] >= end]
+                    level.built_until = max(end, (min(later) if later else open_start) // width * width)
+            open_start = level.built_until
+
+    def _closed_panes(self, index: int):
+        """第index级窗口内的已结束窗格，包括尚未合并到本级的下级窗格（调用方持有锁）"""
+        panes = []
+        open_start = self.current[0]
+        for i, level in enumerate(self.levels[:index + 1]):
+            # 下级窗格中尚未合并到本级的部分
+            if i < index:
+                since = self.levels[i + 1].built_until
+                panes.extend(pane for pane in level.panes if pane[0] >= since)
+            else:
+                cutoff = open_start - level.width * level.count
+                panes.extend(pane for pane in level.panes if pane[0] >= cutoff)
+            if i < index:
+                open_start = self.levels[i + 1].built_until
+        return panes
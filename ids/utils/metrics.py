@@ -0,0 +1,286 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 默认延迟分桶（秒）：10微秒 ~ 2.5秒
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """格式化Prometheus标签"""
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+class _ThreadLocalCells:
+    """每个线程一个累加单元，读取时合并，已退出线程的单元合并到基数中"""
+
+    def __init__(self, factory: Callable[[], list]):
+        self._factory = factory
+        self.local = threading.local()
+        self._cells: List[Tuple[weakref.ref, list]] = []
+        self._lock = threading.Lock()
+        self.base = factory()
+
+    def cell(self) -> list:
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = self._factory()
+            self.local.cell = cell
+            with self._lock:
+                self._cells.append((weakref.ref(threading.current_thread()), cell))
+            return cell
+
+    def merge(self) -> list:
+        """合并所有线程的累加值"""
+        with self._lock:
+            alive = []
+            for thread_ref, cell in self._cells:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    # 线程已退出：把它的值并入基数
+                    for i, value in enumerate(cell):
+                        self.base[i] += value
+                else:
+                    alive.append((thread_ref, cell))
+            self._cells = alive
+            total = list(self.base)
+            for _, cell in alive:
+                for i, value in enumerate(cell):
+                    total[i] += value
+        return total
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple = (), function: Callable = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.function = function
+        self._cells = _ThreadLocalCells(lambda: [0])
+        self._local = self._cells.local
+
+    def inc(self, amount=1):
+        """增加计数（线程本地累加，无锁）"""
+        try:
+            self._local.cell[0] += amount
+        except AttributeError:
+            self._cells.cell()[0] += amount
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self._cells.merge()[0]
+
+    def samples(self):
+        yield self.name, self.labels, self.get()
+
+
+class Gauge:
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Tuple = (), function: Callable = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.function = function
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+    def samples(self):
+        yield self.name, self.labels, self.get()
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        size = len(self.buckets) + 1
+        # 单元格式: [各分桶计数..., +Inf分桶计数, 总和]
+        self._cells = _ThreadLocalCells(lambda: [0] * size + [0.0])
+        self._local = self._cells.local
+
+    def observe(self, value: float):
+        """记录一个观测值"""
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._cells.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        """计时上下文管理器"""
+        return _Timer(self)
+
+    def snapshot(self) -> Dict:
+        merged = self._cells.merge()
+        counts = merged[:-1]
+        return {'buckets': counts, 'sum': merged[-1], 'count': sum(counts)}
+
+    def samples(self):
+        snapshot = self.snapshot()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), snapshot['buckets']):
+            cumulative += count
+            yield self.name + '_bucket', self.labels + (('le', _format_value(float(bound))),), cumulative
+        yield self.name + '_sum', self.labels, snapshot['sum']
+        yield self.name + '_count', self.labels, snapshot['count']
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullMetric:
+    """指标关闭时使用的空实现"""
+    type = None
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return _NULL_TIMER
+
+    def get(self):
+        return 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullMetric()
+NULL_METRIC = _NULL_TIMER
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True, prefix: str = 'ids_'):
+        """
+        指标注册表
+        Args:
+            enabled: 是否启用指标（关闭时返回空实现）
+            prefix: 指标名称前缀
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics: Dict[Tuple[str, Tuple], object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help: str, labels: Optional[Dict], **kwargs):
+        if not self.enabled:
+            return NULL_METRIC
+        full_name = self.prefix + name
+        label_items = tuple(sorted((labels or {}).items()))
+        key = (full_name, label_items)
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = cls(full_name, help, label_items, **kwargs)
+                self._metrics[key] = metric
+            elif kwargs.get('function') is not None:
+                # 组件重建时更新回调
+                metric.function = kwargs['function']
+            return metric
+
+    def counter(self, name: str, help: str = '', labels: Dict = None, function: Callable = None) -> Counter:
+        return self._get_or_create(Counter, name, help, labels, function=function)
+
+    def gauge(self, name: str, help: str = '', labels: Dict = None, function: Callable = None) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labels, function=function)
+
+    def histogram(self, name: str, help: str = '', labels: Dict = None, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def render_prometheus(self) -> str:
+        """以Prometheus文本格式导出所有指标"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: (m.name, m.labels))
+
+        lines = []
+        last_name = None
+        for metric in metrics:
+            if metric.name != last_name:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.type}")
+                last_name = metric.name
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            except Exception:
+                # 回调类指标在组件关闭后可能失效，跳过
+                continue
+        return '\n'.join(lines) + '\n'
+
+
+# 全局注册表，各组件在初始化时从这里获取指标
+registry = MetricsRegistry()
+
+
+def configure(enabled: bool = True):
+    """配置全局注册表（需在组件初始化之前调用）"""
+    registry.enabled = enabled
+    if not enabled:
+        registry.clear()
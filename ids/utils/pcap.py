@@ -0,0 +1,60 @@
+import struct
+from typing import Iterable, Iterator, Tuple
+
+# pcap文件格式（微秒精度，小端）
+PCAP_MAGIC = 0xa1b2c3d4
+LINKTYPE_ETHERNET = 1
+GLOBAL_HEADER = struct.Struct('<IHHiIII')
+RECORD_HEADER = struct.Struct('<IIII')
+
+
+def global_header(snaplen: int = 65535, linktype: int = LINKTYPE_ETHERNET) -> bytes:
+    """生成pcap文件头"""
+    return GLOBAL_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, snaplen, linktype)
+
+
+def record(timestamp: float, data: bytes) -> bytes:
+    """生成单个数据包记录（记录头 + 原始数据）"""
+    seconds = int(timestamp)
+    micros = int(round((timestamp - seconds) * 1_000_000))
+    if micros >= 1_000_000:
+        seconds, micros = seconds + 1, micros - 1_000_000
+    return RECORD_HEADER.pack(seconds, micros, len(data), len(data)) + data
+
+
+def write_pcap(path, frames: Iterable[Tuple[float, bytes]]) -> int:
+    """将(时间戳, 原始帧)写入pcap文件，返回写入的数据包数"""
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(global_header())
+        for timestamp, data in frames:
+            f.write(record(timestamp, data))
+            count += 1
+    return count
+
+
+def read_record(buffer, offset: int) -> Tuple[float, bytes, int]:
+    """读取offset处的单个记录，返回(时间戳, 原始帧, 下一条记录的偏移)"""
+    seconds, micros, caplen, _ = RECORD_HEADER.unpack_from(buffer, offset)
+    offset += RECORD_HEADER.size
+    if offset + caplen > len(buffer):
+        raise ValueError(f"pcap记录不完整: 偏移 {offset - RECORD_HEADER.size}")
+    return seconds + micros / 1_000_000, bytes(buffer[offset:offset + caplen]), offset + caplen
+
+
+def iter_records(buffer, offset: int = GLOBAL_HEADER.size) -> Iterator[Tuple[float, bytes]]:
+    """从pcap内容（bytes或mmap）中依次读取(时间戳, 原始帧)"""
+    end = len(buffer)
+    while offset + RECORD_HEADER.size <= end:
+        timestamp, data, offset = read_record(buffer, offset)
+        yield timestamp, data
+
+
+def read_pcap(path) -> Iterator[Tuple[float, bytes]]:
+    """读取pcap文件"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic = struct.unpack_from('<I', data)[0] if len(data) >= 4 else None
+    if magic != PCAP_MAGIC:
+        raise ValueError(f"不支持的pcap文件格式: {path}")
+    yield from iter_records(data)
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from queue import Queue, Empty, Full
+from typing import Callable, Dict, List, Optional, Any
+
+from ids.utils.metrics import registry
+
+
+class PipelineStage:
+    def __init__(self, name: str, handler: Callable, workers: int = 1,
+                 queue_size: int = 1000, block: bool = True):
+        """
+        初始化流水线阶段
+        Args:
+            name: 阶段名称
+            handler: 处理函数，返回值传递给下一阶段，返回None表示不再向后传递
+            workers: 工作线程数
+            queue_size: 输入队列容量
+            block: 队列已满时是否阻塞等待（False则直接丢弃）
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue = Queue(maxsize=queue_size)
+        self.block = block
+        self.next_stage: Optional['PipelineStage'] = None
+        self.logger = logging.getLogger(__name__)
+
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._stats_lock = threading.Lock()
+        self._last_sample = (time.monotonic(), 0)
+        self._throughput = 0.0
+
+        self._running = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        # 监控指标
+        labels = {'stage': name}
+        self.metric_latency = registry.histogram('pipeline_stage_seconds', '流水线阶段处理耗时', labels)
+        registry.gauge('pipeline_stage_backlog', '流水线阶段队列积压', labels,
+                       function=self.queue.qsize)
+        registry.counter('pipeline_stage_processed_total', '流水线阶段处理数', labels,
+                         function=lambda: self.processed)
+        registry.counter('pipeline_stage_dropped_total', '流水线阶段丢弃数', labels,
+                         function=lambda: self.dropped)
+        registry.counter('pipeline_stage_errors_total', '流水线阶段错误数', labels,
+                         function=lambda: self.errors)
+
+    def submit(self, item, timeout: float = None) -> bool:
+        """提交数据到本阶段队列，返回是否成功入队"""
+        try:
+            if self.block:
+                self.queue.put(item, timeout=timeout)
+            else:
+                self.queue.put(item, block=False)
+            return True
+        except Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+
+    def start(self):
+        """启动工作线程"""
+        self._running.set()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"Stage-{self.name}-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """等待队列处理完毕后停止工作线程"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self._running.clear()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def _worker(self):
+        """工作线程：从队列取数据并处理"""
+        while self._running.is_set():
+            try:
+                item = self.queue.get(timeout=0.5)
+            except Empty:
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                result = None
+                with self._stats_lock:
+                    self.errors += 1
+                self.logger.error(f"阶段 {self.name} 处理失败: {str(e)}")
+            elapsed = time.perf_counter() - start
+            self.metric_latency.observe(elapsed)
+
+            with self._stats_lock:
+                self.processed += 1
+                self.busy_time += elapsed
+
+            # 传递给下一阶段（下游队列满时阻塞，形成背压）
+            if result is not None and self.next_stage is not None:
+                self.next_stage.submit(result)
+            self.queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取阶段统计信息（吞吐量与积压）"""
+        now = time.monotonic()
+        with self._stats_lock:
+            last_time, last_processed = self._last_sample
+            if now - last_time >= 1.0:
+                self._throughput = (self.processed - last_processed) / (now - last_time)
+                self._last_sample = (now, self.processed)
+            return {
+                'name': self.name,
+                'workers': self.workers,
+                'backlog': self.queue.qsize(),
+                'capacity': self.queue.maxsize,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'throughput': round(self._throughput, 2),
+                'avg_latency_ms': round(
+                    self.busy_time / self.processed * 1000, 3
+                ) if self.processed else 0.0
+            }
+
+
+class DetectionPipeline:
+    def __init__(self, config: Dict = None):
+        """
+        初始化检测流水线
+        Args:
+            config: 流水线配置，包含默认队列容量和各阶段的工作线程数
+        """
+        self.config = config or {}
+        self.stages: List[PipelineStage] = []
+        self.logger = logging.getLogger(__name__)
+
+    def add_stage(self, name: str, handler: Callable) -> PipelineStage:
+        """按顺序添加阶段，工作线程数和队列容量从配置中读取"""
+        stage_config = self.config.get('stages', {}).get(name) or {}
+        stage = PipelineStage(
+            name,
+            handler,
+            workers=stage_config.get('workers', 1),
+            queue_size=stage_config.get('queue_size', self.config.get('queue_size', 1000)),
+            # 入口阶段不阻塞调用方（抓包线程），队列满时直接丢弃
+            block=bool(self.stages)
+        )
+        if self.stages:
+            self.stages[-1].next_stage = stage
+        self.stages.append(stage)
+        return stage
+
+    def submit(self, item) -> bool:
+        """将数据提交到第一个阶段"""
+        return self.stages[0].submit(item)
+
+    def start(self):
+        """启动所有阶段"""
+        for stage in self.stages:
+            stage.start()
+        self.logger.info(
+            "检测流水线已启动: " +
+            " -> ".join(f"{s.name}({s.workers})" for s in self.stages)
+        )
+
+    def stop(self, timeout: float = 5.0):
+        """按顺序停止各阶段，保证上游数据被下游处理完"""
+        for stage in self.stages:
+            stage.stop(timeout)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """获取所有阶段的统计信息"""
+        return [stage.get_stats() for stage in self.stages]
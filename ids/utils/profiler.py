@@ -0,0 +1,114 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from ids.utils.metrics import registry
+
+
+class ProfilerBusy(RuntimeError):
+    """已有一次采样正在进行"""
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, max_duration: float = 60.0, min_interval: float = 0.001, max_depth: int = 128):
+        """
+        初始化采样分析器（按固定间隔读取各线程的调用栈，只在调用profile()期间运行，平时没有开销）
+        Args:
+            max_duration: 单次采样的最长时间（秒）
+            min_interval: 最小采样间隔（秒）
+            max_depth: 每个调用栈最多记录的帧数（从最内层开始）
+        """
+        self.max_duration = max_duration
+        self.min_interval = min_interval
+        self.max_depth = max_depth
+        self.lock = threading.Lock()
+
+        # 监控指标
+        self.metric_runs = registry.counter('profiler_runs_total', '采样分析次数')
+
+    def profile(self, duration: float, interval: float = 0.005, threads: Optional[Sequence[str]] = ('Stage-',),
+                memory: bool = False, memory_limit: int = 20) -> Dict:
+        """
+        在当前线程中采样duration秒，返回 {'samples': 采样次数, 'stacks': Counter(折叠的调用栈 -> 次数)}
+        Args:
+            threads: 线程名前缀，只采样匹配的线程（None表示除当前线程外的所有线程）
+            memory: 同时用tracemalloc记录采样期间的内存分配，结果中增加 'allocations'
+            memory_limit: 返回的内存分配位置数
+        """
+        duration = min(max(duration, 0.0), self.max_duration)
+        interval = max(interval, self.min_interval)
+        if not self.lock.acquire(blocking=False):
+            raise ProfilerBusy("已有一次采样正在进行")
+        try:
+            self.metric_runs.inc()
+            started_tracing = memory and not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            try:
+                samples, stacks = self._sample(duration, interval, threads)
+                result = {'samples': samples, 'stacks': stacks}
+                if memory:
+                    result['allocations'] = self._allocations(memory_limit)
+            finally:
+                if started_tracing:
+                    tracemalloc.stop()
+            return result
+        finally:
+            self.lock.release()
+
+    def _sample(self, duration: float, interval: float, threads: Optional[Sequence[str]]):
+        own = threading.get_ident()
+        prefixes = tuple(threads) if threads else None
+        stacks = Counter()
+        labels: Dict[object, str] = {}  # 代码对象 -> 帧标签
+        samples = 0
+        deadline = time.monotonic() + duration
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == own or (prefixes and not name.startswith(prefixes)):
+                    continue
+                frames = []
+                while frame is not None and len(frames) < self.max_depth:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    frames.append(label)
+                    frame = frame.f_back
+                frames.append(name)
+                stacks[';'.join(reversed(frames))] += 1
+            samples += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return samples, stacks
+            time.sleep(min(interval, remaining))
+
+    @staticmethod
+    def _allocations(limit: int) -> List[Dict]:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        return [
+            {
+                'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                'size': stat.size,
+                'count': stat.count,
+            }
+            for stat in snapshot.statistics('lineno')[:limit]
+        ]
+
+
+def collapsed(stacks: Counter) -> str:
+    """折叠格式（flamegraph.pl / speedscope）：每行 "外层;...;内层 次数"""
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
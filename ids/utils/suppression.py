@@ -0,0 +1,124 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+from ids.utils.metrics import registry
+
+class Incident:
+    """同一(规则, 键)的一组重复告警"""
+    __slots__ = ('key', 'alert', 'count', 'pending', 'first_seen', 'last_seen', 'emitted_at', 'reported_at')
+
+    def __init__(self, key: Hashable, alert: Any, now: float):
+        self.key = key
+        self.alert = alert            # 最近一次告警
+        self.count = 0                # 事件总数
+        self.pending = 0              # 上次上报后被抑制的告警数
+        self.first_seen = now
+        self.last_seen = now
+        self.emitted_at = None        # 最近一次单独发出告警的时间
+        self.reported_at = now        # 最近一次上报（发出或聚合刷新）的时间
+
+class AlertSuppressor:
+    def __init__(self, cooldown: float = 60, flush_interval: float = 30,
+                 rate_limit: Optional[float] = None, burst: Optional[int] = None, name: str = 'alerts'):
+        """
+        初始化告警抑制器（冷却期、事件聚合与全局限速）
+        Args:
+            cooldown: 同一(规则, 键)发出告警后的冷却时间（秒），冷却期内的告警只累加到事件中
+            flush_interval: 聚合事件的刷新间隔（秒），flush()返回期间有被抑制告警的事件
+            rate_limit: 全局每秒最多发出的告警数（None表示不限速）
+            burst: 限速的突发容量（默认等于rate_limit）
+            name: 指标标签中的来源名称
+        """
+        self.cooldown = cooldown
+        self.flush_interval = flush_interval
+        self.rate_limit = rate_limit
+        self.burst = burst if burst is not None else max(1, int(rate_limit or 1))
+        self.lock = threading.Lock()
+        self.incidents: Dict[Hashable, Incident] = {}
+        self.tokens = float(self.burst)
+        self.last_refill = None
+        self.last_flush = None
+
+        # 监控指标
+        labels = {'source': name}
+        self.metric_emitted = registry.counter('alerts_emitted_total', '发出的告警数', labels)
+        self.metric_suppressed = {
+            reason: registry.counter('alerts_suppressed_total', '被抑制（聚合）的告警数',
+                                     {**labels, 'reason': reason})
+            for reason in ('cooldown', 'rate_limit')
+        }
+        registry.gauge('alert_incidents', '未关闭的聚合事件数', labels,
+                       function=lambda: len(self.incidents))
+
+    def allow(self, key: Hashable, alert: Any = None, now: float = None) -> bool:
+        """记录一次告警，返回是否应立即发出（否则已聚合到事件中，由flush()上报）"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            incident = self.incidents.get(key)
+            if incident is None:
+                incident = self.incidents[key] = Incident(key, alert, now)
+            incident.alert = alert
+            incident.count += 1
+            incident.last_seen = now
+
+            if incident.emitted_at is not None and now - incident.emitted_at < self.cooldown:
+                reason = 'cooldown'
+            elif not self._take_token(now):
+                reason = 'rate_limit'
+            else:
+                incident.emitted_at = now
+                incident.reported_at = now
+                incident.pending = 0
+                self.metric_emitted.inc()
+                return True
+            incident.pending += 1
+        self.metric_suppressed[reason].inc()
+        return False
+
+    def due(self, now: float = None) -> bool:
+        """是否到了刷新聚合事件的时间"""
+        now = time.monotonic() if now is None else now
+        if self.last_flush is None:
+            self.last_flush = now
+        return now - self.last_flush >= self.flush_interval
+
+    def flush(self, now: float = None, force: bool = False) -> List[Incident]:
+        """返回需要上报的聚合事件（上次上报后有被抑制的告警），并关闭空闲超过冷却期的事件
+
+        force为True时上报所有有被抑制告警的事件（用于关闭时）。
+        """
+        now = time.monotonic() if now is None else now
+        reports = []
+        with self.lock:
+            self.last_flush = now
+            for key, incident in list(self.incidents.items()):
+                if incident.pending and (force or now - incident.reported_at >= self.flush_interval):
+                    reports.append(self._snapshot(incident))
+                    incident.pending = 0
+                    incident.reported_at = now
+                if not incident.pending and now - incident.last_seen >= max(self.cooldown, self.flush_interval):
+                    del self.incidents[key]
+        return reports
+
+    def _take_token(self, now: float) -> bool:
+        """全局令牌桶（调用方持有锁）"""
+        if self.rate_limit is None:
+            return True
+        if self.last_refill is not None:
+            self.tokens = min(self.burst, self.tokens + max(0.0, now - self.last_refill) * self.rate_limit)
+        self.last_refill = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    @staticmethod
+    def _snapshot(incident: Incident) -> Incident:
+        copy = Incident(incident.key, incident.alert, incident.first_seen)
+        copy.count = incident.count
+        copy.pending = incident.pending
+        copy.last_seen = incident.last_seen
+        copy.emitted_at = incident.emitted_at
+        copy.reported_at = incident.reported_at
+        return copy
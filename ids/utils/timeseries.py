@@ -0,0 +1,130 @@
+import threading
+import time
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+from ids.utils.metrics import registry
+
+PROTOCOLS = ('TCP', 'UDP', 'OTHER')  # 与decoder输出的协议一致
+ALERT_TYPES = ('rule', 'ml')
+# 每个时间槽的计数列
+COLUMNS = (
+    ('packets', 'bytes')
+    + tuple(f"{protocol.lower()}_{unit}" for protocol in PROTOCOLS for unit in ('packets', 'bytes'))
+    + tuple(f"{kind}_alerts" for kind in ALERT_TYPES)
+)
+_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+_PROTOCOL_INDEX = {protocol: (_INDEX[f"{protocol.lower()}_packets"], _INDEX[f"{protocol.lower()}_bytes"])
+                   for protocol in PROTOCOLS}
+# 分辨率：(名称, 时间槽宽度（秒）, 时间槽数)
+DEFAULT_RESOLUTIONS = (('1s', 1, 3600), ('1m', 60, 1440), ('1h', 3600, 720))
+
+
+class _Ring:
+    """一种分辨率的环形数组：第period个时间槽存放在 period % slots 行"""
+    __slots__ = ('name', 'step', 'slots', 'counts', 'periods')
+
+    def __init__(self, name: str, step: int, slots: int):
+        self.name = name
+        self.step = step
+        self.slots = slots
+        self.counts = np.zeros((slots, len(COLUMNS)), dtype=np.int64)
+        self.periods = np.full(slots, -1, dtype=np.int64)  # 每行当前存放的时间槽，-1表示空
+
+    def add(self, period: int, values: np.ndarray):
+        row = period % self.slots
+        if self.periods[row] != period:
+            # 行中是一圈之前的旧数据
+            self.periods[row] = period
+            self.counts[row] = values
+        else:
+            self.counts[row] += values
+
+    def read(self, first: int, last: int) -> np.ndarray:
+        periods = np.arange(first, last + 1, dtype=np.int64)
+        rows = periods % self.slots
+        return np.where((self.periods[rows] == periods)[:, None], self.counts[rows], 0)
+
+
+class TrafficSeries:
+    def __init__(self, resolutions: Sequence[Tuple[str, int, int]] = DEFAULT_RESOLUTIONS):
+        """
+        初始化流量时间序列（按秒累加，每秒结束时写入各分辨率的NumPy环形数组，内存固定）
+
+        热路径只在锁内累加当前秒的Python列表；秒切换时每种分辨率做一次向量加法，
+        分钟、小时序列由秒级数据直接累加得到。
+        Args:
+            resolutions: [(名称, 时间槽宽度（秒）, 时间槽数)]
+        """
+        if not resolutions:
+            raise ValueError("至少需要一种分辨率")
+        self.rings = {name: _Ring(name, int(step), int(slots)) for name, step, slots in resolutions}
+        self.lock = threading.Lock()
+        self.second = None  # 当前秒
+        self.pending = [0] * len(COLUMNS)  # 当前秒的计数
+
+        # 监控指标
+        registry.gauge('traffic_series_bytes', '流量时间序列占用的内存（字节）', function=lambda: self.nbytes)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(ring.counts.nbytes + ring.periods.nbytes for ring in self.rings.values())
+
+    def add_packet(self, protocol: str, length: int, now: float = None):
+        now = time.time() if now is None else now
+        packets_column, bytes_column = _PROTOCOL_INDEX.get(protocol, _PROTOCOL_INDEX['OTHER'])
+        second = int(now)
+        with self.lock:
+            if second != self.second:
+                self._roll(second)
+            pending = self.pending
+            pending[0] += 1
+            pending[1] += length
+            pending[packets_column] += 1
+            pending[bytes_column] += length
+
+    def add_alerts(self, kind: str, count: int = 1, now: float = None):
+        now = time.time() if now is None else now
+        column = _INDEX[f"{kind}_alerts"]
+        second = int(now)
+        with self.lock:
+            if second != self.second:
+                self._roll(second)
+            self.pending[column] += count
+
+    def query(self, resolution: str, start: float, end: float = None) -> Dict:
+        """查询 [start, end] 内的时间序列（包含尚未结束的当前秒），超出保留范围的部分截断"""
+        ring = self.rings.get(resolution)
+        if ring is None:
+            raise ValueError(f"不支持的分辨率: {resolution}")
+        end = time.time() if end is None else end
+        last = int(end) // ring.step
+        first = max(int(start) // ring.step, last - ring.slots + 1)
+        with self.lock:
+            counts = ring.read(first, last)
+            if self.second is not None and first <= self.second // ring.step <= last:
+                counts[self.second // ring.step - first] += np.array(self.pending, dtype=np.int64)
+
+        columns = {name: counts[:, i].tolist() for i, name in enumerate(COLUMNS)}
+        return {
+            'resolution': resolution,
+            'step': ring.step,
+            'timestamps': [period * ring.step for period in range(first, last + 1)],
+            'packets': columns['packets'],
+            'bytes': columns['bytes'],
+            'protocols': {
+                protocol: {unit: columns[f"{protocol.lower()}_{unit}"] for unit in ('packets', 'bytes')}
+                for protocol in PROTOCOLS
+            },
+            'alerts': {kind: columns[f"{kind}_alerts"] for kind in ALERT_TYPES},
+        }
+
+    def _roll(self, second: int):
+        """将当前秒的计数写入各分辨率（调用方持有锁）"""
+        if self.second is not None and any(self.pending):
+            values = np.array(self.pending, dtype=np.int64)
+            for ring in self.rings.values():
+                ring.add(self.second // ring.step, values)
+        self.second = second
+        self.pending = [0] * len(COLUMNS)
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ids.utils.metrics import registry
+
+
+def _json_default(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class AlertStream:
+    def __init__(self, capacity: int = 1024, keepalive: float = 15.0):
+        """
+        初始化实时告警流（内存环形缓冲区，按递增序号推送给SSE订阅者）
+
+        告警在发布时只序列化一次；订阅者共享同一个条件变量，等待新序号后从环中读取，
+        不为每个订阅者建立队列，也不查询数据库。
+        Args:
+            capacity: 环形缓冲区容量（可续传的最近告警数）
+            keepalive: 没有告警时发送保活注释的间隔（秒）
+        """
+        self.capacity = max(1, int(capacity))
+        self.keepalive = keepalive
+        self.ring: List[Optional[Tuple[int, str, str, str]]] = [None] * self.capacity  # (序号, 严重程度, 规则, JSON)
+        self.last_id = 0  # 最近发布的告警序号
+        self.cond = threading.Condition()
+        self.closed = False
+        self.subscribers = 0
+
+        # 监控指标
+        self.metric_published = registry.counter('alert_stream_published_total', '发布到实时告警流的告警数')
+        self.metric_missed = registry.counter('alert_stream_missed_total', '订阅者续传时已被环形缓冲区覆盖的告警数')
+        registry.gauge('alert_stream_subscribers', '实时告警流的订阅者数', function=lambda: self.subscribers)
+
+    def publish(self, alerts: Iterable[Dict]) -> int:
+        """发布一批告警，返回最后一条的序号"""
+        entries = [
+            (_json_default(alert.get('severity')) if alert.get('severity') is not None else None,
+             alert.get('rule_name'),
+             json.dumps(alert, ensure_ascii=False, default=_json_default))
+            for alert in alerts
+        ]
+        if not entries:
+            return self.last_id
+        with self.cond:
+            for severity, rule_name, data in entries:
+                self.last_id += 1
+                self.ring[self.last_id % self.capacity] = (self.last_id, severity, rule_name, data)
+            self.cond.notify_all()
+            last_id = self.last_id
+        self.metric_published.inc(len(entries))
+        return last_id
+
+    def read(self, after: int, severities: Set[str] = None, rules: Set[str] = None,
+             limit: int = None) -> Tuple[List[Tuple[int, str]], int, int]:
+        """读取序号大于after的告警，返回 ([(序号, JSON)], 已读到的序号, 已被覆盖而错过的告警数)
+
+        被过滤掉的告警同样推进已读序号；after大于最新序号（例如服务重启后续传）时从最新位置开始。
+        """
+        with self.cond:
+            last_id = self.last_id
+            if after >= last_id:
+                return [], last_id, 0
+            oldest = max(1, last_id - self.capacity + 1)
+            missed = max(0, oldest - after - 1)
+            end = last_id if limit is None else min(last_id, max(after, oldest - 1) + limit)
+            entries = [self.ring[i % self.capacity] for i in range(max(after + 1, oldest), end + 1)]
+        if missed:
+            self.metric_missed.inc(missed)
+        events = [
+            (event_id, data) for event_id, severity, rule_name, data in entries
+            if (not severities or severity in severities) and (not rules or rule_name in rules)
+        ]
+        return events, end, missed
+
+    def wait(self, after: int, timeout: float = None) -> bool:
+        """等待序号大于after的告警发布，返回是否有新告警（超时或关闭时返回False）"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.last_id > after or self.closed, timeout) and not self.closed
+
+    def subscribe(self, last_id: int = None, severities: Set[str] = None, rules: Set[str] = None,
+                  batch: int = 256) -> Iterator[str]:
+        """生成SSE格式的文本块，last_id为None时只推送订阅之后的告警"""
+        with self.cond:
+            position = self.last_id if last_id is None else last_id
+            self.subscribers += 1
+        try:
+            yield 'retry: 3000\n\n'
+            last_sent = time.monotonic()
+            while not self.closed:
+                events, position, missed = self.read(position, severities, rules, limit=batch)
+                chunks = []
+                if missed:
+                    chunks.append(f"event: gap\ndata: {json.dumps({'missed': missed})}\n\n")
+                chunks.extend(f"id: {event_id}\nevent: alert\ndata: {data}\n\n" for event_id, data in events)
+                if chunks:
+                    last_sent = time.monotonic()
+                    yield ''.join(chunks)
+                    continue
+                if position < self.last_id:
+                    # 本批告警都被过滤，继续读取剩余部分
+                    continue
+                remaining = self.keepalive - (time.monotonic() - last_sent)
+                if remaining <= 0 or not self.wait(position, remaining):
+                    if time.monotonic() - last_sent >= self.keepalive:
+                        last_sent = time.monotonic()
+                        yield ': keepalive\n\n'
+        finally:
+            with self.cond:
+                self.subscribers -= 1
+
+    def close(self):
+        """结束所有订阅"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
@@ -1,72 +1,229 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
+from datetime import datetime, timedelta
+import base64
+import functools
+import hmac
 import logging
+import os
+import time
 from typing import Dict
 
 from ids.models.packet_features import PacketFeatures
 from ids.detectors.rule_engine import Rule
+from ids.models.database import AlertSeverity
+from ids.models.packet_store import flow_key
+from ids.utils.metrics import registry
+from ids.utils.profiler import ProfilerBusy, SamplingProfiler, collapsed
+from ids.web.cache import ResponseCache
+
+# 管理接口令牌从环境变量读取，不放在配置中（/api/config 会返回配置）
+ADMIN_TOKEN_ENV = 'IDS_ADMIN_TOKEN'
+# /api/config 返回时隐藏的敏感配置项
+SECRET_SUFFIXES = ('token', 'password', 'secret')
+SECRET_KEYS = ('headers',)
+
+# /api/alerts 支持的过滤参数和每页最大条数
+ALERT_FILTERS = ('severity', 'rule_name', 'src_ip', 'dst_ip')
+MAX_PAGE_SIZE = 500
 
 class IDSAPI:
     def __init__(self, ids_instance):
         self.app = Flask(__name__)
         self.ids = ids_instance
+        self.db = ids_instance.db_manager
         self.logger = logging.getLogger(__name__)
+        # 只读统计接口的响应缓存（按端点TTL，规则变化时失效）
+        web_config = getattr(ids_instance, 'config', {}).get('web_api', {})
+        cache_config = web_config.get('cache', {})
+        self.cache = None
+        if cache_config.get('enabled', True):
+            self.cache = ResponseCache(
+                cache_config.get('ttls'),
+                default_ttl=cache_config.get('default_ttl', 5),
+                max_entries=cache_config.get('max_entries', 1024)
+            )
+        # 管理接口（采样分析）使用的令牌，未设置环境变量时禁用
+        self.admin_token = os.environ.get(ADMIN_TOKEN_ENV) or None
+        self.profiler = SamplingProfiler(max_duration=web_config.get('profile_max_duration', 60))
+        self.setup_routes()
+        # 请求结束后释放当前线程的数据库会话
+        self.app.teardown_appcontext(self.remove_session)
         
     def setup_routes(self):
+        app = self.app
+        
         # 告警相关
         app.route('/api/alerts')(self.get_alerts)
-        app.route('/api/alerts/stats')(self.get_alert_stats)
+        app.route('/api/alerts/stats')(self._cached('alert_stats', self.get_alert_stats))
+        app.route('/api/alerts/stream')(self.stream_alerts)
         
         # 规则相关
-        app.route('/api/rules', methods=['GET'])(self.get_rules)
+        app.route('/api/rules', methods=['GET'])(self._cached('rules', self.get_rules))
         app.route('/api/rules', methods=['POST'])(self.add_rule)
         app.route('/api/rules/<int:rule_id>', methods=['PUT'])(self.update_rule)
-        app.route('/api/rules/<int:rule_id>', methods=['DELETE'])(self.delete_rule)
+        app.route('/api/rules/<rule_name>', methods=['DELETE'])(self.delete_rule)
         
         # 配置相关
         app.route('/api/config', methods=['GET'])(self.get_config)
         app.route('/api/config', methods=['POST'])(self.update_config)
         
         # 统计相关
-        app.route('/api/stats/traffic')(self.get_traffic_stats)
-        app.route('/api/stats/top-ips')(self.get_top_ips)
+        app.route('/api/stats/traffic')(self._cached('traffic_stats', self.get_traffic_stats))
+        app.route('/api/stats/top-ips')(self._cached('top_ips', self.get_top_ips))
+        app.route('/api/stats/pipeline')(self.get_pipeline_stats)
+        app.route('/api/stats/alert-sinks')(self.get_alert_sink_stats)
+        
+        # 原始数据包导出
+        app.route('/api/flows/pcap')(self.export_flow_pcap)
+        
+        # 监控指标
+        app.route('/api/metrics')(self.get_metrics)
         
+        # 管理接口
+        app.route('/api/admin/profile', methods=['POST'])(self.profile)
+        
+    def _cached(self, name, view):
+        """为只读接口加上响应缓存：按规范化的查询参数缓存，支持ETag/304"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.cache is None:
+                return view(*args, **kwargs)
+            params = (tuple(sorted(kwargs.items())),
+                      tuple(sorted((key, tuple(sorted(values))) for key, values in request.args.lists())))
+            
+            def compute():
+                response = self.app.make_response(view(*args, **kwargs))
+                return response.get_data(), response.status_code, response.mimetype
+                
+            entry = self.cache.get(name, params, compute)
+            if entry.status == 200 and request.if_none_match.contains(entry.etag):
+                response = Response(status=304)
+            else:
+                response = Response(entry.body, status=entry.status, mimetype=entry.mimetype)
+            if entry.status == 200:
+                response.set_etag(entry.etag)
+                # 浏览器每次都向服务端确认，规则变化后不会使用过期的本地副本
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+        
+    def invalidate_cache(self, name=None):
+        """使缓存的响应失效（None表示全部）"""
+        if self.cache is not None:
+            self.cache.invalidate(name)
+            
+    def remove_session(self, exception=None):
+        if self.db is not None:
+            self.db.session.remove()
+            
     def get_alerts(self):
-        """获取告警列表"""
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        query = self.db.session.query(Alert)
-        total = query.count()
-        alerts = query.order_by(Alert.timestamp.desc())\
-                     .offset((page-1)*per_page)\
-                     .limit(per_page)\
-                     .all()
-                     
+        """获取告警列表（游标分页，可按时间范围、严重程度、规则、源/目的IP过滤）"""
+        per_page = max(1, min(request.args.get('per_page', 20, type=int), MAX_PAGE_SIZE))
+        filters = {name: request.args[name] for name in ALERT_FILTERS if request.args.get(name)}
+        try:
+            start = self._parse_time('start')
+            end = self._parse_time('end')
+            cursor = self._decode_cursor(request.args.get('cursor'))
+            if 'severity' in filters:
+                AlertSeverity(filters['severity'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        alerts = self.db.query_alerts(start, end, limit=per_page, cursor=cursor, filters=filters)
+        next_cursor = None
+        if len(alerts) == per_page:
+            next_cursor = self._encode_cursor(alerts[-1]['timestamp'], alerts[-1]['id'])
+        total, estimated = self.db.count_alerts(start, end, filters)
         return jsonify({
             'total': total,
-            'alerts': [alert.to_dict() for alert in alerts]
+            'total_estimated': estimated,
+            'next_cursor': next_cursor,
+            'alerts': [self._alert_to_dict(alert) for alert in alerts]
         })
         
-    def get_alert_stats(self):
-        """获取告警统计信息"""
-        # 最近24小时的告警统计
-        start_time = datetime.utcnow() - timedelta(hours=24)
-        stats = self.db.session.query(
-            Alert.severity,
-            func.count(Alert.id)
-        ).filter(
-            Alert.timestamp >= start_time
-        ).group_by(
-            Alert.severity
-        ).all()
+    def stream_alerts(self):
+        """以SSE推送实时告警（可按严重程度、规则过滤，按Last-Event-ID或last_id续传）"""
+        stream = getattr(self.ids, 'alert_stream', None)
+        if stream is None:
+            return jsonify({'error': 'alert stream is disabled'}), 404
+        severities = {value for value in request.args.get('severity', '').split(',') if value}
+        rules = {value for value in request.args.get('rule_name', '').split(',') if value}
+        last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+        try:
+            for severity in severities:
+                AlertSeverity(severity)
+            last_id = int(last_id) if last_id else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        return Response(
+            stream_with_context(stream.subscribe(last_id, severities, rules)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
         
+    @staticmethod
+    def _encode_cursor(timestamp, alert_id):
+        """将 (timestamp, id) 编码为不透明的游标"""
+        return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{alert_id}".encode()).decode()
+        
+    @staticmethod
+    def _decode_cursor(cursor):
+        if not cursor:
+            return None
+        try:
+            timestamp, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(timestamp), int(alert_id)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError(f"invalid cursor: {cursor}")
+            
+    def get_alert_stats(self):
+        """获取告警统计信息（从汇总表读取）"""
+        group_by = request.args.get('group_by', 'severity')
+        if group_by not in ('severity', 'rule_name', 'src_ip'):
+            return jsonify({'error': f'invalid group_by: {group_by}'}), 400
+        try:
+            # 默认统计最近24小时
+            start_time = datetime.utcnow() - self._parse_interval(request.args.get('interval', '24h'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         return jsonify({
-            'stats': dict(stats)
+            'stats': self.db.alert_counts(group_by, start_time)
         })
         
+    @staticmethod
+    def _parse_time(name):
+        """解析ISO格式的时间参数"""
+        value = request.args.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"invalid {name}: {value}")
+            
+    @staticmethod
+    def _parse_interval(value):
+        """解析时间间隔，例如 15m、1h、7d"""
+        units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+        try:
+            return timedelta(**{units[value[-1]]: float(value[:-1])})
+        except (KeyError, ValueError, IndexError):
+            raise ValueError(f"invalid interval: {value}")
+            
+    @staticmethod
+    def _alert_to_dict(alert):
+        return {
+            **alert,
+            'timestamp': alert['timestamp'].isoformat() if alert['timestamp'] else None,
+            'severity': alert['severity'].value if alert['severity'] else None
+        }
+        
     def get_rules(self):
-        """获取所有规则"""
-        rules = self.db.session.query(Rule).all()
+        """获取所有规则（规则引擎中当前生效的规则）"""
+        engine = self.ids.rule_engine
+        with engine.rules_lock:
+            rules = list(engine.rules.values())
         return jsonify([rule.to_dict() for rule in rules])
         
     def add_rule(self):
@@ -78,6 +235,7 @@ class IDSAPI:
         
         # 更新IDS规则
         self.ids.rule_engine.add_rule(rule)
+        self.invalidate_cache('rules')
         return jsonify(rule.to_dict())
         
     def update_rule(self, rule_id):
@@ -91,13 +249,179 @@ class IDSAPI:
             setattr(rule, key, value)
             
         self.db.session.commit()
+        self.invalidate_cache('rules')
         return jsonify(rule.to_dict())
         
     def get_traffic_stats(self):
-        """获取流量统计"""
+        """获取流量统计（按协议和目的端口，从汇总表读取）
+        
+        指定resolution（默认1s、1m、1h）时返回内存中的流量时间序列，不查询数据库。
+        """
+        if 'resolution' in request.args:
+            return self._traffic_series(request.args['resolution'])
+        try:
+            start_time = datetime.utcnow() - self._parse_interval(request.args.get('interval', '1h'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        limit = request.args.get('limit', 10, type=int)
+        
+        protocols = self.db.traffic_counts(('protocol',), start_time)
+        ports = self.db.traffic_counts(('protocol', 'dst_port'), start_time)
+        top_ports = sorted(ports.items(), key=lambda item: -item[1]['packets'])[:limit]
+        return jsonify({
+            'total': {
+                'packets': sum(value['packets'] for value in protocols.values()),
+                'bytes': sum(value['bytes'] for value in protocols.values())
+            },
+            'protocols': {key[0]: value for key, value in protocols.items()},
+            'top_ports': [
+                {'protocol': protocol, 'port': port, **value}
+                for (protocol, port), value in top_ports
+            ]
+        })
+        
+    def _traffic_series(self, resolution):
+        series = getattr(self.ids, 'traffic_series', None)
+        if series is None:
+            return jsonify({'error': 'traffic time series is disabled'}), 404
+        try:
+            interval = self._parse_interval(request.args.get('interval', '1h'))
+            end = time.time()
+            return jsonify(series.query(resolution, end - interval.total_seconds(), end))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+    def delete_rule(self, rule_name):
+        """删除规则（按规则名从规则引擎中删除，并使规则列表缓存失效）"""
+        engine = self.ids.rule_engine
+        with engine.rules_lock:
+            found = rule_name in engine.rules
+        if not found:
+            return jsonify({'error': 'Rule not found'}), 404
+            
+        self.ids.remove_rule(rule_name)
+        return jsonify({'deleted': rule_name})
+        
+    def get_config(self):
+        """获取配置（隐藏令牌、密码和请求头等敏感项）"""
+        return jsonify(self._redact(self.ids.config))
+        
+    def update_config(self):
+        """更新配置"""
+        data = request.get_json() or {}
+        self.ids.config.update(data)
+        return jsonify(self._redact(self.ids.config))
+        
+    @classmethod
+    def _redact(cls, value):
+        if isinstance(value, dict):
+            return {
+                key: '***' if isinstance(key, str) and (key.lower().endswith(SECRET_SUFFIXES)
+                                                       or key.lower() in SECRET_KEYS) and item
+                else cls._redact(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [cls._redact(item) for item in value]
+        return value
+        
+    def get_top_ips(self):
+        """获取流量最多的IP或端口
+        
+        interval为热点统计的窗口（默认1m、5m、1h）时从内存中的Top-K摘要读取，
+        计数为上界，error为高估量的上界；其他时间范围从汇总表读取源IP的精确统计。
+        """
+        order_by = request.args.get('order_by', 'bytes')
+        if order_by not in ('bytes', 'packets'):
+            return jsonify({'error': f'invalid order_by: {order_by}'}), 400
+        dimension = request.args.get('dimension', 'src_ip')
         interval = request.args.get('interval', '1h')
-        # 实现统计逻辑
-        return jsonify({})
+        heavy_hitters = getattr(self.ids, 'heavy_hitters', None)
+        if heavy_hitters is not None and interval in heavy_hitters.windows:
+            metric = 'alerts' if dimension == 'alert_src' else order_by
+            try:
+                result = heavy_hitters.top(interval, dimension, metric, request.args.get('limit', 10, type=int))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            name = 'port' if dimension == 'dst_port' else 'ip'
+            return jsonify([{name: item, metric: count, 'error': error} for item, count, error in result['top']])
+        if dimension != 'src_ip':
+            return jsonify({'error': f'dimension {dimension} is only available for intervals '
+                                     f'{", ".join(heavy_hitters.windows) if heavy_hitters else "(disabled)"}'}), 400
+        try:
+            start_time = datetime.utcnow() - self._parse_interval(interval)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify(self.db.top_ips(start_time, limit=limit, order_by=order_by))
+        
+    def get_pipeline_stats(self):
+        """获取流水线各阶段的吞吐量与积压"""
+        return jsonify(self.ids.get_pipeline_stats())
+        
+    def get_alert_sink_stats(self):
+        """获取各告警输出端的吞吐量、积压和丢弃数"""
+        return jsonify(self.ids.get_alert_sink_stats())
+        
+    def export_flow_pcap(self):
+        """将一条流的数据包导出为pcap（flow_key或五元组参数）"""
+        key = request.args.get('flow_key')
+        if not key:
+            try:
+                key = flow_key(
+                    request.args['src_ip'], request.args.get('src_port', type=int),
+                    request.args['dst_ip'], request.args.get('dst_port', type=int),
+                    request.args.get('protocol', 'TCP').upper()
+                )
+            except KeyError:
+                return jsonify({'error': 'flow_key or src_ip/dst_ip required'}), 400
+                
+        data = self.db.export_flow_pcap(key)
+        if data is None:
+            return jsonify({'error': 'Flow not found'}), 404
+        return Response(
+            data,
+            mimetype='application/vnd.tcpdump.pcap',
+            headers={'Content-Disposition': 'attachment; filename="flow.pcap"'}
+        )
+        
+    def get_metrics(self):
+        """以Prometheus文本格式导出监控指标"""
+        return Response(
+            registry.render_prometheus(),
+            mimetype='text/plain; version=0.0.4; charset=utf-8'
+        )
+        
+    def profile(self):
+        """采样分析检测线程的调用栈（需要管理令牌），返回flamegraph折叠格式
+        
+        参数: seconds 采样时长, interval 采样间隔（秒）, threads 线程名前缀（逗号分隔，all表示全部线程）,
+        memory=1 时同时返回采样期间tracemalloc记录的内存分配最多的位置（JSON）。
+        """
+        if self.admin_token is None:
+            return jsonify({'error': 'admin endpoints are disabled'}), 404
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {self.admin_token}".encode()):
+            return jsonify({'error': 'unauthorized'}), 401
+            
+        threads = request.args.get('threads', 'Stage-')
+        memory = request.args.get('memory', '').lower() in ('1', 'true', 'yes')
+        try:
+            result = self.profiler.profile(
+                request.args.get('seconds', 10.0, type=float),
+                request.args.get('interval', 0.005, type=float),
+                threads=None if threads == 'all' else [prefix for prefix in threads.split(',') if prefix],
+                memory=memory,
+                memory_limit=request.args.get('limit', 20, type=int)
+            )
+        except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+            
+        text = collapsed(result['stacks'])
+        if memory:
+            return jsonify({'samples': result['samples'], 'collapsed': text, 'allocations': result['allocations']})
+        return Response(text, mimetype='text/plain; charset=utf-8',
+                        headers={'X-Profile-Samples': str(result['samples'])})
         
     def run(self, host='0.0.0.0', port=5000):
-        app.run(host=host, port=port) 
\ No newline at end of file
+        self.app.run(host=host, port=port, threaded=True) 
\ No newline at end of file
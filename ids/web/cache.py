@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from ids.utils.metrics import registry
+
+
+class CachedResponse:
+    """缓存的响应内容"""
+    __slots__ = ('body', 'status', 'mimetype', 'etag', 'expires')
+
+    def __init__(self, body: bytes, status: int, mimetype: str, expires: float):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.expires = expires
+
+
+class _Flight:
+    """正在计算中的请求，相同键的并发请求等待它的结果"""
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[CachedResponse] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    def __init__(self, ttls: Dict[str, float] = None, default_ttl: float = 5.0, max_entries: int = 1024):
+        """
+        初始化响应缓存（按端点设置TTL，相同键的并发请求只计算一次）
+        Args:
+            ttls: 端点 -> 缓存时间（秒），0表示不缓存
+            default_ttl: 未单独配置的端点的缓存时间（秒）
+            max_entries: 最多缓存的响应数，超出时先删除过期的，再删除最早写入的
+        """
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_entries = max(1, int(max_entries))
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, Hashable], CachedResponse] = {}
+        self.flights: Dict[Tuple[str, Hashable], _Flight] = {}
+        self.generations: Dict[str, int] = {}  # 端点 -> 失效次数，失效前开始的计算结果不写入缓存
+        self.hits = 0
+        self.lookups = 0
+
+        # 监控指标
+        self.metric_requests = {
+            result: registry.counter('api_cache_requests_total', 'API响应缓存的查询数', {'result': result})
+            for result in ('hit', 'miss', 'coalesced')
+        }
+        self.metric_invalidations = registry.counter('api_cache_invalidations_total', 'API响应缓存的失效次数')
+        registry.gauge('api_cache_entries', 'API响应缓存的条目数', function=lambda: len(self.entries))
+        registry.gauge('api_cache_hit_ratio', 'API响应缓存的命中率（含合并的并发请求）',
+                       function=lambda: self.hits / self.lookups if self.lookups else 0.0)
+
+    def ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def get(self, endpoint: str, params: Hashable,
+            compute: Callable[[], Tuple[bytes, int, str]], now: float = None) -> CachedResponse:
+        """返回缓存的响应，不存在或已过期时调用compute()计算 (响应体, 状态码, MIME类型)
+
+        同一键的并发请求只有第一个调用compute()，其余等待它的结果；只缓存状态码为200的响应。
+        """
+        key = (endpoint, params)
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires > now:
+                self.hits += 1
+                self.metric_requests['hit'].inc()
+                return entry
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+                generation = self.generations.get(endpoint, 0)
+            else:
+                self.hits += 1
+
+        if not leader:
+            self.metric_requests['coalesced'].inc()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        self.metric_requests['miss'].inc()
+        try:
+            body, status, mimetype = compute()
+            flight.result = CachedResponse(body, status, mimetype, now + self.ttl(endpoint))
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                if (flight.result is not None and flight.result.status == 200 and self.ttl(endpoint) > 0
+                        and self.generations.get(endpoint, 0) == generation):
+                    self._store(key, flight.result, now)
+            flight.done.set()
+        return flight.result
+
+    def invalidate(self, endpoint: str = None):
+        """删除某个端点（None表示全部端点）的缓存响应"""
+        with self.lock:
+            for key in [key for key in self.entries if endpoint is None or key[0] == endpoint]:
+                del self.entries[key]
+            for name in ([endpoint] if endpoint else set(self.generations) | {key[0] for key in self.flights}):
+                self.generations[name] = self.generations.get(name, 0) + 1
+        self.metric_invalidations.inc()
+
+    def _store(self, key, entry: CachedResponse, now: float):
+        """写入缓存（调用方持有锁）"""
+        self.entries.pop(key, None)
+        if len(self.entries) >= self.max_entries:
+            for stale in [k for k, e in self.entries.items() if e.expires <= now]:
+                del self.entries[stale]
+            while len(self.entries) >= self.max_entries:
+                del self.entries[next(iter(self.entries))]
+        self.entries[key] = entry
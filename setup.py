@@ -14,6 +14,11 @@ setup(
         'Flask>=2.0.0',
         'python-iptables>=1.0.0',
     ],
+    entry_points={
+        'console_scripts': [
+            'ids=ids.main:main',
+        ],
+    },
     author="Your Name",
     author_email="your.email@example.com",
     description="A Network Intrusion Detection System",
@@ -0,0 +1,171 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from scapy.layers.inet import IP, TCP
+
+from ids.utils.alert import AlertHandler
+from ids.utils.alert_dispatch import AlertDispatcher, AlertSink, JSONLinesSink, SyslogSink, WebhookSink
+from ids.utils.suppression import AlertSuppressor
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not condition():
+        time.sleep(0.01)
+    return condition()
+
+
+def alert(i):
+    return {'timestamp': '2024-01-01 00:00:00', 'type': 'rule', 'rule_name': 'scan',
+            'severity': 'high', 'src_ip': f"10.0.0.{i}", 'dst_ip': '10.0.1.1'}
+
+
+class BlockingSink(AlertSink):
+    def __init__(self, **options):
+        super().__init__('blocking', **options)
+        self.release = threading.Event()
+        self.batches = []
+
+    def write_batch(self, alerts):
+        self.release.wait()
+        self.batches.append([a['src_ip'] for a in alerts])
+
+    def close(self):
+        self.closed = True
+
+
+class FlakySink(AlertSink):
+    def __init__(self, failures, **options):
+        super().__init__('flaky', **options)
+        self.failures = failures
+        self.batches = []
+
+    def write_batch(self, alerts):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('receiver down')
+        self.batches.append(len(alerts))
+
+
+def test_jsonl_sink_writes_batches(tmp_path):
+    sink = JSONLinesSink(tmp_path / 'alerts.jsonl', batch_size=10, flush_interval=0.05)
+    dispatcher = AlertDispatcher([sink])
+    dispatcher.start()
+    for i in range(25):
+        dispatcher.publish(alert(i))
+    dispatcher.stop()
+    lines = (tmp_path / 'alerts.jsonl').read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['src_ip'] for line in lines] == [f"10.0.0.{i}" for i in range(25)]
+    assert dispatcher.get_stats()[0]['sent'] == 25
+
+
+def test_full_queue_drops_by_policy_without_blocking():
+    oldest = BlockingSink(queue_size=5, batch_size=100, flush_interval=0.01)
+    newest = BlockingSink(queue_size=5, batch_size=100, flush_interval=0.01, drop_policy='drop_newest')
+    for sink in (oldest, newest):
+        sink.start()
+        sink.offer(alert(0))
+        assert wait_for(lambda: not sink.queue)  # 第一条已被取出，写出阻塞中
+        start = time.monotonic()
+        for i in range(1, 21):
+            sink.offer(alert(i))
+        assert time.monotonic() - start < 0.5
+        sink.release.set()
+        sink.stop()
+        assert sink.get_stats()['dropped'] == 15
+    assert oldest.batches[1] == [f"10.0.0.{i}" for i in range(16, 21)]
+    assert newest.batches[1] == [f"10.0.0.{i}" for i in range(1, 6)]
+
+
+def test_stop_does_not_close_sink_while_worker_is_writing():
+    sink = BlockingSink(batch_size=1, flush_interval=0.01)
+    sink.closed = False
+    sink.start()
+    sink.offer(alert(0))
+    sink.offer(alert(1))
+    assert wait_for(lambda: len(sink.queue) == 1)
+    sink.stop(timeout=0.05)
+    assert sink.worker.is_alive() and not sink.closed
+    sink.release.set()
+    sink.stop()
+    assert sink.closed and sink.batches == [['10.0.0.0'], ['10.0.0.1']]
+
+
+def test_sink_requires_write_batch():
+    class Incomplete(AlertSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete('incomplete')
+
+
+def test_retries_then_gives_up():
+    sink = FlakySink(failures=2, batch_size=5, flush_interval=0.01, max_retries=2, retry_backoff=0.01)
+    sink.start()
+    for i in range(5):
+        sink.offer(alert(i))
+    assert wait_for(lambda: sink.batches == [5])
+    sink.failures = 10
+    sink.offer(alert(9))
+    assert wait_for(lambda: sink.get_stats()['failed'] == 1)
+    sink.stop()
+    assert sink.get_stats()['sent'] == 5
+
+
+def test_syslog_and_webhook_sinks_deliver():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(2)
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        dispatcher = AlertDispatcher([
+            SyslogSink('127.0.0.1', receiver.getsockname()[1], flush_interval=0.01),
+            WebhookSink(f"http://127.0.0.1:{server.server_port}/alerts", batch_size=3, flush_interval=0.05),
+        ])
+        dispatcher.start()
+        for i in range(3):
+            dispatcher.publish(alert(i))
+        message = receiver.recv(4096).decode('utf-8')
+        assert message.startswith('<35>1 ') and '10.0.0.0' in message
+        assert wait_for(lambda: received)
+        dispatcher.stop()
+        assert [a['src_ip'] for a in received[0]] == ['10.0.0.0', '10.0.0.1', '10.0.0.2']
+    finally:
+        server.shutdown()
+        receiver.close()
+
+
+def test_aggregates_are_flushed_without_further_alerts():
+    published = []
+    dispatcher = AlertDispatcher()
+    dispatcher.publish = published.append
+    handler = AlertHandler(suppressor=AlertSuppressor(cooldown=60, flush_interval=0.05), dispatcher=dispatcher)
+    handler.start()
+    packet = IP(src='10.0.0.5', dst='10.0.1.1') / TCP(dport=22)
+    for _ in range(3):
+        handler.handle_alert(packet, [{'rule_name': 'scan', 'severity': 'medium'}], None)
+    assert [a['type'] for a in published] == ['rule']
+
+    # 攻击停止后没有新告警，定时线程仍输出汇总
+    assert wait_for(lambda: any(a['type'] == 'aggregate' for a in published))
+    handler.stop()
+    aggregate = next(a for a in published if a['type'] == 'aggregate')
+    assert aggregate['suppressed'] == 2 and aggregate['count'] == 3
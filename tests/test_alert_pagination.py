@@ -0,0 +1,80 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select, text
+
+from ids.models.database import Alert, AlertSeverity
+from ids.models.db_manager import DatabaseManager
+from ids.web.api import IDSAPI
+
+BASE = datetime(2024, 1, 1)
+
+
+def populate(db, count=500):
+    rng = random.Random(3)
+    for i in range(count):
+        # 部分告警时间戳相同，验证游标按 (timestamp, id) 排序
+        timestamp = BASE + timedelta(seconds=rng.randint(0, 3 * 86400) // 60 * 60)
+        db._enqueue(Alert, [{
+            'id': db._next_id(Alert), 'timestamp': timestamp, 'packet_id': None,
+            'src_ip': f"10.0.0.{i % 7}", 'dst_ip': f"172.16.0.{i % 3}", 'alert_type': 'rule',
+            'rule_name': rng.choice(['Port Scan', 'SYN Flood']),
+            'severity': rng.choice([AlertSeverity.HIGH, AlertSeverity.LOW]),
+            'confidence': None, 'description': '',
+        }])
+    db.flush()
+
+
+def test_cursor_pages_cover_all_alerts_in_order(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}")
+    populate(db)
+    client = IDSAPI(SimpleNamespace(db_manager=db)).app.test_client()
+
+    seen = []
+    url = '/api/alerts?per_page=37&severity=high&src_ip=10.0.0.1'
+    response = client.get(url).json
+    assert response['total_estimated'] is True
+    total = response['total']
+    while True:
+        seen.extend(response['alerts'])
+        if not response['next_cursor']:
+            break
+        response = client.get(f"{url}&cursor={response['next_cursor']}").json
+
+    expected = sorted(
+        (row for table in db.partitions.tables_for_range(Alert)
+         for row in db.engine.connect().execute(select(table)).mappings()
+         if row['severity'] == AlertSeverity.HIGH and row['src_ip'] == '10.0.0.1'),
+        key=lambda row: (row['timestamp'], row['id']), reverse=True
+    )
+    assert [alert['id'] for alert in seen] == [row['id'] for row in expected]
+    assert total == len(expected)
+
+    # dst_ip不在汇总表维度内，精确统计
+    response = client.get('/api/alerts?dst_ip=172.16.0.1').json
+    assert response['total_estimated'] is False
+    assert response['total'] == sum(1 for i in range(500) if i % 3 == 1)
+    # 每页条数限制在 [1, MAX_PAGE_SIZE]
+    for per_page in (0, -1):
+        response = client.get(f'/api/alerts?per_page={per_page}')
+        assert response.status_code == 200 and len(response.json['alerts']) == 1
+        assert response.json['next_cursor']
+    assert client.get('/api/alerts?cursor=bogus').status_code == 400
+    assert client.get('/api/alerts?severity=urgent').status_code == 400
+    db.close()
+
+
+def test_filtered_queries_use_indexes(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}")
+    populate(db, 10)
+    table = db.partitions.tables_for_range(Alert)[0].name
+    with db.engine.connect() as conn:
+        for column in ('severity', 'rule_name', 'src_ip', 'dst_ip'):
+            plan = ' '.join(str(row[-1]) for row in conn.execute(text(
+                f"EXPLAIN QUERY PLAN SELECT * FROM {table} WHERE {column} = 'x' "
+                f"AND (timestamp, id) < ('2024-01-02', 5) ORDER BY timestamp DESC, id DESC LIMIT 20"
+            )))
+            assert f"ix_{table}_{column}_timestamp" in plan
+            assert 'TEMP B-TREE' not in plan
+    db.close()
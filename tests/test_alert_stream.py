@@ -0,0 +1,96 @@
+import json
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+from ids.models.database import AlertSeverity
+from ids.web.alert_stream import AlertStream
+from ids.web.api import IDSAPI
+
+
+def make_alert(i, severity=AlertSeverity.HIGH, rule_name='Port Scan'):
+    return {'id': i, 'timestamp': datetime(2024, 1, 1), 'src_ip': f"10.0.0.{i % 7}",
+            'rule_name': rule_name, 'severity': severity}
+
+
+def parse(chunks):
+    """解析SSE文本块，返回 [(事件类型, 序号, 数据)]"""
+    events = []
+    for block in ''.join(chunks).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'data' in fields:
+            events.append((fields.get('event'), fields.get('id'), json.loads(fields['data'])))
+    return events
+
+
+def test_read_filters_and_reports_overwritten_alerts():
+    stream = AlertStream(capacity=8)
+    stream.publish([make_alert(i, AlertSeverity.HIGH if i % 2 else AlertSeverity.LOW) for i in range(1, 6)])
+
+    events, position, missed = stream.read(0, severities={'high'})
+    assert [json.loads(data)['id'] for _, data in events] == [1, 3, 5]
+    assert position == 5 and missed == 0
+    assert stream.read(5) == ([], 5, 0)
+
+    # 环形缓冲区只保留最近8条，续传位置过旧时报告错过的告警数
+    stream.publish([make_alert(i) for i in range(6, 21)])
+    events, position, missed = stream.read(3)
+    assert [event_id for event_id, _ in events] == list(range(13, 21))
+    assert missed == 9 and position == 20
+    # 服务重启后客户端的序号可能大于当前最新序号
+    assert stream.read(100) == ([], 20, 0)
+
+
+def test_subscribers_share_published_alerts():
+    stream = AlertStream(capacity=64, keepalive=0.05)
+    received = [[] for _ in range(4)]
+    ready = threading.Barrier(5)
+
+    def subscriber(index):
+        generator = stream.subscribe(last_id=0, rules={'SYN Flood'} if index == 0 else None)
+        received[index].append(next(generator))
+        ready.wait()
+        for chunk in generator:
+            received[index].append(chunk)
+
+    threads = [threading.Thread(target=subscriber, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    assert stream.subscribers == 4
+    stream.publish([make_alert(1), make_alert(2, rule_name='SYN Flood')])
+    stream.publish([make_alert(3)])
+    while not all(sum(1 for e in parse(chunks) if e[0] == 'alert') >= (1 if i == 0 else 3)
+                  for i, chunks in enumerate(received)) or ': keepalive\n\n' not in received[0]:
+        threading.Event().wait(0.01)
+    stream.close()
+    for thread in threads:
+        thread.join(1)
+
+    assert stream.subscribers == 0
+    assert [data['id'] for _, _, data in parse(received[0])] == [2]
+    for chunks in received[1:]:
+        assert [(event_id, data['id']) for _, event_id, data in parse(chunks)] == [('1', 1), ('2', 2), ('3', 3)]
+    # 长时间没有匹配的告警时发送保活注释
+    assert any(': keepalive' in chunk for chunk in received[0])
+
+
+def test_stream_endpoint_resumes_from_last_event_id():
+    stream = AlertStream(capacity=16)
+    stream.publish([make_alert(i, AlertSeverity.HIGH if i % 3 else AlertSeverity.MEDIUM) for i in range(1, 10)])
+    client = IDSAPI(SimpleNamespace(db_manager=None, alert_stream=stream)).app.test_client()
+
+    response = client.get('/api/alerts/stream?severity=medium', headers={'Last-Event-ID': '3'})
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.response
+    assert next(chunks).decode().startswith('retry:')
+    events = parse([next(chunks).decode()])
+    assert [(event_id, data['id'], data['severity']) for _, event_id, data in events] == \
+        [('6', 6, 'medium'), ('9', 9, 'medium')]
+    stream.close()
+    response.close()
+
+    assert client.get('/api/alerts/stream?severity=urgent').status_code == 400
+    assert client.get('/api/alerts/stream?last_id=abc').status_code == 400
+    disabled = IDSAPI(SimpleNamespace(db_manager=None)).app.test_client()
+    assert disabled.get('/api/alerts/stream').status_code == 404
@@ -0,0 +1,113 @@
+import time
+
+import yaml
+from scapy.layers.inet import TCP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.l2 import Ether
+
+from ids.capture.session_handler import SessionHandler
+from ids.correlation.checkpoint import Checkpointer
+from ids.correlation.event_correlator import CorrelationRule, EventCorrelator
+from ids.models.flow_archive import FlowArchive
+
+
+class RecordingDB:
+    def __init__(self):
+        self.alerts = []
+
+    def save_correlation_alert(self, alert):
+        self.alerts.append(alert)
+
+
+def make_correlator(time_window=600, shards=4):
+    correlator = EventCorrelator(RecordingDB(), shards=shards)
+    correlator.correlation_rules = [CorrelationRule(
+        'brute', {'dst_port': [22, 3389], 'group_by': ['src_ip', 'dst_ip']},
+        time_window=time_window, threshold=100, severity='high'
+    )]
+    return correlator
+
+
+def test_checkpoint_round_trip_and_incremental(tmp_path):
+    correlator = make_correlator()
+    for i in range(300):
+        correlator.process_event({'dst_port': 22, 'src_ip': f"10.0.0.{i % 30}", 'dst_ip': '10.0.1.1'})
+    checkpointer = Checkpointer(tmp_path, correlator)
+    assert checkpointer.save() == 4
+    assert checkpointer.save() == 0  # 没有变化的分片不重写
+    correlator.process_event({'dst_port': 22, 'src_ip': '10.0.0.1', 'dst_ip': '10.0.1.1'})
+    assert checkpointer.save() == 1
+
+    # 重启后以不同的分片数恢复，计数继续累加
+    restored = make_correlator(shards=8)
+    count, flows = Checkpointer(tmp_path, restored).restore()
+    assert count == 30 and flows == []
+    assert restored.get_window('brute', '10.0.0.1|10.0.1.1').total == 11
+    assert restored.get_window('brute', '10.0.0.2|10.0.1.1').total == 10
+    window = restored.get_window('brute', '10.0.0.1|10.0.1.1')
+    original = correlator.get_window('brute', '10.0.0.1|10.0.1.1')
+    assert abs(window.first_time - original.first_time) < 0.01
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_restore_skips_expired_and_rebuckets(tmp_path):
+    correlator = make_correlator()
+    correlator.process_event({'dst_port': 3389, 'src_ip': '10.0.0.1', 'dst_ip': '10.0.1.1'})
+    Checkpointer(tmp_path, correlator).save()
+    key = '10.0.0.1|10.0.1.1'
+    last_time = correlator.get_window('brute', key).last_time
+
+    # 规则窗口缩短为60秒：仍在窗口内时恢复，过期后跳过
+    shorter = make_correlator(time_window=60)
+    assert Checkpointer(tmp_path, shorter).restore(now=last_time + 30)[0] == 1
+    assert shorter.get_window('brute', key).count(last_time + 30) == 1
+    assert Checkpointer(tmp_path, make_correlator(time_window=60)).restore(now=last_time + 120)[0] == 0
+
+
+def test_checkpoint_tick_flushes_idle_archive_and_keeps_ipv6_flows(tmp_path):
+    handler = SessionHandler(timeout=60)
+    handler.add_packet(Ether() / IPv6(src='2001:db8::1', dst='fd00::1') / TCP(sport=1234, dport=443))
+    record = handler.flow_summaries()[0]
+    archive = FlowArchive(tmp_path / 'flows', flush_interval=0.05)
+    archive.add(record)
+    assert archive.count() == 0
+    checkpointer = Checkpointer(tmp_path / 'checkpoint', make_correlator(), handler,
+                                interval=0.05, flow_archive=archive)
+    checkpointer.start()
+    try:
+        # 之后没有新的流记录，缓冲的记录也由检查点线程写入
+        deadline = time.monotonic() + 3
+        while time.monotonic() < deadline and not archive.count():
+            time.sleep(0.02)
+    finally:
+        checkpointer.stop()
+    flows = archive.aggregate('src_ip', measures=('packets',))
+    assert flows == {'2001:db8::1': {'flows': 1, 'packets': 1}}
+
+    _, flows = Checkpointer(tmp_path / 'checkpoint', make_correlator()).restore()
+    assert flows == [record]
+
+
+def test_restored_flows_are_archived_once(tmp_path):
+    from ids.main import IDS
+
+    handler = SessionHandler(timeout=60)
+    handler.add_packet(Ether() / IPv6(src='2001:db8::1', dst='fd00::1') / TCP(sport=1234, dport=443))
+    Checkpointer(tmp_path / 'checkpoint', make_correlator(), handler).save()
+    config_file = tmp_path / 'ids_config.yaml'
+    config_file.write_text(yaml.safe_dump({
+        'network': {'interface': None},
+        'database': {'url': f"sqlite:///{tmp_path / 'ids.db'}"},
+        'packet_store': {'enabled': False},
+        'flow_archive': {'directory': str(tmp_path / 'flows')},
+        'checkpoint': {'directory': str(tmp_path / 'checkpoint')},
+        'firewall': {'enabled': False},
+    }))
+
+    # 恢复并写入归档后再次异常退出（不调用stop），下次启动不会重复归档
+    for _ in range(2):
+        instance = IDS(rules_dir=str(tmp_path / 'rules'), config_file=str(config_file))
+        instance.flow_archive.flush()
+        instance.db_manager.close()
+    assert instance.flow_archive.count() == 1
+    assert not (tmp_path / 'checkpoint' / 'flows.bin').exists()
@@ -0,0 +1,102 @@
+import ipaddress
+import random
+import time
+
+import yaml
+from scapy.layers.inet import TCP, UDP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.l2 import Ether
+
+from ids.utils.cidr_filter import CIDRFilter, CIDRTrie, parse_cidr
+
+def test_trie_longest_prefix_match():
+    trie = CIDRTrie(32)
+    for cidr, value in [('10.0.0.0/8', 'a'), ('10.1.0.0/16', 'b'),
+                        ('10.1.2.0/24', 'c'), ('10.1.2.3/32', 'd')]:
+        network, length, _ = parse_cidr(cidr)
+        trie.insert(network, length, value)
+
+    def lookup(ip):
+        return trie.lookup(int(ipaddress.ip_address(ip)))
+
+    assert lookup('10.1.2.3') == 'd'
+    assert lookup('10.1.2.4') == 'c'
+    assert lookup('10.1.3.1') == 'b'
+    assert lookup('10.200.0.1') == 'a'
+    assert lookup('11.0.0.1') is None
+    assert len(trie) == 4
+
+def test_trie_matches_linear_scan():
+    rng = random.Random(1)
+    networks = []
+    trie = CIDRTrie(32)
+    for i in range(300):
+        net = ipaddress.ip_network((rng.getrandbits(32), rng.randint(0, 32)), strict=False)
+        networks.append((net, i))
+        trie.insert(int(net.network_address), net.prefixlen, i)
+
+    for _ in range(2000):
+        address = ipaddress.ip_address(rng.getrandbits(32))
+        matches = [(net.prefixlen, i) for net, i in networks if address in net]
+        expected = None
+        if matches:
+            # 相同前缀以最后插入的为准
+            best = max(length for length, _ in matches)
+            expected = [i for length, i in matches if length == best][-1]
+        assert trie.lookup(int(address)) == expected
+
+def test_filter_classify_and_reload(tmp_path):
+    lists = tmp_path / 'cidr.yaml'
+    lists.write_text("allow: [10.10.0.0/16, 10.20.0.0/16, 'fd00:10::/32']\n"
+                     "deny: [10.10.66.0/24]\n")
+    cidr_filter = CIDRFilter(path=str(lists))
+
+    assert cidr_filter.classify('10.10.1.1', '10.20.1.1') == CIDRFilter.ALLOW
+    assert cidr_filter.classify('fd00:10::1', 'fd00:10:ffff::2') == CIDRFilter.ALLOW
+    assert cidr_filter.classify('10.10.1.1', '8.8.8.8') is None
+    assert cidr_filter.classify('10.10.66.5', '10.20.1.1') == CIDRFilter.DENY
+
+    lists.write_text("allow: []\ndeny: ['2001:db8::/32']\n")
+    cidr_filter.reload()
+    assert cidr_filter.classify('10.10.1.1', '10.20.1.1') is None
+    assert cidr_filter.classify('2001:db8::5', '10.20.1.1') == CIDRFilter.DENY
+    assert cidr_filter.get_stats() == {'ipv4_prefixes': 0, 'ipv6_prefixes': 1}
+
+
+def test_pipeline_applies_ipv6_prefixes(tmp_path):
+    from ids.main import IDS
+
+    lists = tmp_path / 'cidr.yaml'
+    lists.write_text("allow: ['fd00:10::/32']\ndeny: ['2001:db8::/32']\n")
+    config_file = tmp_path / 'ids_config.yaml'
+    config_file.write_text(yaml.safe_dump({
+        'network': {'interface': None},
+        'database': {'url': f"sqlite:///{tmp_path / 'ids.db'}"},
+        'packet_store': {'enabled': False},
+        'flow_archive': {'enabled': False},
+        'checkpoint': {'directory': str(tmp_path / 'checkpoint')},
+        'firewall': {'enabled': False},
+        'cidr_filter': {'file': str(lists)},
+    }))
+    instance = IDS(rules_dir=str(tmp_path / 'rules'), config_file=str(config_file))
+    instance.packet_capture.packet_callback = instance.packet_handler
+    instance.pipeline.start()
+    for packet in (
+        Ether() / IPv6(src='fd00:10::1', dst='fd00:10::2') / TCP(dport=443),
+        Ether() / IPv6(src='2001:db8::5', dst='fd00:10::2') / UDP(dport=53),
+        Ether() / IPv6(src='fd00:20::1', dst='fd00:10::2') / TCP(dport=80),
+    ):
+        # 经过抓包回调，确认IPv6数据包不会在入口被丢弃
+        instance.packet_capture._packet_handler(Ether(bytes(packet)))
+    while any(stage.queue.unfinished_tasks for stage in instance.pipeline.stages):
+        time.sleep(0.01)
+    instance.pipeline.stop()
+    instance.db_manager.flush()
+    alerts = instance.db_manager.query_alerts(limit=10)
+    instance.db_manager.close()
+
+    assert instance.traffic_stats['packets'] == 3
+    assert instance.traffic_stats['allowlisted'] == 1
+    assert instance.traffic_stats['denylisted'] == 1
+    assert all(stage['errors'] == 0 for stage in instance.get_pipeline_stats())
+    assert [alert['src_ip'] for alert in alerts if alert['rule_name'] == 'CIDR Deny List'] == ['2001:db8::5']
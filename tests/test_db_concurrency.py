@@ -0,0 +1,107 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+
+from ids.models.database import Alert, AlertSeverity, Packet
+from ids.models.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", batch_size=500)
+    yield manager
+    manager.close()
+
+
+def ingest(db, count, start=datetime(2024, 1, 1)):
+    for i in range(count):
+        timestamp = start + timedelta(seconds=i)
+        packet = {
+            'id': db._next_id(Packet), 'timestamp': timestamp, 'src_ip': f"10.0.{i % 50}.1",
+            'dst_ip': '172.16.0.1', 'protocol': 'TCP', 'src_port': 1024 + i % 1000, 'dst_port': 80,
+            'length': 100, 'flow_key': '', 'segment': None, 'offset': None, 'features': {},
+        }
+        db._enqueue(Packet, [packet])
+        db._enqueue(Alert, [{
+            'id': db._next_id(Alert), 'timestamp': timestamp, 'packet_id': packet['id'],
+            'src_ip': packet['src_ip'], 'dst_ip': packet['dst_ip'], 'alert_type': 'rule',
+            'rule_name': 'Port Scan', 'severity': AlertSeverity.HIGH, 'confidence': None,
+            'description': '',
+        }])
+
+
+def count_packets(conn, db):
+    return sum(conn.execute(select(func.count()).select_from(table)).scalar()
+               for table in db.partitions.tables_for_range(Packet))
+
+
+def test_wal_and_read_only_engine(db):
+    with db.engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+    assert db.read_engine is not db.engine
+    with db.read_engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('CREATE TABLE forbidden (id INTEGER)'))
+
+
+def test_sessions_are_per_thread(db):
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(db.session()))
+    thread.start()
+    thread.join()
+    assert sessions[0] is not db.session()
+
+
+def test_open_reader_does_not_block_writer(db):
+    ingest(db, 100)
+    db.flush()
+
+    with db.read_engine.connect() as reader:
+        # 未读完的查询持有读锁（回滚日志模式下会阻塞写线程提交）
+        table = db.partitions.tables_for_range(Packet)[0]
+        result = reader.execute(select(table))
+        assert result.fetchone() is not None
+        start = time.perf_counter()
+        ingest(db, 1000, start=datetime(2024, 1, 1, 1))
+        assert db.flush(timeout=10)
+        assert time.perf_counter() - start < 5
+        result.close()
+        assert count_packets(reader, db) == 1100
+
+
+def test_dashboard_queries_during_ingest(db):
+    ingest(db, 1000)
+    db.flush()
+    stop = threading.Event()
+    errors = []
+    queries = [0]
+
+    def dashboard():
+        while not stop.is_set():
+            try:
+                db.query_alerts(limit=50, filters={'dst_ip': '172.16.0.1'})
+                db.alert_counts('src_ip')
+                db.top_ips(limit=10)
+                with db.read_engine.connect() as conn:
+                    count_packets(conn, db)
+                queries[0] += 1
+            except Exception as e:  # pragma: no cover - 失败时记录
+                errors.append(e)
+
+    readers = [threading.Thread(target=dashboard) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    ingest(db, 5000, start=datetime(2024, 1, 3))
+    assert db.flush(timeout=30)
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert not errors
+    assert queries[0] > 0
+    with db.engine.connect() as conn:
+        assert count_packets(conn, db) == 6000
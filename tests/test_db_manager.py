@@ -0,0 +1,90 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, func, select
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.layers.l2 import Ether
+
+from ids.models.database import Packet, Alert, CorrelationAlert, AlertSeverity
+from ids.models.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", batch_size=50, flush_interval=60)
+    yield manager
+    manager.close()
+
+
+def count_rows(db, model):
+    with db.engine.connect() as conn:
+        return sum(conn.execute(select(func.count()).select_from(table)).scalar()
+                   for table in db.partitions.tables_for_range(model))
+
+
+def make_packet(i):
+    return Ether() / IP(src=f"10.0.0.{i % 250 + 1}", dst='172.16.0.1') / TCP(sport=40000 + i, dport=80, flags='S')
+
+
+def test_alerts_reference_buffered_packets(db):
+    rows = []
+    for i in range(120):
+        row = db.save_packet(make_packet(i), {'tcp_flags': 2})
+        db.save_alert(row, [{'rule_name': 'SYN', 'severity': 'high'}], None)
+        rows.append(row)
+    db.flush()
+
+    assert [row['id'] for row in rows] == list(range(1, 121))
+    assert count_rows(db, Packet) == 120
+    alerts = db.query_alerts(limit=200)[::-1]
+    assert [alert['packet_id'] for alert in alerts] == [row['id'] for row in rows]
+    assert alerts[0]['severity'] == AlertSeverity.HIGH
+    assert db.alert_counts() == {'high': 120}
+
+
+def test_close_flushes_and_ids_continue(tmp_path):
+    url = f"sqlite:///{tmp_path / 'ids.db'}"
+    db = DatabaseManager(url, batch_size=1000, flush_interval=60)
+    db.save_packet(Ether() / IP() / UDP(dport=53), {})
+    db.save_correlation_alert({
+        'rule_name': 'Port Scan', 'severity': 'critical', 'events_count': 1,
+        'related_events': [{'timestamp': datetime(2024, 1, 1)}],
+    })
+    db.close()
+
+    db = DatabaseManager(url)
+    assert count_rows(db, Packet) == 1
+    assert db.session.query(CorrelationAlert).one().severity == AlertSeverity.CRITICAL
+    assert db.save_packet(make_packet(1), {})['id'] == 2
+    db.close()
+
+
+def test_interval_flush(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", batch_size=1000, flush_interval=0.05)
+    db.save_packet(make_packet(1), {})
+    with db.buffer_cond:
+        assert db.buffer_cond.wait_for(lambda: db.batches_written == 1, 5)
+    db.close()
+
+
+def test_failed_batch_is_retried(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", batch_size=1000, flush_interval=60,
+                         retry_backoff=0.01)
+    failures = []
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def fail_once(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT') and not failures:
+            failures.append(statement)
+            raise sqlite3.OperationalError('database is locked')
+
+    for i in range(10):
+        row = db.save_packet(make_packet(i), {})
+        db.save_alert(row, [{'rule_name': 'SYN', 'severity': 'high'}], None)
+    db.flush()
+
+    assert len(failures) == 1
+    assert count_rows(db, Packet) == 10 and count_rows(db, Alert) == 10
+    assert db.alert_counts() == {'high': 10}  # 汇总表与原始行在同一事务中，没有重复累加
+    db.close()
@@ -0,0 +1,180 @@
+from ids.correlation.event_correlator import CorrelationRule, CorrelatorShard, EventCorrelator, shard_of
+from ids.correlation.window import WindowCounter
+from ids.utils.suppression import AlertSuppressor
+
+
+class RecordingDB:
+    def __init__(self):
+        self.alerts = []
+
+    def save_correlation_alert(self, alert):
+        self.alerts.append(alert)
+
+
+def test_window_counter_slides_and_expires():
+    window = WindowCounter(60, buckets=6, samples=3)
+    for t in range(0, 50, 10):
+        window.add(1000 + t, t)
+    assert window.count(1049) == 5
+    assert window.recent_events() == [20, 30, 40]
+    # 每个桶10秒，1000-1009的桶在1060移出窗口
+    assert window.count(1059) == 5
+    assert window.count(1060) == 4
+    assert window.count(1095) == 1
+    assert not window.expired(1095)
+    assert window.count(1200) == 0
+    assert window.expired(1200)
+    assert window.recent_events() == []
+    # 早于窗口的迟到事件不计数
+    assert window.add(1000) == 0
+
+
+def test_threshold_and_bounded_samples():
+    db = RecordingDB()
+    correlator = EventCorrelator(db, AlertSuppressor(cooldown=0))
+    correlator.correlation_rules = []
+    correlator.add_rule(CorrelationRule(
+        'burst', {'alert_type': 'rule', 'group_by': ['src_ip']}, time_window=60, threshold=50,
+        severity='high'
+    ))
+    for i in range(200):
+        correlator.process_event({'alert_type': 'rule', 'src_ip': '10.0.0.1', 'seq': i})
+
+    assert len(db.alerts) == 151
+    alert = db.alerts[-1]
+    assert alert['events_count'] == 200
+    assert [event['seq'] for event in alert['related_events']] == list(range(190, 200))
+    assert alert['first_event_time'] <= alert['last_event_time']
+
+
+def test_rules_sharing_a_key_are_counted_separately():
+    db = RecordingDB()
+    correlator = EventCorrelator(db)
+    correlator.correlation_rules = []
+    correlator.add_rule(CorrelationRule('scan', {'rule_name': 'Port Scan', 'group_by': ['src_ip']},
+                                        time_window=60, threshold=3, severity='high'))
+    correlator.add_rule(CorrelationRule('any', {'alert_type': 'rule', 'group_by': ['src_ip']},
+                                        time_window=60, threshold=3, severity='medium'))
+    for rule_name in ('Port Scan', 'SYN Flood', 'SYN Flood'):
+        correlator.process_event({'alert_type': 'rule', 'rule_name': rule_name, 'src_ip': '10.0.0.1'})
+
+    assert [alert['rule_name'] for alert in db.alerts] == ['any']
+    assert correlator.get_window('scan', '10.0.0.1').total == 1
+    assert correlator.get_window('any', '10.0.0.1').total == 3
+
+
+def linear_match(event, conditions):
+    """逐条比较条件（用作RuleIndex的对照）"""
+    for key, value in conditions.items():
+        if key == 'group_by':
+            continue
+        if key not in event:
+            return False
+        if event[key] not in value if isinstance(value, list) else event[key] != value:
+            return False
+    return True
+
+
+def test_rule_index_matches_linear_scan():
+    import random
+
+    correlator = EventCorrelator(RecordingDB())
+    correlator.correlation_rules = []
+    fields = {
+        'alert_type': ['rule', 'ml', 'correlation'],
+        'rule_name': ['Port Scan', 'SYN Flood', 'DNS Tunnel'],
+        'severity': ['low', 'medium', 'high'],
+        'dst_port': [22, 23, 80, 3389],
+        'protocol': ['TCP', 'UDP'],
+    }
+    rng = random.Random(7)
+    for i in range(200):
+        conditions = {'group_by': rng.sample(['src_ip', 'dst_ip', 'dst_port'], rng.randint(1, 3))}
+        for field in rng.sample(list(fields), rng.randint(0, 3)):
+            values = fields[field]
+            conditions[field] = rng.sample(values, 2) if rng.random() < 0.4 else rng.choice(values)
+        correlator.add_rule(CorrelationRule(f"rule-{i}", conditions, 60, 10 ** 6, 'low'))
+
+    for _ in range(500):
+        event = {'src_ip': f"10.0.0.{rng.randint(1, 5)}"}
+        for field, values in fields.items():
+            if rng.random() < 0.8:
+                event[field] = rng.choice(values)
+        expected = [
+            (rule.name, '|'.join(str(event.get(field, '')) for field in rule.conditions['group_by']))
+            for rule in correlator.correlation_rules
+            if linear_match(event, rule.conditions)
+        ]
+        actual = [(c.rule.name, c.group_key(event)) for c in correlator.rule_index.match(event)]
+        assert actual == expected
+
+
+def test_alert_storm_is_aggregated_into_one_incident():
+    db = RecordingDB()
+    correlator = EventCorrelator(db, AlertSuppressor(cooldown=60, flush_interval=30))
+    correlator.correlation_rules = []
+    correlator.add_rule(CorrelationRule('flood', {'alert_type': 'rule', 'group_by': ['dst_ip']},
+                                        time_window=60, threshold=10, severity='critical'))
+    for i in range(1000):
+        correlator.process_event({'alert_type': 'rule', 'dst_ip': '10.0.0.9', 'seq': i})
+    assert len(db.alerts) == 1
+    assert db.alerts[0]['events_count'] == 10
+
+    correlator.close()
+    assert len(db.alerts) == 2
+    summary = db.alerts[1]
+    assert summary['events_count'] == 1000
+    assert '990' in summary['description']
+
+
+def test_suppressor_cooldown_rate_limit_and_flush():
+    suppressor = AlertSuppressor(cooldown=10, flush_interval=5, rate_limit=2, burst=2)
+    assert suppressor.allow('a', 1, now=0)
+    assert not suppressor.allow('a', 2, now=1)  # 冷却期内
+    assert suppressor.allow('b', 1, now=0)
+    assert not suppressor.allow('c', 1, now=0)  # 超过全局限速
+    assert suppressor.allow('a', 3, now=11)  # 冷却结束且令牌已恢复
+
+    reports = {incident.key: incident for incident in suppressor.flush(now=12)}
+    assert set(reports) == {'c'}
+    assert reports['c'].pending == 1
+    assert suppressor.flush(now=13) == []
+    # 空闲超过冷却期的事件被关闭
+    suppressor.flush(now=30)
+    assert suppressor.incidents == {}
+
+
+def test_shard_expiry_is_incremental():
+    shard = CorrelatorShard()
+    rule = CorrelationRule('r', {'group_by': ['src_ip']}, time_window=60, threshold=1, severity='low')
+    for i in range(10):
+        shard.window(rule, f"10.0.0.{i}").add(1000 + i)
+    shard.window(rule, '10.0.0.0').add(1150)  # 有新事件的计数器不会被删除
+
+    assert shard.expire(1200, limit=4) == 3
+    assert shard.keys == 7
+    assert shard.expire(1200) == 6
+    assert list(shard.windows['r']) == ['10.0.0.0']
+    assert shard.expire(1300) == 1
+    assert shard.keys == 0 and shard.windows == {}
+
+
+def test_owned_shards_only_track_their_keys():
+    rule = CorrelationRule('r', {'alert_type': 'rule', 'group_by': ['src_ip']}, 60, 10 ** 6, 'low')
+    workers = []
+    for owned in ({0, 1}, {2, 3}):
+        correlator = EventCorrelator(RecordingDB(), shards=4, owned_shards=owned)
+        correlator.correlation_rules = [rule]
+        workers.append(correlator)
+
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(200)]
+    for ip in ips:
+        event = {'alert_type': 'rule', 'src_ip': ip}
+        assert workers[0].shards_for(event) == {shard_of(ip, 4)}
+        for worker in workers:
+            worker.process_event(event)
+
+    for ip in ips:
+        owner = 0 if shard_of(ip, 4) < 2 else 1
+        assert workers[owner].get_window('r', ip).total == 1
+        assert workers[1 - owner].get_window('r', ip) is None
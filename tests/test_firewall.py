@@ -0,0 +1,104 @@
+import time
+from types import SimpleNamespace
+
+from ids.utils.firewall import DryRunBackend, IPSetBackend, IPTablesHandler
+
+
+def make_handler(**config):
+    backend = DryRunBackend()
+    return IPTablesHandler(config={'block_duration': 60, **config}, backend=backend), backend
+
+
+def test_bans_are_deduplicated_and_batched():
+    handler, backend = make_handler()
+    assert handler.ban_ip('10.0.0.1', 'scan')
+    assert not handler.ban_ip('10.0.0.1', 'scan again')
+    for i in range(2, 6):
+        handler.ban_ip(f"10.0.0.{i}", 'scan')
+    assert backend.entries == {}  # 只入队，未提交
+
+    handler.flush()
+    assert backend.batches == [('add', [f"10.0.0.{i}" for i in range(1, 6)])]
+    assert backend.entries['10.0.0.1'] == 60
+    assert handler.is_banned('10.0.0.3')
+
+
+def test_expiry_follows_heap_order():
+    handler, backend = make_handler()
+    now = time.monotonic()
+    handler.ban_ip('10.0.0.1', duration=30)
+    handler.ban_ip('10.0.0.2', duration=10)
+    handler.ban_ip('10.0.0.3', duration=20)
+    handler.flush()
+
+    assert handler.check_and_unban(now + 5) == []
+    assert handler.check_and_unban(now + 25) == ['10.0.0.2', '10.0.0.3']
+    assert set(backend.entries) == {'10.0.0.1'}
+    # 手动解封后堆中的旧条目被跳过，重新封禁使用新的到期时间
+    assert handler.unban_ip('10.0.0.1')
+    handler.ban_ip('10.0.0.1', duration=100)
+    assert handler.check_and_unban(now + 40) == []
+    assert handler.is_banned('10.0.0.1')
+
+
+def test_worker_applies_bans_and_expires_without_polling():
+    handler, backend = make_handler(batch_size=3, batch_interval=0.05)
+    handler.start()
+    try:
+        for i in range(3):
+            handler.ban_ip(f"10.0.1.{i}", duration=1)
+        handler.ban_ip('10.0.1.9', duration=100)
+        deadline = time.monotonic() + 3
+        while time.monotonic() < deadline and set(backend.entries) != {'10.0.1.9'}:
+            time.sleep(0.02)
+    finally:
+        handler.stop()
+    assert backend.batches[0] == ('add', ['10.0.1.0', '10.0.1.1', '10.0.1.2'])
+    assert set(backend.entries) == {'10.0.1.9'}
+    assert not handler.is_banned('10.0.1.0')
+
+
+def test_unban_after_batch_is_taken_is_not_reapplied():
+    handler, backend = make_handler()
+    handler.ban_ip('10.0.2.1')
+    handler.ban_ip('10.0.2.2')
+    # 模拟后台线程已取出批次、尚未提交时手动解封
+    with handler.cond:
+        batch = list(handler.pending)
+        handler.pending.clear()
+    assert handler.unban_ip('10.0.2.1')
+    handler._apply_bans(batch)
+    assert set(backend.entries) == {'10.0.2.2'}
+    assert not handler.is_banned('10.0.2.1')
+
+
+def test_invalid_entry_does_not_drop_the_whole_batch():
+    handler, backend = make_handler()
+    for ip in ('10.0.3.1', 'not-an-ip', '2001:db8::1'):
+        handler.ban_ip(ip)
+    handler.flush()
+    assert set(backend.entries) == {'10.0.3.1', '2001:db8::1'}
+    assert handler.is_banned('10.0.3.1') and not handler.is_banned('not-an-ip')
+
+
+def test_ipset_backend_routes_ipv6_to_inet6_set():
+    backend = IPSetBackend('ids_banned')
+    commands = []
+
+    def run(command, input=None, check=True):
+        commands.append((command, input))
+        return SimpleNamespace(returncode=0)
+
+    backend._run = run
+    backend.setup()
+    assert ['ipset', 'create', 'ids_banned6', 'hash:ip', 'family', 'inet6', 'timeout', '3600', '-exist'] \
+        in [command for command, _ in commands]
+    assert any(command[0] == 'ip6tables' for command, _ in commands)
+
+    commands.clear()
+    backend.add([('10.0.0.1', 60), ('2001:db8::1', 60)])
+    backend.remove(['2001:db8::1'])
+    assert [input for _, input in commands] == [
+        'add ids_banned 10.0.0.1 timeout 60\nadd ids_banned6 2001:db8::1 timeout 60\n',
+        'del ids_banned6 2001:db8::1\n',
+    ]
@@ -0,0 +1,108 @@
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.l2 import Ether
+
+from ids.capture.session_handler import SessionHandler
+from ids.models.flow_archive import FlowArchive, ip_to_bytes, partition_name
+
+BASE = 1_700_000_000.0  # 2023-11-14 22:13:20 UTC
+
+
+def make_records(count, seed=1):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        start = BASE + rng.uniform(0, 5 * 3600)
+        records.append((
+            start, start + rng.uniform(0, 30),
+            ip_to_bytes(f"10.0.0.{rng.randint(1, 5)}"), ip_to_bytes('172.16.0.1'),
+            rng.randint(1024, 65535), rng.choice([53, 80, 443]), rng.choice([6, 17]),
+            rng.randint(1, 100), rng.randint(60, 100000),
+        ))
+    return records
+
+
+def test_partitioned_chunks_and_queries(tmp_path):
+    archive = FlowArchive(tmp_path, chunk_size=500)
+    records = make_records(3000)
+    for record in records:
+        archive.add(record)
+    archive.close()
+
+    names = archive.partitions()
+    assert names == sorted({partition_name(r[0]) for r in records})
+    assert all(not p.name.endswith('.tmp') for p in tmp_path.glob('*/*'))
+    assert archive.count() == 3000
+
+    start, end = BASE + 3600, BASE + 2.5 * 3600
+    assert len(archive.partitions(start, end)) == 2
+    selected = [r for r in records if start <= r[0] < end and r[2] == ip_to_bytes('10.0.0.2')]
+    assert archive.count(start, end, {'src_ip': '10.0.0.2'}) == len(selected)
+
+    expected = defaultdict(lambda: {'flows': 0, 'packets': 0, 'bytes': 0})
+    for record in selected:
+        entry = expected[record[5]]
+        entry['flows'] += 1
+        entry['packets'] += record[7]
+        entry['bytes'] += record[8]
+    assert archive.aggregate('dst_port', start=start, end=end, filters={'src_ip': '10.0.0.2'}) == expected
+
+    by_ip = archive.aggregate('src_ip', measures=('bytes',), filters={'protocol': 'UDP'})
+    assert set(by_ip) <= {f"10.0.0.{i}" for i in range(1, 6)}
+    assert sum(v['flows'] for v in by_ip.values()) == sum(1 for r in records if r[6] == 17)
+
+
+def test_scan_reads_only_requested_columns(tmp_path, monkeypatch):
+    archive = FlowArchive(tmp_path)
+    for record in make_records(100):
+        archive.add(record)
+    archive.flush()
+
+    loaded = []
+    original = np.load
+    monkeypatch.setattr(np, 'load', lambda path, **kw: loaded.append(path.name) or original(path, **kw))
+    chunks = list(archive.scan(['bytes'], filters={'dst_port': 80}))
+    assert set(loaded) == {'bytes.npy', 'dst_port.npy'}
+    assert all(isinstance(chunk['bytes'], np.ndarray) for chunk in chunks)
+
+
+def test_session_expiry_writes_flows(tmp_path):
+    archive = FlowArchive(tmp_path)
+    handler = SessionHandler(timeout=60, on_expire=archive.add_session)
+    for _ in range(3):
+        handler.add_packet(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=1234, dport=80))
+    handler.add_packet(Ether() / IP(src='10.0.0.3', dst='10.0.0.2') / UDP(sport=5353, dport=53))
+    handler.close()
+    archive.flush()
+
+    assert handler.sessions == {}
+    flows = archive.aggregate('dst_port', start=time.time() - 60)
+    assert flows[80]['flows'] == 1 and flows[80]['packets'] == 3
+    assert flows[53]['packets'] == 1
+
+
+def test_retention_drops_old_partitions(tmp_path):
+    archive = FlowArchive(tmp_path, retention_days=1)
+    archive.add(make_records(1)[0])
+    archive.add((time.time(),) + make_records(1)[0][1:])
+    archive.flush()
+    assert archive.partitions() == [partition_name(time.time())]
+
+
+def test_ipv6_flows(tmp_path):
+    archive = FlowArchive(tmp_path)
+    handler = SessionHandler(timeout=60, on_expire=archive.add_session)
+    handler.add_packet(Ether() / IPv6(src='2001:db8::', dst='fd00::1') / TCP(sport=1234, dport=443))
+    handler.add_packet(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=5353, dport=53))
+    handler.close()
+    archive.flush()
+
+    by_src = archive.aggregate('src_ip', measures=('packets',))
+    assert by_src == {'2001:db8::': {'flows': 1, 'packets': 1}, '10.0.0.1': {'flows': 1, 'packets': 1}}
+    assert archive.count(filters={'dst_ip': 'fd00::1'}) == 1
+    assert archive.count(filters={'dst_ip': '10.0.0.2'}) == 1
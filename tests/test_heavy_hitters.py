@@ -0,0 +1,80 @@
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+from ids.utils.heavy_hitters import HeavyHitters, SpaceSaving
+from ids.web.api import IDSAPI
+
+
+def zipf_stream(count, seed=7):
+    rng = random.Random(seed)
+    return [(f"10.0.{int(rng.paretovariate(1.1)) % 200}.{rng.randint(0, 4)}", rng.randint(60, 1500))
+            for _ in range(count)]
+
+
+def check_bounds(summary, exact):
+    """计数为上界，计数减误差为下界，未保留的元素不超过bound()"""
+    for item, count in summary.counts.items():
+        assert count - summary.errors.get(item, 0) <= exact[item] <= count
+    bound = summary.bound()
+    assert all(value <= bound for item, value in exact.items() if item not in summary.counts)
+
+
+def test_space_saving_and_merge_bounds():
+    stream = zipf_stream(20000)
+    parts = []
+    exact = Counter()
+    for chunk in range(4):
+        summary = SpaceSaving(32)
+        part_exact = Counter()
+        for ip, length in stream[chunk * 5000:(chunk + 1) * 5000]:
+            summary.add(ip, length)
+            part_exact[ip] += length
+        check_bounds(summary, part_exact)
+        assert len(summary.counts) == 32
+        parts.append(summary)
+        exact.update(part_exact)
+
+    merged = SpaceSaving.merge(parts, 32)
+    check_bounds(merged, exact)
+    top = merged.top(3)
+    assert [item for item, _, _ in top] == [item for item, _ in exact.most_common(3)]
+
+
+def test_sliding_windows_expire_old_panes():
+    hh = HeavyHitters(capacity=16, windows=(('1m', 10, 6), ('5m', 60, 5)))
+    start = 6000.0
+    # 前5分钟以10.0.0.1为主，之后2分钟以10.0.0.2为主
+    for second in range(420):
+        ip = '10.0.0.1' if second < 300 else '10.0.0.2'
+        for _ in range(3):
+            hh.add_packet(ip, '192.168.0.1', 443, 100, start + second)
+        hh.add_packet('10.0.0.9', '192.168.0.1', 53, 60, start + second)
+    hh.add_alert('10.0.0.2', 2, start + 419)
+    now = start + 419.5
+
+    recent = hh.top('1m', 'src_ip', 'packets', now=now)
+    assert recent['top'][0] == ('10.0.0.2', 210, 0)  # 当前窗格加6个已结束的窗格
+    assert '10.0.0.1' not in [item for item, _, _ in recent['top']]
+    longer = hh.top('5m', 'src_ip', 'packets', now=now)
+    counts = {item: count for item, count, _ in longer['top']}
+    assert counts['10.0.0.2'] == 360 and 0 < counts['10.0.0.1'] <= 3 * 300
+    assert hh.top('5m', 'dst_port', 'bytes', now=now)['top'][0][0] == 443
+    assert hh.top('1m', 'alert_src', 'alerts', now=now)['top'] == [('10.0.0.2', 2, 0)]
+    # 长时间没有流量后窗口为空
+    assert hh.top('5m', 'src_ip', 'bytes', now=now + 3600)['top'] == []
+
+
+def test_top_ips_endpoint_reads_from_memory():
+    hh = HeavyHitters(capacity=8)
+    for ip, length in zipf_stream(2000):
+        hh.add_packet(ip, '192.168.0.1', 80, length)
+    client = IDSAPI(SimpleNamespace(db_manager=None, heavy_hitters=hh)).app.test_client()
+
+    top = client.get('/api/stats/top-ips?interval=5m&order_by=packets&limit=3').json
+    assert len(top) == 3 and set(top[0]) == {'ip', 'packets', 'error'}
+    assert top[0]['packets'] >= top[1]['packets'] >= top[2]['packets']
+    ports = client.get('/api/stats/top-ips?interval=1m&dimension=dst_port').json
+    assert ports == [{'port': 80, 'bytes': ports[0]['bytes'], 'error': 0}]
+    assert client.get('/api/stats/top-ips?interval=1m&dimension=proto').status_code == 400
+    assert client.get('/api/stats/top-ips?interval=24h&dimension=dst_ip').status_code == 400
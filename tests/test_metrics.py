@@ -0,0 +1,56 @@
+import threading
+from types import SimpleNamespace
+
+from ids.utils.metrics import MetricsRegistry, NULL_METRIC, registry
+from ids.web.api import IDSAPI
+
+def test_counter_merges_thread_local_cells():
+    metrics = MetricsRegistry()
+    counter = metrics.counter('events_total', '事件数')
+
+    def work():
+        for _ in range(1000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc(5)
+
+    assert counter.get() == 4005
+    # 已退出线程的值合并后不丢失
+    assert counter.get() == 4005
+
+def test_histogram_buckets_and_prometheus_output():
+    metrics = MetricsRegistry()
+    histogram = metrics.histogram('latency_seconds', '延迟', {'stage': 'decode'},
+                                  buckets=(0.001, 0.01))
+    for value in (0.0005, 0.005, 0.005, 0.5):
+        histogram.observe(value)
+    metrics.gauge('queue_depth', '队列深度', function=lambda: 7)
+
+    text = metrics.render_prometheus()
+    assert '# TYPE ids_latency_seconds histogram' in text
+    assert 'ids_latency_seconds_bucket{stage="decode",le="0.001"} 1' in text
+    assert 'ids_latency_seconds_bucket{stage="decode",le="0.01"} 3' in text
+    assert 'ids_latency_seconds_bucket{stage="decode",le="+Inf"} 4' in text
+    assert 'ids_latency_seconds_count{stage="decode"} 4' in text
+    assert 'ids_queue_depth 7' in text
+
+def test_disabled_registry_returns_null_metrics():
+    metrics = MetricsRegistry(enabled=False)
+    assert metrics.counter('x_total') is NULL_METRIC
+    with metrics.histogram('y_seconds').time():
+        pass
+    assert metrics.render_prometheus() == '\n'
+
+def test_metrics_endpoint():
+    registry.counter('test_endpoint_total', '测试').inc(3)
+    api = IDSAPI(SimpleNamespace(db_manager=None))
+    response = api.app.test_client().get('/api/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'ids_test_endpoint_total 3' in response.get_data(as_text=True)
@@ -2,4 +2,28 @@ import pytest
 import numpy as np
 
 from ids.detectors.ml_engine import MLEngine
-from ids.models.packet_features import PacketFeatures 
\ No newline at end of file
+from ids.models.packet_features import PacketFeatures 
+
+def test_predict_requires_training():
+    engine = MLEngine()
+    assert engine.predict({'ip_len': 60}) is None
+
+def test_train_and_predict():
+    rng = np.random.RandomState(0)
+    normal = [
+        {'ip_len': int(rng.normal(500, 50)), 'ip_ttl': 64, 'ip_proto': 6,
+         'tcp_dport': 443, 'tcp_window': 65535}
+        for _ in range(200)
+    ]
+    engine = MLEngine()
+    engine.train(normal)
+
+    result = engine.predict({'ip_len': 500, 'ip_ttl': 64, 'ip_proto': 6,
+                             'tcp_dport': 443, 'tcp_window': 65535})
+    assert set(result) == {'is_attack', 'confidence'}
+    assert not result['is_attack']
+
+    outlier = engine.predict({'ip_len': 9000, 'ip_ttl': 1, 'ip_proto': 17,
+                              'udp_dport': 31337, 'udp_len': 8980})
+    assert outlier['is_attack']
+    assert outlier['confidence'] > result['confidence']
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+from scapy.layers.inet import IP, TCP
+from scapy.layers.l2 import Ether
+
+from ids.models.db_manager import DatabaseManager
+from ids.models.packet_store import PacketStore, flow_key
+from ids.utils.pcap import read_pcap, read_record
+
+
+def test_flow_key_is_direction_independent():
+    assert flow_key('10.0.0.1', 1234, '10.0.0.2', 80, 'TCP') == \
+        flow_key('10.0.0.2', 80, '10.0.0.1', 1234, 'TCP')
+    assert flow_key('10.0.0.1', None, '10.0.0.2', None, 'OTHER') == 'OTHER 10.0.0.1:-10.0.0.2:'
+
+
+def test_append_read_and_rotate(tmp_path):
+    store = PacketStore(tmp_path, segment_size=200, max_segments=2)
+    locations = [store.append(1000.0 + i, bytes([i]) * 60) for i in range(6)]
+
+    # 每个分段只能容纳两条记录（24字节文件头 + 2 * (16 + 60)字节）
+    assert [segment for segment, _ in locations] == [1, 1, 2, 2, 3, 3]
+    assert store.segments == [2, 3]
+    assert not store.segment_path(1).exists()
+
+    assert store.read(*locations[0]) is None
+    assert store.read(*locations[5]) == (1005.0, bytes([5]) * 60)
+    # 当前分段继续追加后仍可读取新写入的记录
+    location = store.append(2000.0, b'new')
+    assert store.read(*location) == (2000.0, b'new')
+    store.close()
+
+    # 重新打开时写入新分段，不覆盖已有文件
+    reopened = PacketStore(tmp_path, segment_size=200)
+    assert reopened.segment == 4
+    assert reopened.read(*locations[4]) == (1004.0, bytes([4]) * 60)
+    reopened.close()
+
+
+def test_rotation_does_not_close_mapping_in_use(tmp_path):
+    store = PacketStore(tmp_path, segment_size=200, max_segments=1)
+    segment, offset = store.append(1000.0, b'a' * 60)
+    # 读取线程在锁外使用映射时，分段被轮转删除
+    buffer = store._map(segment, offset)
+    for i in range(4):
+        store.append(1001.0 + i, b'b' * 60)
+    assert segment not in store.segments
+    assert read_record(buffer, offset)[:2] == (1000.0, b'a' * 60)
+    assert store.read(segment, offset) is None
+    store.close()
+
+
+def test_export_flow_pcap(tmp_path):
+    store = PacketStore(tmp_path / 'packets')
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", packet_store=store)
+    frames = []
+    for i in range(4):
+        packet = Ether(bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=1234, dport=80, seq=i)))
+        packet.time = 1000.0 + i
+        frames.append(bytes(packet))
+        db.save_packet(packet, {})
+        reply = Ether() / IP(src='10.0.0.2', dst='10.0.0.1') / TCP(sport=80, dport=1234)
+        reply.time = 1000.5 + i
+        db.save_packet(reply, {})
+    db.save_packet(Ether() / IP(src='10.0.0.3', dst='10.0.0.2') / TCP(sport=1, dport=80), {})
+    db.flush()
+
+    key = flow_key('10.0.0.1', 1234, '10.0.0.2', 80, 'TCP')
+    assert len(db.get_flow_packets(key)) == 8
+    path = tmp_path / 'flow.pcap'
+    path.write_bytes(db.export_flow_pcap(key))
+    exported = list(read_pcap(path))
+    assert [data for _, data in exported[::2]] == frames
+    assert exported[1][0] == 1000.5
+    assert db.export_flow_pcap('TCP unknown') is None
+    db.close()
+
+
+def test_api_export_flow_pcap(tmp_path):
+    from ids.web.api import IDSAPI
+
+    store = PacketStore(tmp_path / 'packets')
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", packet_store=store)
+    packet = Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=1234, dport=80)
+    db.save_packet(packet, {})
+    db.flush()
+
+    client = IDSAPI(SimpleNamespace(db_manager=db)).app.test_client()
+    response = client.get('/api/flows/pcap?src_ip=10.0.0.2&src_port=80&dst_ip=10.0.0.1&dst_port=1234')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.tcpdump.pcap'
+    assert response.data.endswith(bytes(packet))
+    assert client.get('/api/flows/pcap').status_code == 400
+    assert client.get('/api/flows/pcap?flow_key=x').status_code == 404
+    db.close()
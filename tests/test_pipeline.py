@@ -0,0 +1,56 @@
+import threading
+import time
+
+from ids.utils.pipeline import DetectionPipeline, PipelineStage
+
+def test_pipeline_stages_chain():
+    results = []
+    done = threading.Event()
+
+    def collect(item):
+        results.append(item)
+        if len(results) == 10:
+            done.set()
+
+    pipeline = DetectionPipeline({'stages': {'double': {'workers': 2}}})
+    pipeline.add_stage('double', lambda x: x * 2)
+    pipeline.add_stage('filter', lambda x: x if x % 4 == 0 else None)
+    pipeline.add_stage('collect', collect)
+    pipeline.start()
+
+    for i in range(20):
+        assert pipeline.submit(i)
+    assert done.wait(5)
+    pipeline.stop()
+
+    assert sorted(results) == [i * 2 for i in range(20) if i % 2 == 0]
+    stats = {s['name']: s for s in pipeline.get_stats()}
+    assert stats['double']['workers'] == 2
+    assert stats['double']['processed'] == 20
+    assert stats['collect']['processed'] == 10
+    assert all(s['backlog'] == 0 for s in stats.values())
+
+def test_entry_stage_drops_when_full():
+    gate = threading.Event()
+    stage = PipelineStage('slow', lambda x: gate.wait(), queue_size=2, block=False)
+    stage.start()
+
+    submitted = [stage.submit(i) for i in range(10)]
+    gate.set()
+    stage.stop()
+
+    assert not all(submitted)
+    assert stage.get_stats()['dropped'] == submitted.count(False)
+
+def test_stage_errors_are_counted():
+    def fail(item):
+        raise ValueError(item)
+
+    stage = PipelineStage('fail', fail)
+    stage.start()
+    stage.submit(1)
+    stage.stop()
+
+    stats = stage.get_stats()
+    assert stats['errors'] == 1
+    assert stats['processed'] == 1
@@ -0,0 +1,69 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from ids.utils.profiler import ProfilerBusy, SamplingProfiler, collapsed
+from ids.web.api import IDSAPI
+
+
+def busy_stage(stop, sink):
+    while not stop.is_set():
+        sink.append(bytearray(64))
+        if len(sink) > 1000:
+            sink.clear()
+
+
+@pytest.fixture
+def stage_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_stage, args=(stop, []), name='Stage-test-0', daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_samples_only_matching_threads(stage_thread):
+    profiler = SamplingProfiler()
+    result = profiler.profile(0.2, interval=0.005, memory=True)
+    assert result['samples'] >= 10
+    stacks = result['stacks']
+    assert stacks and all(stack.startswith('Stage-test-0;') for stack in stacks)
+    assert any('busy_stage (test_profiler.py:' in stack for stack in stacks)
+    assert sum(stacks.values()) <= result['samples']
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed(stacks).splitlines())
+    assert result['allocations'] and {'location', 'size', 'count'} <= set(result['allocations'][0])
+
+    # 同一时间只允许一次采样
+    profiler.lock.acquire()
+    with pytest.raises(ProfilerBusy):
+        profiler.profile(0.1)
+    profiler.lock.release()
+
+
+def test_profile_endpoint_requires_token(stage_thread, monkeypatch):
+    monkeypatch.setenv('IDS_ADMIN_TOKEN', 'secret')
+    config = {
+        'web_api': {'profile_max_duration': 0.2, 'admin_token': 'stale'},
+        'alert_dispatch': {'sinks': [{'type': 'webhook', 'url': 'http://hook', 'headers': {'X-Key': 'k'}}]},
+    }
+    client = IDSAPI(SimpleNamespace(db_manager=None, config=config)).app.test_client()
+
+    # 令牌不在配置中；配置接口返回时隐藏敏感项
+    exposed = client.get('/api/config').get_data(as_text=True)
+    assert 'secret' not in exposed and 'stale' not in exposed and 'X-Key' not in exposed
+    assert client.get('/api/config').json['alert_dispatch']['sinks'][0]['url'] == 'http://hook'
+
+    assert client.post('/api/admin/profile?seconds=0.1').status_code == 401
+    assert client.post('/api/admin/profile', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.post('/api/admin/profile?seconds=5', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200 and int(response.headers['X-Profile-Samples']) > 0
+    assert 'busy_stage' in response.get_data(as_text=True)
+    result = client.post('/api/admin/profile?seconds=0.1&memory=1&limit=3',
+                         headers={'Authorization': 'Bearer secret'}).json
+    assert 'busy_stage' in result['collapsed'] and len(result['allocations']) <= 3
+
+    monkeypatch.delenv('IDS_ADMIN_TOKEN')
+    disabled = IDSAPI(SimpleNamespace(db_manager=None)).app.test_client()
+    assert disabled.post('/api/admin/profile').status_code == 404
@@ -0,0 +1,117 @@
+import functools
+import threading
+from types import SimpleNamespace
+
+from ids.detectors.rule_engine import Rule, RuleEngine
+from ids.main import IDS
+from ids.web.api import IDSAPI
+from ids.web.cache import ResponseCache
+
+
+def test_ttl_expiry_and_invalidation():
+    cache = ResponseCache({'rules': 60, 'top_ips': 0}, default_ttl=5)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return str(len(calls)).encode(), 200, 'application/json'
+
+    assert cache.get('stats', 'a', compute, now=0).body == b'1'
+    assert cache.get('stats', 'a', compute, now=4.9).body == b'1'
+    assert cache.get('stats', 'b', compute, now=4.9).body == b'2'
+    assert cache.get('stats', 'a', compute, now=5).body == b'3'
+    # TTL为0的端点不缓存，错误响应也不缓存
+    assert cache.get('top_ips', 'a', compute, now=5).body == b'4'
+    assert cache.get('top_ips', 'a', compute, now=5).body == b'5'
+    assert cache.get('rules', 'a', lambda: (b'err', 400, 'application/json'), now=5).status == 400
+    assert cache.get('rules', 'a', compute, now=5).body == b'6'
+    assert cache.get('rules', 'a', compute, now=6).body == b'6'
+    cache.invalidate('rules')
+    assert cache.get('rules', 'a', compute, now=6).body == b'7'
+    assert cache.get('stats', 'b', compute, now=6).body == b'2'
+    assert cache.hits == 3 and cache.lookups == 11
+
+
+def test_concurrent_requests_are_coalesced():
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return b'result', 200, 'application/json'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('stats', 'a', compute)))
+               for _ in range(8)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.lookups < 8:
+        threading.Event().wait(0.01)
+    # 计算期间规则变化：结果返回给等待的请求，但不写入缓存
+    cache.invalidate('stats')
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [entry.body for entry in results] == [b'result'] * 8
+    assert not cache.entries
+
+
+def test_api_etag_and_rule_invalidation(tmp_path):
+    engine = RuleEngine(rules_dir=str(tmp_path / 'rules'))
+    engine.add_rule(Rule('Port Scan', [['dst_port', '==', 22]], 'high'))
+    calls = []
+
+    def alert_counts(group_by, start_time):
+        calls.append(group_by)
+        return {'high': len(calls)}
+
+    db = SimpleNamespace(alert_counts=alert_counts, session=SimpleNamespace(remove=lambda: None))
+    ids = SimpleNamespace(db_manager=db, rule_engine=engine,
+                          config={'web_api': {'cache': {'ttls': {'alert_stats': 60}}}})
+    api = IDSAPI(ids)
+    client = api.app.test_client()
+
+    first = client.get('/api/alerts/stats?interval=1h&group_by=severity')
+    assert first.status_code == 200 and first.headers['ETag']
+    # 查询参数顺序不同视为同一请求
+    second = client.get('/api/alerts/stats?group_by=severity&interval=1h')
+    assert second.json == first.json and len(calls) == 1
+    not_modified = client.get('/api/alerts/stats?group_by=severity&interval=1h',
+                              headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304 and not not_modified.data
+    assert client.get('/api/alerts/stats?group_by=bogus').status_code == 400
+
+    rules = client.get('/api/rules')
+    assert [rule['name'] for rule in rules.json] == ['Port Scan']
+    engine.add_rule(Rule('SYN Flood', [['tcp_flags', '==', '0x02']]))
+    assert client.get('/api/rules').headers['ETag'] == rules.headers['ETag']
+    api.invalidate_cache('rules')
+    updated = client.get('/api/rules', headers={'If-None-Match': rules.headers['ETag']})
+    assert updated.status_code == 200
+    assert [rule['name'] for rule in updated.json] == ['Port Scan', 'SYN Flood']
+
+
+def test_delete_rule_through_api(tmp_path):
+    engine = RuleEngine(rules_dir=str(tmp_path / 'rules'))
+    engine.add_rule(Rule('Port Scan', [['dst_port', '==', 22]], 'high'))
+    engine.add_rule(Rule('SYN Flood', [['tcp_flags', '==', '0x02']]))
+    ids = SimpleNamespace(db_manager=None, rule_engine=engine, config={})
+    # 使用IDS的规则管理方法（删除规则后使API缓存失效）
+    ids.remove_rule = functools.partial(IDS.remove_rule, ids)
+    ids._invalidate_rules_cache = functools.partial(IDS._invalidate_rules_cache, ids)
+    ids.api = IDSAPI(ids)
+    client = ids.api.app.test_client()
+
+    assert len(client.get('/api/rules').json) == 2
+    response = client.delete('/api/rules/Port Scan')
+    assert response.status_code == 200 and response.json == {'deleted': 'Port Scan'}
+    assert [rule['name'] for rule in client.get('/api/rules').json] == ['SYN Flood']
+    assert client.delete('/api/rules/Port Scan').status_code == 404
@@ -0,0 +1,153 @@
+import random
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+
+from ids.models.database import Alert, AlertRollup, AlertSeverity, Packet
+from ids.models.db_manager import DatabaseManager
+from ids.models.rollups import split_range
+
+BASE = datetime(2024, 1, 1, 9, 50)
+
+
+def populate(db, count=3000, seed=7, base=BASE, span=4 * 3600):
+    rng = random.Random(seed)
+    for _ in range(count):
+        timestamp = base + timedelta(seconds=rng.uniform(0, span))
+        protocol = rng.choice(['TCP', 'UDP', 'OTHER'])
+        packet = {
+            'id': db._next_id(Packet), 'timestamp': timestamp,
+            'src_ip': f"10.0.0.{rng.randint(1, 20)}", 'dst_ip': '172.16.0.1',
+            'protocol': protocol, 'src_port': None,
+            'dst_port': None if protocol == 'OTHER' else rng.choice([22, 53, 80, 443]),
+            'length': rng.randint(60, 1500), 'flow_key': '', 'segment': None, 'offset': None,
+            'features': {},
+        }
+        db._enqueue(Packet, [packet])
+        if rng.random() < 0.3:
+            db._enqueue(Alert, [{
+                'id': db._next_id(Alert), 'timestamp': timestamp, 'packet_id': packet['id'],
+                'src_ip': packet['src_ip'], 'dst_ip': packet['dst_ip'], 'alert_type': 'rule',
+                'rule_name': rng.choice(['Port Scan', 'SYN Flood', None]),
+                'severity': rng.choice(list(AlertSeverity)), 'confidence': None, 'description': '',
+            }])
+    db.flush()
+
+
+def full_scan(db, model, start, end):
+    rows = []
+    with db.engine.connect() as conn:
+        for table in db.partitions.tables_for_range(model):
+            rows.extend(conn.execute(select(table)).mappings())
+    # 汇总查询按分钟对齐：起点向下取整，终点向上取整
+    start = start.replace(second=0, microsecond=0)
+    if end != end.replace(second=0, microsecond=0):
+        end = end.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    return [row for row in rows if start <= row['timestamp'] < end]
+
+
+def test_split_range_uses_hours_for_whole_hours():
+    ranges = split_range(datetime(2024, 1, 1, 9, 50, 30), datetime(2024, 1, 1, 12, 10))
+    assert ranges == [
+        ('minute', datetime(2024, 1, 1, 9, 50), datetime(2024, 1, 1, 10)),
+        ('hour', datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 12)),
+        ('minute', datetime(2024, 1, 1, 12), datetime(2024, 1, 1, 12, 10)),
+    ]
+    assert split_range(datetime(2024, 1, 1, 9, 5), datetime(2024, 1, 1, 9, 7, 1)) == [
+        ('minute', datetime(2024, 1, 1, 9, 5), datetime(2024, 1, 1, 9, 8)),
+    ]
+    # 分钟汇总保留期之前的部分从原始表统计
+    ranges = split_range(datetime(2024, 1, 1, 9, 50, 30), datetime(2024, 1, 1, 12, 10),
+                         minute_cutoff=datetime(2024, 1, 1, 12, 5, 30))
+    assert ranges == [
+        ('raw', datetime(2024, 1, 1, 9, 50), datetime(2024, 1, 1, 10)),
+        ('hour', datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 12)),
+        ('raw', datetime(2024, 1, 1, 12), datetime(2024, 1, 1, 12, 6)),
+        ('minute', datetime(2024, 1, 1, 12, 6), datetime(2024, 1, 1, 12, 10)),
+    ]
+
+
+def check_against_full_scan(db, start, end):
+    alerts = full_scan(db, Alert, start, end)
+    for group_by in ('severity', 'rule_name', 'src_ip'):
+        expected = Counter(
+            getattr(row[group_by], 'value', row[group_by]) or '' for row in alerts
+        )
+        assert db.alert_counts(group_by, start, end) == dict(expected)
+
+    packets = full_scan(db, Packet, start, end)
+    expected = defaultdict(lambda: {'packets': 0, 'bytes': 0})
+    hosts = defaultdict(lambda: {'packets': 0, 'bytes': 0})
+    for row in packets:
+        for totals in (expected[(row['protocol'], row['dst_port'] or 0)], hosts[row['src_ip']]):
+            totals['packets'] += 1
+            totals['bytes'] += row['length']
+    assert db.traffic_counts(('protocol', 'dst_port'), start, end) == dict(expected)
+    top = db.top_ips(start, end, limit=5)
+    assert top == [
+        {'ip': ip, **totals}
+        for ip, totals in sorted(hosts.items(), key=lambda item: (-item[1]['bytes'], item[0]))[:5]
+    ]
+
+
+def test_rollups_match_full_scan(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", batch_size=200, partition_period='hour')
+    populate(db)
+
+    for start, end in [
+        (BASE, BASE + timedelta(hours=5)),
+        (BASE + timedelta(minutes=17, seconds=5), BASE + timedelta(hours=2, minutes=33)),
+        (BASE + timedelta(hours=1, minutes=12), BASE + timedelta(hours=1, minutes=40)),
+    ]:
+        check_against_full_scan(db, start, end)
+    db.close()
+
+
+def test_pruned_minute_rollups_fall_back_to_raw_partitions(tmp_path):
+    retention = {'minute': 2, 'hour': 90}
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}", batch_size=200, partition_period='hour',
+                         rollup_retention=retention)
+    now = datetime.utcnow()
+    base = (now - timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+    populate(db, base=base, span=3 * 86400)
+    with db.engine.begin() as conn:
+        db.rollups.prune(conn, retention, now)
+        oldest = conn.execute(select(func.min(AlertRollup.__table__.c.bucket)).where(
+            AlertRollup.__table__.c.resolution == 'minute'
+        )).scalar()
+    assert oldest >= now - timedelta(days=2, minutes=1)
+
+    # 起点在分钟汇总保留期之前且不在整点（与 interval=7d 等默认查询相同）
+    for start, end in [
+        (base + timedelta(minutes=23, seconds=10), now),
+        (base + timedelta(hours=5, minutes=41), base + timedelta(hours=9, minutes=12)),
+        (base + timedelta(hours=3, minutes=5), base + timedelta(hours=3, minutes=50)),
+    ]:
+        check_against_full_scan(db, start, end)
+        high = Counter(row['rule_name'] or '' for row in full_scan(db, Alert, start, end)
+                       if row['severity'] == AlertSeverity.HIGH)
+        assert db.alert_counts('rule_name', start, end, {'severity': 'high'}) == dict(high)
+    db.close()
+
+
+def test_stats_endpoints(tmp_path):
+    from ids.web.api import IDSAPI
+
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'ids.db'}")
+    db._enqueue(Packet, [{
+        'id': db._next_id(Packet), 'timestamp': datetime.utcnow(), 'src_ip': '10.0.0.1',
+        'dst_ip': '10.0.0.2', 'protocol': 'TCP', 'src_port': 1234, 'dst_port': 80,
+        'length': 100, 'flow_key': '', 'segment': None, 'offset': None, 'features': {},
+    }])
+    db.flush()
+
+    client = IDSAPI(SimpleNamespace(db_manager=db)).app.test_client()
+    traffic = client.get('/api/stats/traffic?interval=15m').json
+    assert traffic['total'] == {'packets': 1, 'bytes': 100}
+    assert traffic['top_ports'] == [{'protocol': 'TCP', 'port': 80, 'packets': 1, 'bytes': 100}]
+    assert client.get('/api/stats/top-ips').json == [{'ip': '10.0.0.1', 'packets': 1, 'bytes': 100}]
+    assert client.get('/api/alerts/stats?group_by=rule_name').json == {'stats': {}}
+    assert client.get('/api/stats/traffic?interval=abc').status_code == 400
+    db.close()
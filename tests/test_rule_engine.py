@@ -1,6 +1,43 @@
 import pytest
+import subprocess
+import sys
 from pathlib import Path
 import yaml
 
-from ids.detectors.rule_engine import RuleEngine, Rule
-from ids.models.packet_features import PacketFeatures 
\ No newline at end of file
+from ids.detectors.rule_engine import RuleEngine, Rule, validate_rule_files
+from ids.models.packet_features import PacketFeatures
+
+def test_default_rules_compile():
+    rules, errors = validate_rule_files(['rules'])
+    assert errors == []
+    port_scan = {rule.name: rule for rule in rules}['Port Scan Detection']
+    assert ('tcp_dport', 'in', range(1, 1025)) in port_scan.conditions
+    assert port_scan.to_dict()['conditions'][0] == ['tcp_dport', 'in', '1-1024']
+
+def test_invalid_rules_are_reported(tmp_path):
+    rule_file = tmp_path / 'bad.yaml'
+    rule_file.write_text(yaml.safe_dump({'rules': [
+        {'name': 'ok', 'conditions': [['ip_len', '>', 1500]]},
+        {'name': 'bad-op', 'conditions': [['ip_len', '=~', 1]]},
+        {'name': 'bad-range', 'conditions': [['tcp_dport', 'in', '10-x']]},
+        {'name': 'bad-severity', 'conditions': [['ip_len', '>', 1]], 'severity': 'urgent'},
+    ]}))
+    rules, errors = validate_rule_files([str(rule_file)])
+    assert [rule.name for rule in rules] == ['ok']
+    assert len(errors) == 3
+
+def test_engine_loads_rules_dir():
+    engine = RuleEngine('rules')
+    alerts = engine.check_packet(None, {'tcp_flags': 0x02, 'packet_count': 500, 'duration': 1})
+    assert [a['rule_name'] for a in alerts] == ['SYN Flood Detection']
+
+def test_validate_rules_does_not_load_heavy_modules():
+    code = (
+        "import sys\n"
+        "from ids.main import validate_rules\n"
+        "assert validate_rules(['rules']) == 0\n"
+        "heavy = {'scapy', 'sklearn', 'sqlalchemy', 'flask', 'iptc'}\n"
+        "print(sorted(heavy & {m.split('.')[0] for m in sys.modules}))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,82 @@
+from ids.correlation.sequence import SequenceMatcher, SequenceRule, SequenceStep
+
+
+def kill_chain(max_partials=8):
+    return SequenceRule('chain', [
+        SequenceStep({'rule_name': 'scan'}, bind={'attacker': 'src_ip'}),
+        SequenceStep({'rule_name': 'brute'}, bind={'attacker': 'src_ip', 'host': 'dst_ip'}, within=600),
+        SequenceStep({'rule_name': 'outbound'}, bind={'host': 'src_ip'}, within=300),
+    ], window=1800, severity='critical', max_partials=max_partials)
+
+
+def make_matcher(**kwargs):
+    matches = []
+    matcher = SequenceMatcher(on_match=lambda rule, bindings, first, last: matches.append((bindings, first, last)))
+    matcher.add_rule(kill_chain(**kwargs))
+    return matcher, matches
+
+
+def test_sequence_completes_in_order_with_bindings():
+    matcher, matches = make_matcher()
+    matcher.process({'rule_name': 'outbound', 'src_ip': 'h'}, 0)  # 顺序不对，不匹配
+    matcher.process({'rule_name': 'scan', 'src_ip': 'x'}, 10)
+    matcher.process({'rule_name': 'brute', 'src_ip': 'y', 'dst_ip': 'h'}, 20)  # 攻击者不同
+    matcher.process({'rule_name': 'outbound', 'src_ip': 'h'}, 30)
+    assert matches == []
+
+    matcher.process({'rule_name': 'brute', 'src_ip': 'x', 'dst_ip': 'h'}, 100)
+    matcher.process({'rule_name': 'outbound', 'src_ip': 'other'}, 150)
+    assert matcher.process({'rule_name': 'outbound', 'src_ip': 'h'}, 200) == 1
+    assert matches == [({'attacker': 'x', 'host': 'h'}, 10, 200)]
+
+
+def test_step_windows_and_total_window():
+    matcher, matches = make_matcher()
+    matcher.process({'rule_name': 'scan', 'src_ip': 'x'}, 0)
+    matcher.process({'rule_name': 'brute', 'src_ip': 'x', 'dst_ip': 'h'}, 700)  # 超过第二步的600秒
+    matcher.process({'rule_name': 'outbound', 'src_ip': 'h'}, 710)
+    assert matches == []
+
+    matcher.process({'rule_name': 'scan', 'src_ip': 'x'}, 1000)
+    matcher.process({'rule_name': 'brute', 'src_ip': 'x', 'dst_ip': 'h'}, 1500)
+    matcher.process({'rule_name': 'brute', 'src_ip': 'x', 'dst_ip': 'h'}, 2700)  # 超过总窗口
+    matcher.process({'rule_name': 'outbound', 'src_ip': 'h'}, 2750)
+    assert matches == []
+
+
+def test_partials_are_bounded_and_expire():
+    matcher, _ = make_matcher(max_partials=3)
+    for i in range(10):
+        matcher.process({'rule_name': 'scan', 'src_ip': f"x{i}"}, i)
+        matcher.process({'rule_name': 'brute', 'src_ip': f"x{i}", 'dst_ip': 'h'}, i)
+    # 同一主机最多保留3个部分匹配（每个攻击者一个第一阶段键）
+    assert matcher.partials('chain') == [10, 3]
+
+    # 处理事件时顺带从头部清理过期的键
+    for i in range(5):
+        matcher.process({'rule_name': 'scan', 'src_ip': f"new{i}"}, 5000 + i)
+    assert matcher.partials('chain') == [5, 0]
+    assert matcher.expire(10000) == 5
+    assert matcher.partials('chain') == [0, 0]
+
+
+def test_default_kill_chain_raises_correlation_alert():
+    from ids.correlation.event_correlator import EventCorrelator
+
+    class RecordingDB:
+        alerts = []
+
+        def save_correlation_alert(self, alert):
+            self.alerts.append(alert)
+
+    db = RecordingDB()
+    correlator = EventCorrelator(db)
+    correlator.correlation_rules = []
+    correlator.process_event({'alert_type': 'rule', 'rule_name': 'Port Scan Detection',
+                              'src_ip': '203.0.113.5', 'dst_ip': '10.0.0.2', 'dst_port': 80})
+    correlator.process_event({'alert_type': 'rule', 'rule_name': None,
+                              'src_ip': '203.0.113.5', 'dst_ip': '10.0.0.2', 'dst_port': 22})
+    correlator.process_event({'alert_type': 'ml', 'rule_name': None,
+                              'src_ip': '10.0.0.2', 'dst_ip': '198.51.100.7', 'dst_port': 443})
+    assert [alert['rule_name'] for alert in db.alerts] == ['Kill Chain: Scan, Brute Force, Outbound']
+    assert db.alerts[0]['related_events'] == [{'attacker': '203.0.113.5', 'host': '10.0.0.2'}]
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from ids.utils.timeseries import TrafficSeries
+from ids.web.api import IDSAPI
+
+
+def test_downsampling_and_ring_wraparound():
+    series = TrafficSeries((('1s', 1, 60), ('1m', 60, 10)))
+    assert series.nbytes == 70 * (10 + 1) * 8
+    start = 60_000
+    for second in range(180):
+        for _ in range(2):
+            series.add_packet('TCP', 100, start + second + 0.5)
+        series.add_packet('UDP', 50, start + second + 0.5)
+        if second % 30 == 0:
+            series.add_alerts('rule', 3, start + second)
+    series.add_alerts('ml', 1, start + 179.9)
+
+    # 秒级序列只保留最近60秒，当前秒尚未写入环形数组也能查询到
+    seconds = series.query('1s', start, start + 179)
+    assert seconds['timestamps'][0] == start + 120 and len(seconds['packets']) == 60
+    assert seconds['packets'] == [3] * 60 and seconds['bytes'] == [250] * 60
+    assert seconds['protocols']['UDP']['bytes'] == [50] * 60
+    assert sum(seconds['alerts']['rule']) == 6 and seconds['alerts']['ml'][-1] == 1
+
+    minutes = series.query('1m', start, start + 179)
+    assert minutes['timestamps'] == [start, start + 60, start + 120]
+    assert minutes['packets'] == [180, 180, 180]
+    assert minutes['protocols']['TCP']['packets'] == [120, 120, 120]
+    assert minutes['alerts'] == {'rule': [6, 6, 6], 'ml': [0, 0, 1]}
+
+    # 一圈之后的旧数据不会被当作新数据读出
+    series.add_packet('OTHER', 40, start + 725)
+    minutes = series.query('1m', start, start + 725)
+    assert minutes['timestamps'][0] == start + 180 and minutes['timestamps'][-1] == start + 720
+    assert minutes['packets'] == [0] * 9 + [1]
+    assert series.query('1s', start + 720, start + 730)['protocols']['OTHER']['bytes'][5] == 40
+
+
+def test_traffic_endpoint_reads_series_from_memory():
+    series = TrafficSeries()
+    for _ in range(5):
+        series.add_packet('TCP', 60)
+    client = IDSAPI(SimpleNamespace(db_manager=None, traffic_series=series)).app.test_client()
+
+    result = client.get('/api/stats/traffic?resolution=1s&interval=1m').json
+    assert result['step'] == 1 and len(result['packets']) in (60, 61)
+    assert sum(result['packets']) == 5 and sum(result['protocols']['TCP']['bytes']) == 300
+    assert client.get('/api/stats/traffic?resolution=1m&interval=2h').json['step'] == 60
+    assert client.get('/api/stats/traffic?resolution=5s').status_code == 400
+    assert client.get('/api/stats/traffic?resolution=1s&interval=abc').status_code == 400